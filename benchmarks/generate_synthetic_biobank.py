@@ -0,0 +1,327 @@
+import io
+import json
+import math
+import shutil
+import subprocess
+import argparse as ap
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Column layouts of the plink2 --glm outputs the pipeline asks for
+# (hide-covar, cols=+a1freq,+a1freqcc,+firth for logistic and cols=+a1freq for linear)
+LOGISTIC_COLS = ['#CHROM', 'POS', 'ID', 'REF', 'ALT', 'A1', 'OMITTED', 'A1_CASE_FREQ', 'A1_CTRL_FREQ', 'A1_FREQ',
+                 'FIRTH?', 'TEST', 'OBS_CT', 'OR', 'LOG(OR)_SE', 'L95', 'U95', 'Z_STAT', 'P', 'ERRCODE']
+LINEAR_COLS = ['#CHROM', 'POS', 'ID', 'REF', 'ALT', 'A1', 'OMITTED', 'A1_FREQ', 'TEST', 'OBS_CT',
+               'BETA', 'SE', 'L95', 'U95', 'T_STAT', 'P', 'ERRCODE']
+
+COLNAMES = {
+    '#CHROM': 'chromosome', 'POS': 'base_pair_location', 'ID': 'variant_id', 'A2': 'other_allele',
+    'A1': 'effect_allele', 'A1_FREQ': 'effect_allele_frequency', 'BETA': 'beta', 'SE': 'standard_error',
+    'T_STAT': 't_statistic', 'P': 'p_value', 'N': 'n'
+}
+
+
+def make_arg_parser():
+    parser = ap.ArgumentParser(
+        description="Generate synthetic biobank-scale inputs (phenotypes, cohorts, .psam/.pvar and plink2 .glm.* outputs) for benchmarking."
+    )
+    parser.add_argument('-o', '--outDir', required=True, help='Output directory')
+    parser.add_argument('--samples', type=int, default=10000, help='Number of samples')
+    parser.add_argument('--cohorts', type=int, default=3, help='Number of (overlapping) cohorts')
+    parser.add_argument('--binPhenos', type=int, default=2, help='Number of binary phenotypes')
+    parser.add_argument('--quantPhenos', type=int, default=2, help='Number of quantitative phenotypes')
+    parser.add_argument('--catCovars', type=int, default=2, help='Number of categorical covariates')
+    parser.add_argument('--contCovars', type=int, default=4, help='Number of continuous covariates')
+    parser.add_argument('--extraColumns', type=int, default=20, help='Unused columns that widen the phenotype table')
+    parser.add_argument('--chromosomes', type=int, default=2, help='Number of chromosomes (1..N)')
+    parser.add_argument('--variantsPerChr', type=int, default=20000, help='Variants per chromosome')
+    parser.add_argument('--peaksPerChr', type=float, default=1.0, help='Mean number of association peaks per chromosome and GWAS')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    parser.add_argument('--infoJson', default=None, help='Write a JSON description of the generated files here')
+    return parser
+
+
+def write_zst(df, path):
+    """Write a tab-separated table zstd-compressed like plink2 --glm zs, or plain text without zstd."""
+    text = df.to_csv(sep='\t', index=False, na_rep='NA', float_format='%.6g').encode()
+    try:
+        import zstandard
+        Path(f'{path}.zst').write_bytes(zstandard.ZstdCompressor().compress(text))
+        return Path(f'{path}.zst')
+    except ImportError:
+        pass
+    if shutil.which('zstd') is not None:
+        subprocess.run(['zstd', '-q', '-f', '-o', f'{path}.zst'], input=text, check=True)
+        return Path(f'{path}.zst')
+    Path(path).write_bytes(text)
+    return Path(path)
+
+
+def two_sided_p(z):
+    return np.frompyfunc(lambda x: math.erfc(abs(x) / math.sqrt(2)), 1, 1)(z).astype(float)
+
+
+def association_z(rng, positions, peaks_per_chr):
+    """Null N(0, 1) statistics plus a few towers of linked signal around random peak positions."""
+    z = rng.standard_normal(len(positions))
+    for _ in range(rng.poisson(peaks_per_chr)):
+        center = rng.choice(positions)
+        height = rng.uniform(4, 12)
+        width = (positions[-1] - positions[0]) / 500 + 1
+        z += rng.choice([-1, 1]) * height * np.exp(-np.abs(positions - center) / width)
+    return z
+
+
+def make_glm_output(rng, variants, n_obs, is_binary, peaks_per_chr):
+    n = len(variants)
+    z = association_z(rng, variants['POS'].to_numpy(), peaks_per_chr)
+    freq = rng.uniform(0.01, 0.5, n)
+    se = 1 / np.sqrt(2 * freq * (1 - freq) * n_obs)
+    beta = z * se
+    df = variants[['#CHROM', 'POS', 'ID', 'REF', 'ALT']].copy()
+    df['A1'] = df['ALT']
+    df['OMITTED'] = df['REF']
+    df['A1_FREQ'] = freq
+    df['TEST'] = 'ADD'
+    df['OBS_CT'] = n_obs
+    df['L95'] = beta - 1.96 * se
+    df['U95'] = beta + 1.96 * se
+    df['P'] = two_sided_p(z)
+    df['ERRCODE'] = '.'
+    if is_binary:
+        df['A1_CASE_FREQ'] = np.clip(freq + beta * freq * (1 - freq), 0, 1)
+        df['A1_CTRL_FREQ'] = freq
+        df['FIRTH?'] = 'N'
+        df['OR'] = np.exp(beta)
+        df['LOG(OR)_SE'] = se
+        df['L95'] = np.exp(df['L95'])
+        df['U95'] = np.exp(df['U95'])
+        df['Z_STAT'] = z
+        # A few unstable fits, as plink2 reports them
+        unstable = rng.random(n) < 1E-3
+        df.loc[unstable, ['OR', 'LOG(OR)_SE', 'L95', 'U95', 'Z_STAT', 'P']] = np.nan
+        df.loc[unstable, 'ERRCODE'] = 'FIRTH_CONVERGE_FAIL'
+        return df[LOGISTIC_COLS]
+    df['BETA'] = beta
+    df['SE'] = se
+    df['T_STAT'] = z
+    return df[LINEAR_COLS]
+
+
+def generate(out_dir, samples=10000, cohorts=3, bin_phenos=2, quant_phenos=2, cat_covars=2, cont_covars=4,
+             extra_columns=20, chromosomes=2, variants_per_chr=20000, peaks_per_chr=1.0, seed=42):
+    """
+    Write a synthetic biobank under out_dir and return a description of it.
+
+    Layout mirrors a pipeline launch directory: Input/ holds the phenotype/covariate table, cohort table,
+    related sample list and per-chromosome .psam/.pvar (the .pgen files are empty placeholders, only
+    checked for existence) and gene regions as BED, GLM/ holds per cohort x phenotype x chromosome
+    plink2 outputs and logs, and plink2_gwas.config points at all of it through ${launchDir}.
+    """
+    rng = np.random.default_rng(seed)
+    out_dir = Path(out_dir)
+    input_dir = out_dir / 'Input'
+    glm_dir = out_dir / 'GLM'
+    input_dir.mkdir(parents=True, exist_ok=True)
+    glm_dir.mkdir(parents=True, exist_ok=True)
+
+    ids = np.array([f'S{i:07d}' for i in range(samples)])
+    cohort_names = [f'COHORT_{i + 1}' for i in range(cohorts)]
+    bin_names = [f'bin_pheno_{i + 1}' for i in range(bin_phenos)]
+    quant_names = [f'quant_pheno_{i + 1}' for i in range(quant_phenos)]
+    cat_names = [f'cat_covar_{i + 1}' for i in range(cat_covars)]
+    cont_names = [f'cont_covar_{i + 1}' for i in range(cont_covars)]
+
+    # Phenotype and covariate table
+    data = {'IID': ids}
+    for name in cont_names:
+        data[name] = rng.normal(50, 10, samples)
+    for name in cat_names:
+        data[name] = rng.integers(0, 4, samples)
+    for name in bin_names:
+        values = (rng.random(samples) < rng.uniform(0.05, 0.3)).astype(float)
+        values[rng.random(samples) < 0.05] = np.nan
+        data[name] = values
+    for name in quant_names:
+        values = rng.normal(0, 1, samples)
+        values[rng.random(samples) < 0.05] = np.nan
+        data[name] = values
+    for i in range(extra_columns):
+        data[f'extra_{i + 1}'] = rng.integers(0, 2, samples)
+    pd.DataFrame(data).to_csv(input_dir / 'pheno_covars.csv', index=False, float_format='%.6g')
+
+    # Cohorts overlap like ancestry x sex groupings do
+    cohort_table = pd.DataFrame({'IID': ids})
+    for name in cohort_names:
+        cohort_table[name] = (rng.random(samples) < max(0.3, 1 / cohorts)).astype(int)
+    cohort_table.to_csv(input_dir / 'cohorts.csv', index=False)
+
+    pd.Series(rng.choice(ids, samples // 100, replace=False)).to_csv(
+        input_dir / 'related_samples.txt', index=False, header=False)
+
+    # Genotype sample and variant files; the genotypes themselves are never read outside plink2
+    psam = pd.DataFrame({'#FID': ids, 'IID': ids, 'SEX': rng.integers(1, 3, samples)})
+    annotations = []
+    gene_regions = []
+    all_variants = {}
+    for chr in range(1, chromosomes + 1):
+        prefix = input_dir / f'genotype.chr{chr}'
+        psam.to_csv(f'{prefix}.psam', sep='\t', index=False)
+        positions = np.sort(rng.choice(np.arange(1, variants_per_chr * 50), variants_per_chr, replace=False))
+        ref = rng.integers(0, 4, variants_per_chr)
+        alt = (ref + rng.integers(1, 4, variants_per_chr)) % 4
+        variants = pd.DataFrame({
+            '#CHROM': chr, 'POS': positions, 'ID': [f'{chr}:{p}' for p in positions],
+            'REF': np.array(list('ACGT'))[ref], 'ALT': np.array(list('ACGT'))[alt],
+        })
+        variants.to_csv(f'{prefix}.pvar', sep='\t', index=False)
+        Path(f'{prefix}.pgen').touch()
+        all_variants[chr] = variants
+        gene_regions.append(make_gene_regions(rng, chr, variants_per_chr * 50))
+
+        # Biofilter position annotations for every variant (label = variant ID, as in the pipeline)
+        genes = [f'GENE{chr}_{g}' for g in positions // 50000]
+        annotations.append(pd.DataFrame({
+            'position_label': variants['ID'], 'snp': [f'rs{chr}{p}' for p in positions], 'chr': chr, 'pos': positions,
+            'gene': np.where(rng.random(variants_per_chr) < 0.4, genes, None),
+            'upstream': genes, 'distance': rng.integers(0, 200000, variants_per_chr),
+            'downstream': [f'GENE{chr}_{g + 1}' for g in positions // 50000],
+            'distance.1': rng.integers(0, 200000, variants_per_chr),
+        }))
+    annot = pd.concat(annotations)
+    annot.columns = [c if c != 'distance.1' else 'distance' for c in annot.columns]
+    annot.to_csv(input_dir / 'biofilter_positions_annotations.txt', sep='\t', index=False)
+
+    # Gene coordinates for the interval annotator, and every variant as a Biofilter position file
+    pd.concat(gene_regions).to_csv(input_dir / 'genes.bed', sep='\t', index=False, header=False)
+    pd.concat(all_variants.values())[['#CHROM', 'ID', 'POS']].to_csv(
+        input_dir / 'all_positions.txt', sep=' ', index=False, header=False)
+
+    Path(input_dir / 'colnames.txt').write_text('\n'.join(f'{k}={v}' for k, v in COLNAMES.items()) + '\n')
+
+    # plink2 GLM outputs and their .log files per cohort x phenotype x chromosome
+    glm_files = {}
+    glm_logs = []
+    cohort_sizes = cohort_table[cohort_names].sum()
+    for cohort in cohort_names:
+        for pheno in bin_names + quant_names:
+            is_binary = pheno in bin_names
+            ext = 'glm.logistic.hybrid' if is_binary else 'glm.linear'
+            n_obs = int(cohort_sizes[cohort] * 0.95)
+            files = []
+            for chr, variants in all_variants.items():
+                df = make_glm_output(rng, variants, n_obs, is_binary, peaks_per_chr)
+                files.append(str(write_zst(df, glm_dir / f'{cohort}.{pheno}.{chr}.{ext}')))
+                log_file = glm_dir / f'{cohort}.{pheno}.{chr}.{"logistic" if is_binary else "linear"}.plink2.log'
+                n_cases = int(n_obs * rng.uniform(0.05, 0.3))
+                log_file.write_text(make_glm_log(cohort, pheno, chr, samples, n_obs, len(variants), len(df),
+                                                 is_binary, n_cases))
+                glm_logs.append(str(log_file))
+            glm_files[(cohort, pheno)] = files
+
+    write_config(out_dir, cohort_names, bin_names, quant_names, cat_names, cont_names, chromosomes)
+
+    return {
+        'out_dir': str(out_dir),
+        'data_csv': str(input_dir / 'pheno_covars.csv'),
+        'cohort_sets': str(input_dir / 'cohorts.csv'),
+        'related_list': str(input_dir / 'related_samples.txt'),
+        'plink_chr_prefix': str(input_dir / 'genotype.chr'),
+        'colnames': str(input_dir / 'colnames.txt'),
+        'biofilter_annotations': str(input_dir / 'biofilter_positions_annotations.txt'),
+        'gene_bed': str(input_dir / 'genes.bed'),
+        'all_positions': str(input_dir / 'all_positions.txt'),
+        'config': str(out_dir / 'plink2_gwas.config'),
+        'cohorts': cohort_names,
+        'bin_phenos': bin_names,
+        'quant_phenos': quant_names,
+        'cat_covars': cat_names,
+        'cont_covars': cont_names,
+        'chromosomes': list(range(1, chromosomes + 1)),
+        'glm_files': {f'{c}.{p}': files for (c, p), files in glm_files.items()},
+        'glm_logs': glm_logs,
+    }
+
+
+def write_config(out_dir, cohorts, bin_phenos, quant_phenos, cat_covars, cont_covars, chromosomes):
+    def groovy_list(values):
+        return '[' + ', '.join(f'"{v}"' for v in values) + ']'
+
+    config = io.StringIO()
+    config.write('params {\n')
+    config.write('    data_csv = "${launchDir}/Input/pheno_covars.csv"\n')
+    config.write('    cohort_sets = "${launchDir}/Input/cohorts.csv"\n')
+    config.write('    related_list = "${launchDir}/Input/related_samples.txt"\n')
+    config.write('    plink_chr_prefix = "${launchDir}/Input/genotype.chr"\n')
+    config.write('    plink_chr_suffix = ""\n')
+    config.write('    plink_flag = "--pfile"\n')
+    config.write('    id_col = "IID"\n')
+    config.write(f'    cohort_list = {groovy_list(cohorts)}\n')
+    config.write('    sex_strat_cohort_list = []\n')
+    config.write(f'    bin_pheno_list = {groovy_list(bin_phenos)}\n')
+    config.write(f'    quant_pheno_list = {groovy_list(quant_phenos)}\n')
+    config.write(f'    cat_covars = {groovy_list(cat_covars)}\n')
+    config.write(f'    cont_covars = {groovy_list(cont_covars)}\n')
+    config.write('    sex_strat_cat_covars = []\n')
+    config.write('    sex_strat_cont_covars = cont_covars\n')
+    config.write(f'    chromosome_list = {groovy_list(range(1, chromosomes + 1))}\n')
+    config.write('    min_bin_cases = 50\n')
+    config.write('    min_quant_n = 500\n')
+    config.write('    p_cutoff_summarize = 0.00001\n')
+    config.write('}\n')
+    (Path(out_dir) / 'plink2_gwas.config').write_text(config.getvalue())
+
+
+def make_gene_regions(rng, chr, span):
+    """Gene regions as BED rows (0-based start): about one gene per 60 kb, 1-100 kb long, some overlapping."""
+    n_genes = max(span // 60000, 1)
+    starts = np.sort(rng.integers(0, span, n_genes))
+    return pd.DataFrame({'chrom': f'chr{chr}', 'start': starts, 'end': starts + rng.integers(1000, 100000, n_genes),
+                         'name': [f'GENE{chr}_{g}' for g in range(n_genes)]})
+
+
+def make_glm_log(cohort, pheno, chr, n_loaded, n_obs, n_variants, n_tested, is_binary, n_cases):
+    """A plink2 --glm .log with the lines parse_plink2_logs.py reads."""
+    pheno_line = (f'1 binary phenotype loaded ({n_cases} cases, {n_obs - n_cases} controls).' if is_binary
+                  else f'1 quantitative phenotype loaded ({n_obs} values).')
+    cases_line = f'{n_cases} cases and {n_obs - n_cases} controls remaining after main filters.\n' if is_binary else ''
+    removed = n_variants - n_tested
+    return (
+        'PLINK v2.00a5.10LM 64-bit Intel (17 Apr 2024)\n'
+        'Options in effect:\n'
+        f'  --glm hide-covar\n  --keep {cohort}.sample_list.txt\n  --out {cohort}.{pheno}.{chr}\n\n'
+        'Start time: Tue Mar 12 10:03:44 2024\n'
+        '257672 MiB RAM detected; reserving 20000 MiB for main workspace.\n'
+        'Using up to 16 threads (change this with --threads).\n'
+        f'{n_loaded} samples ({n_loaded // 2} females, {n_loaded - n_loaded // 2} males; {n_loaded} founders) loaded from\n'
+        f'genotype.chr{chr}.psam.\n'
+        f'{n_variants} variants loaded from genotype.chr{chr}.pvar.\n'
+        f'{pheno_line}\n'
+        f'--keep: {n_obs} samples remaining.\n'
+        f'{n_obs} samples ({n_obs // 2} females, {n_obs - n_obs // 2} males; {n_obs} founders) remaining after main filters.\n'
+        f'{cases_line}'
+        f'--geno: {removed // 4} variants removed due to missing genotype data.\n'
+        f'--hwe: {removed // 4} variants removed due to Hardy-Weinberg exact test (founders only).\n'
+        f'{removed - 2 * (removed // 4)} variants removed due to allele frequency threshold(s)\n'
+        '(--maf/--max-maf/--mac/--max-mac).\n'
+        f'{n_tested} variants remaining after main filters.\n'
+        'End time: Tue Mar 12 10:05:14 2024\n'
+    )
+
+
+def main():
+    args = make_arg_parser().parse_args()
+    info = generate(args.outDir, samples=args.samples, cohorts=args.cohorts, bin_phenos=args.binPhenos,
+                    quant_phenos=args.quantPhenos, cat_covars=args.catCovars, cont_covars=args.contCovars,
+                    extra_columns=args.extraColumns, chromosomes=args.chromosomes,
+                    variants_per_chr=args.variantsPerChr, peaks_per_chr=args.peaksPerChr, seed=args.seed)
+    if args.infoJson is not None:
+        Path(args.infoJson).write_text(json.dumps(info, indent=2))
+    n_glm = sum(len(files) for files in info['glm_files'].values())
+    print(f"Synthetic biobank written to {info['out_dir']}: {args.samples} samples, {len(info['cohorts'])} cohorts, "
+          f"{args.chromosomes} x {args.variantsPerChr} variants, {n_glm} GLM outputs")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,377 @@
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import platform
+import textwrap
+import subprocess
+import importlib.util
+import argparse as ap
+from pathlib import Path
+from datetime import datetime, timezone
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+SCRIPTS_DIR = REPO_DIR / 'scripts'
+
+GENERATOR = Path(__file__).resolve().parent / 'generate_synthetic_biobank.py'
+
+# Synthetic input sizes (generate_synthetic_biobank.py arguments); each can be overridden on the command line
+SCALES = {
+    'tiny': dict(samples=2000, cohorts=2, binPhenos=1, quantPhenos=1, chromosomes=2, variantsPerChr=2000),
+    'small': dict(samples=10000, cohorts=3, binPhenos=2, quantPhenos=2, chromosomes=2, variantsPerChr=20000),
+    'medium': dict(samples=50000, cohorts=3, binPhenos=2, quantPhenos=2, chromosomes=4, variantsPerChr=100000),
+    'large': dict(samples=200000, cohorts=4, binPhenos=4, quantPhenos=4, chromosomes=22, variantsPerChr=250000),
+}
+
+
+def make_arg_parser():
+    parser = ap.ArgumentParser(
+        description="Time and record peak RSS of the pipeline's Python stages on synthetic inputs."
+    )
+    parser.add_argument('--scale', choices=SCALES.keys(), default='small', help='Synthetic input size preset')
+    parser.add_argument('--samples', type=int, help='Override the number of samples')
+    parser.add_argument('--cohorts', type=int, help='Override the number of cohorts')
+    parser.add_argument('--binPhenos', type=int, help='Override the number of binary phenotypes')
+    parser.add_argument('--quantPhenos', type=int, help='Override the number of quantitative phenotypes')
+    parser.add_argument('--chromosomes', type=int, help='Override the number of chromosomes')
+    parser.add_argument('--variantsPerChr', type=int, help='Override the variants per chromosome')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for the generator')
+    parser.add_argument('--workDir', default='benchmark_work',
+                        help='Scratch directory for synthetic inputs and stage outputs (recreated)')
+    parser.add_argument('--stages', nargs='*', default=None, help='Only run stages whose name starts with one of these')
+    parser.add_argument('-o', '--output', default='benchmark_results.json', help='JSON results file')
+    parser.add_argument('--baseline', default=None, help='Earlier results JSON to compare against')
+    parser.add_argument('--keep', action='store_true', help='Keep the work directory afterwards')
+    return parser
+
+
+class Stage:
+    """One benchmarked command: a pipeline script or an inline-Python process body."""
+
+    def __init__(self, name, cmd, requires=(), cwd='run', env=None):
+        self.name = name
+        self.cmd = cmd
+        self.requires = requires
+        self.cwd = cwd
+        self.env = env
+
+    def missing_modules(self):
+        return [m for m in self.requires if importlib.util.find_spec(m) is None]
+
+
+def run_stage(stage, work_dir):
+    """
+    Run a stage in its own process; wall time from the parent, CPU time and peak RSS from wait4().
+
+    Linux carries the parent's high-water RSS into a forked child, so this runner deliberately
+    never imports pandas/numpy itself (the generator runs as a separate process).
+    """
+    cwd = Path(work_dir) / stage.cwd
+    cwd.mkdir(parents=True, exist_ok=True)
+    log_file = cwd / f'{stage.name.replace("/", "_")}.log'
+    with open(log_file, 'w') as log:
+        start = time.perf_counter()
+        env = None if stage.env is None else {**os.environ, **stage.env}
+        proc = subprocess.Popen(stage.cmd, cwd=cwd, stdout=log, stderr=subprocess.STDOUT, env=env)
+        _, status, usage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return {
+        'status': 'ok' if proc.returncode == 0 else 'failed',
+        'returncode': proc.returncode,
+        'wall_s': round(wall, 3),
+        'cpu_s': round(usage.ru_utime + usage.ru_stime, 3),
+        'max_rss_mb': round(usage.ru_maxrss / 1024, 1),  # ru_maxrss is in KiB on Linux
+        'log': str(log_file),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Inline-Python processes from the .nf files
+# ---------------------------------------------------------------------------
+
+def extract_inline_python(nf_file, process_name, bindings):
+    """
+    Pull the Python body of a process that runs `#! ${params.my_python}` and resolve its ${...} expressions.
+
+    bindings maps each Groovy expression (the text inside ${}) to the value to substitute, so
+    the body runs exactly as Nextflow would render it.
+    """
+    text = Path(nf_file).read_text()
+    start = text.index(f'process {process_name} {{')
+    # Processes close with a '}' at the start of a line
+    end = text.find('\n}', start)
+    end = len(text) if end == -1 else end
+    shebang = text.find('#! ${params.my_python}', start, end)
+    if shebang == -1:
+        raise ValueError(f'Process {process_name} in {nf_file} has no inline `#! ${{params.my_python}}` body')
+    body_start = text.index('\n', shebang) + 1
+    body_end = text.index('"""', body_start)
+    body = text[body_start:body_end]
+
+    # Groovy string rules: backslash-newline joins lines, \$ and \\ are escapes
+    body = body.replace('\\\n', '')
+
+    def substitute(match):
+        expr = match.group(1)
+        if expr not in bindings:
+            raise KeyError(f'No benchmark binding for ${{{expr}}} in process {process_name}')
+        return str(bindings[expr])
+
+    body = re.sub(r'(?<!\\)\$\{(.*?)\}', substitute, body)
+    body = body.replace('\\$', '$').replace('\\\\', '\\')
+    return textwrap.dedent(body)
+
+
+def inline_stage(name, nf_file, process_name, bindings, work_dir, requires=('pandas',)):
+    script = Path(work_dir) / 'inline' / f'{process_name}.py'
+    script.parent.mkdir(parents=True, exist_ok=True)
+    script.write_text(extract_inline_python(nf_file, process_name, bindings))
+    # Nextflow stages helper modules next to the body; here they are imported from scripts/
+    return Stage(name, [sys.executable, str(script)], requires, env={'PYTHONPATH': str(SCRIPTS_DIR)})
+
+
+# ---------------------------------------------------------------------------
+# Stage list
+# ---------------------------------------------------------------------------
+
+def build_stages(info, work_dir):
+    py = sys.executable
+    run = Path(work_dir) / 'run'
+    cohort = info['cohorts'][0]
+    bin_pheno = info['bin_phenos'][0] if info['bin_phenos'] else None
+    phenos = info['bin_phenos'] + info['quant_phenos']
+    fam = f"{info['plink_chr_prefix']}{info['chromosomes'][0]}.psam"
+    plink_files = [f"{info['plink_chr_prefix']}{c}{ext}" for c in info['chromosomes'] for ext in ['.pgen', '.pvar', '.psam']]
+    col_map = dict(line.split('=', 1) for line in Path(info['colnames']).read_text().splitlines())
+    common = ['--data', info['data_csv'], '--samples', info['cohort_sets'], '--id', 'IID']
+
+    def script(name):
+        return str(SCRIPTS_DIR / name)
+
+    stages = [
+        Stage('preflight_checks', [py, script('preflight_checks.py'), *common, '--remove', info['related_list'],
+                                   '--cohorts', *info['cohorts'], '-b', *info['bin_phenos'], '-q', *info['quant_phenos'],
+                                   '--catCovars', *info['cat_covars'], '--contCovars', *info['cont_covars'],
+                                   '--plinkFiles', *plink_files, '--plinkFam', fam, '--report_only'], ('pandas',)),
+        Stage('estimate_run_resources', [py, script('estimate_run_resources.py'), '-c', info['config'],
+                                         '--launch_dir', info['out_dir']], ('pandas',)),
+        Stage('set_up_cohort_directory', [py, script('set_up_cohort_directory.py'), '--data', info['data_csv'],
+                                          '--cohort', cohort, '--samples', info['cohort_sets'], '--id', 'IID',
+                                          '--remove', info['related_list'], '--plinkFam', fam], ('pandas',)),
+        Stage('make_pheno_summary_table', [py, script('make_pheno_summary_table.py'), *common,
+                                           '--remove', info['related_list'], '--cohorts', *info['cohorts'],
+                                           '-b', *info['bin_phenos'], '-q', *info['quant_phenos'], '--plinkFam', fam],
+              ('pandas',)),
+        Stage('make_pheno_covar_summary_plots', [py, script('make_pheno_covar_summary_plots.py'), *common,
+                                                 '--cohorts', *info['cohorts'], '-b', *info['bin_phenos'],
+                                                 '-q', *info['quant_phenos'], '--plinkFam', fam],
+              ('pandas', 'seaborn', 'matplotlib')),
+        Stage('standardize_phenos', [py, script('standardize_phenos.py'), '-c', cohort,
+                                     '-p', str(run / f'{cohort}.plink2_pheno_covars.txt'),
+                                     '-s', str(run / f'{cohort}.sample_list.txt'), '--phenos', *phenos,
+                                     '--catCovars', *info['cat_covars'], '--contCovars', *info['cont_covars']],
+              ('pandas', 'numpy')),
+    ]
+
+    if bin_pheno is not None:
+        first_glm = info['glm_files'][f'{cohort}.{bin_pheno}'][0]
+        stages.append(Stage('make_firth_extract_list', [py, script('make_firth_extract_list.py'), '--sumstats', first_glm,
+                                                        '--output', 'firth_retest_ids.txt'], ('pandas',)))
+        stages.append(Stage('glm_result_cache_key', [py, script('glm_result_cache.py'), 'key', '--plink_files', *plink_files[:3],
+                                                     '--samples', str(run / f'{cohort}.sample_list.txt'),
+                                                     '--pheno_file', str(run / f'{cohort}.{bin_pheno}.pheno.tsv'),
+                                                     '--covar_file', str(run / f'{cohort}.covars.tsv.gz'),
+                                                     '--pheno', bin_pheno, '--glm_args', 'benchmark',
+                                                     '--plink2_version', 'benchmark', '--outputs', 'out.zst'], ()))
+
+    filtered = []
+    for pheno in phenos:
+        stages.append(Stage(f'merge_and_filter_plink2_results/{pheno}',
+                            [py, script('merge_and_filter_plink2_results.py'), '-p', pheno, '--cohort', cohort,
+                             '-c', info['colnames'], '-s', *info['glm_files'][f'{cohort}.{pheno}'],
+                             '--pvalue', '1e-5'], ('pandas',)))
+        filtered.append(str(run / f'{cohort}.{pheno}.filtered.plink2.csv'))
+
+    if phenos:
+        stages.append(Stage('make_manhattan_qq_plots', [py, script('make_manhattan_qq_plots.py'), '--pheno', phenos[0],
+                                                        '--cohort', cohort, '--colnames', info['colnames'],
+                                                        '--sumstats', str(run / f'{cohort}.{phenos[0]}.plink2.gz')],
+                            ('pandas', 'matplotlib', 'manhattan_plot')))
+
+    # Top-hits aggregation and annotation, in pipeline order: the Biofilter input starts from the aggregated table
+    columns = [col_map[k] for k in ['#CHROM', 'ID', 'POS']]
+    annot_csv = run / 'benchmark_biofilter_genes_rsids.csv'
+    # The cache only identifies LOKI by path, size and mtime, so an empty stand-in file is enough
+    loki_stub = run / 'loki.db'
+    loki_stub.parent.mkdir(parents=True, exist_ok=True)
+    loki_stub.touch()
+    nf = REPO_DIR / 'plink2_gwas.nf'
+    stages += [
+        Stage('make_summary_table', [py, script('aggregate_filtered_sumstats.py'), 'aggregate',
+                                     '--sumstats', *filtered, '--columns', *columns,
+                                     '--output', 'plink2_all_suggestive.csv'], ('pandas',)),
+        Stage('make_biofilter_positions_input', [py, script('biofilter_annotation_cache.py'), 'split',
+                                                 '--sumstats', 'plink2_all_suggestive.csv', '--columns', *columns,
+                                                 '--build', '38', '--loki', str(loki_stub),
+                                                 '--cache_db', str(run / 'biofilter_cache.db'),
+                                                 '--misses', 'plink2_gwas_biofilter_input_positions.txt',
+                                                 '--cached', 'plink2_gwas_biofilter_cached_annotations.txt'],
+              ('pandas',)),
+        # Interval annotator in place of Biofilter: the first run builds the gene index, the second reuses it
+        Stage('annotate_nearest_genes', [py, script('nearest_gene_annotator.py'), '--bed', info['gene_bed'],
+                                         '--positions', 'plink2_gwas_biofilter_input_positions.txt',
+                                         '--index_dir', str(run / 'gene_index'),
+                                         '--output', 'nearest_gene_annotations.tsv'], ('pandas', 'numpy')),
+        Stage('annotate_nearest_genes/all_variants', [py, script('nearest_gene_annotator.py'),
+                                                      '--bed', info['gene_bed'], '--positions', info['all_positions'],
+                                                      '--index_dir', str(run / 'gene_index'),
+                                                      '--output', 'nearest_gene_annotations.all_variants.tsv'],
+              ('pandas', 'numpy')),
+        # Inline-Python processes, rendered with the bindings Nextflow would use
+        inline_stage('inline/assign_positions_rsids_genes', REPO_DIR / 'biofilter_wrapper.nf', 'assign_positions_rsids_genes',
+                     {'params.my_python': sys.executable, 'annot_file': info['biofilter_annotations'],
+                      "params['biofilter_close_dist']": 5E4, 'data_nickname': 'benchmark'}, work_dir),
+        Stage('make_summary_table_with_annot', [py, script('aggregate_filtered_sumstats.py'), 'annotate',
+                                                '--table', 'plink2_all_suggestive.csv', '--annotations', str(annot_csv),
+                                                '--columns', *columns,
+                                                '--output', 'plink2_all_suggestive.annotated.csv'], ('pandas',)),
+        inline_stage('inline/collect_plot_files', nf, 'collect_plot_files',
+                     {'pheno_table': run / 'pheno_summaries.csv'}, work_dir),
+    ]
+
+    def write_params_json(path, bin_phenos, quant_phenos):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({
+            'cohorts_phenotypes_chromosomes': {'cohort_list': info['cohorts'], 'bin_pheno_list': bin_phenos,
+                                               'quant_pheno_list': quant_phenos,
+                                               'chromosome_list': info['chromosomes']},
+            'output_parameters': {'p_cutoff_summarize': 1E-5, 'column_name_map': col_map, 'annotate': False},
+        }))
+        return str(path)
+
+    params_json = write_params_json(run / 'plink2_gwas_params.json', info['bin_phenos'], info['quant_phenos'])
+    stages += [
+        Stage('parse_plink2_logs', [py, script('parse_plink2_logs.py'), '--cohorts', *info['cohorts'],
+                                    '--logs', *info['glm_logs'], '--output', 'plink2_glm_log_metrics.csv'],
+              ('pandas',)),
+        Stage('generate_plink_manifest', [py, script('generate_plink_manifest.py'), '--params_json', params_json,
+                                          '--pheno_summaries', str(run / 'pheno_summaries.csv'),
+                                          '--top_hits_csv', str(run / 'plink2_all_suggestive.csv'),
+                                          '--glm_log_metrics', str(run / 'plink2_glm_log_metrics.csv'),
+                                          '--plots_dir', str(run / 'Plots')], ()),
+        Stage('generate_plink_reports', [py, script('generate_plink_reports.py'), '--manifest', 'results_manifest.json',
+                                         '--output_zip', 'Plink_2.0_GWAS_Report.zip'], ('pandas',)),
+    ]
+
+    # Two phenotype shards, each with its own top-hits table and manifest, merged into one report;
+    # the shards share the phenotype summary and log metrics tables, so those merged tables hold every row twice
+    if len(phenos) >= 2:
+        shard_manifests = []
+        for i, shard_phenos in enumerate([phenos[::2], phenos[1::2]], start=1):
+            shard = run / f'shard_{i}'
+            shard_params = write_params_json(shard / 'plink2_gwas_params.json',
+                                             [p for p in info['bin_phenos'] if p in shard_phenos],
+                                             [p for p in info['quant_phenos'] if p in shard_phenos])
+            stages += [
+                Stage(f'make_summary_table/shard_{i}', [py, script('aggregate_filtered_sumstats.py'), 'aggregate',
+                                                        '--sumstats', *[f for p, f in zip(phenos, filtered)
+                                                                        if p in shard_phenos],
+                                                        '--columns', *columns,
+                                                        '--output', str(shard / 'plink2_all_suggestive.csv')],
+                      ('pandas',)),
+                Stage(f'generate_plink_manifest/shard_{i}',
+                      [py, script('generate_plink_manifest.py'), '--params_json', shard_params,
+                       '--pheno_summaries', str(run / 'pheno_summaries.csv'),
+                       '--top_hits_csv', str(shard / 'plink2_all_suggestive.csv'),
+                       '--glm_log_metrics', str(run / 'plink2_glm_log_metrics.csv'),
+                       '--plots_dir', str(run / 'Plots'), '--output', str(shard / 'results_manifest.json')], ()),
+            ]
+            shard_manifests.append(str(shard / 'results_manifest.json'))
+        stages.append(Stage('merge_plink_reports', [py, script('merge_plink_reports.py'), '--manifests', *shard_manifests,
+                                                    '--merged_dir', 'merged_report_inputs',
+                                                    '--output_zip', 'Merged_Plink_2.0_GWAS_Report.zip'], ('pandas',)))
+    return stages
+
+
+def compare(results, baseline_file):
+    baseline = json.loads(Path(baseline_file).read_text())['stages']
+    print(f'\nCompared with {baseline_file} (ratio = current / baseline)')
+    print(f"{'STAGE':<50}{'WALL':>10}{'RSS':>10}")
+    for name, result in results['stages'].items():
+        old = baseline.get(name)
+        if result['status'] != 'ok' or old is None or old.get('status') != 'ok':
+            continue
+        wall = result['wall_s'] / old['wall_s'] if old['wall_s'] else float('nan')
+        rss = result['max_rss_mb'] / old['max_rss_mb'] if old['max_rss_mb'] else float('nan')
+        print(f'{name:<50}{wall:>9.2f}x{rss:>9.2f}x')
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    args = make_arg_parser().parse_args()
+    scale = dict(SCALES[args.scale])
+    overrides = {'samples': args.samples, 'cohorts': args.cohorts, 'binPhenos': args.binPhenos,
+                 'quantPhenos': args.quantPhenos, 'chromosomes': args.chromosomes,
+                 'variantsPerChr': args.variantsPerChr}
+    scale.update({k: v for k, v in overrides.items() if v is not None})
+
+    work_dir = Path(args.workDir).resolve()
+    if work_dir.exists():
+        shutil.rmtree(work_dir)
+
+    start = time.perf_counter()
+    info_json = work_dir / 'synthetic_info.json'
+    work_dir.mkdir(parents=True)
+    generator_args = [f'--{k}={v}' for k, v in scale.items()]
+    subprocess.run([sys.executable, str(GENERATOR), '--outDir', str(work_dir / 'synthetic'), '--seed', str(args.seed),
+                    '--infoJson', str(info_json), *generator_args], check=True)
+    info = json.loads(info_json.read_text())
+    print(f'Generated synthetic inputs in {time.perf_counter() - start:.1f}s')
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'scale': {'preset': args.scale, 'seed': args.seed, **scale},
+        'stages': {},
+    }
+
+    for stage in build_stages(info, work_dir):
+        if args.stages and not any(stage.name.startswith(s) for s in args.stages):
+            continue
+        missing = stage.missing_modules()
+        if missing:
+            results['stages'][stage.name] = {'status': 'skipped', 'reason': f'missing modules: {missing}'}
+            print(f'{stage.name:<50} skipped (missing {", ".join(missing)})')
+            continue
+        result = run_stage(stage, work_dir)
+        results['stages'][stage.name] = result
+        print(f"{stage.name:<50} {result['status']:<7} {result['wall_s']:>9.2f}s wall "
+              f"{result['cpu_s']:>9.2f}s cpu {result['max_rss_mb']:>9.1f} MB peak RSS")
+
+    Path(args.output).write_text(json.dumps(results, indent=2))
+    print(f'\nResults written to {args.output}')
+
+    if args.baseline is not None:
+        compare(results, args.baseline)
+    if not args.keep:
+        shutil.rmtree(work_dir)
+    return 1 if any(r['status'] == 'failed' for r in results['stages'].values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,30 +1,94 @@
 
+// Set by plink2_gwas.nf with addParams, e.g. to a separate directory for smoke runs
+params.output_dir = "${launchDir}"
+// Defaults for running this file on its own; plink2_gwas.nf passes its own values through
+params.biofilter_cache_db = null
+params.biofilter_shard_by = null
+params.biofilter_shard_size = 10000
+params.biofilter_local_loki_dir = null
+params.gene_annotator = 'biofilter'
+params.gene_regions_bed = null
+params.gene_index_dir = null
+
 workflow {
     test_pos_file = "${launchDir}/test_positions_input.txt"
-    test_pos_channel = Channel.of(new Tuple('test_pos', test_pos_file))
+    test_pos_channel = Channel.of(new Tuple('test_pos', test_pos_file, []))
     test_output = BIOFILTER_POSITIONS(test_pos_channel)
 }
 
 workflow BIOFILTER_POSITIONS {
     take:
-        data_positions // channel with tuples of (data nickname, position file)
+        data_positions // channel with tuples of (data nickname, position file, cached annotations or [])
     main:
-        
-        bf_annot = call_biofilter_positions(
-            data_positions,
-            params['biofilter_script'],
-            params['biofilter_loki']
-            )
-
-        output_annot = assign_positions_rsids_genes(bf_annot)
+        biofilter_cache_script = "${moduleDir}/scripts/biofilter_annotation_cache.py"
+        nearest_gene_module = "${moduleDir}/scripts/nearest_gene_annotator.py"
+
+        if (params.gene_annotator == 'interval') {
+            // Nearest genes from an interval index over LOKI (or params.gene_regions_bed), without Biofilter
+            raw_annot = annotate_nearest_genes(
+                data_positions.map { nickname, positions, cached -> new Tuple(nickname, positions) },
+                nearest_gene_module,
+                params.gene_regions_bed ?: params['biofilter_loki']
+                )
+        }
+        else {
+            // Shards are annotated as separate tasks, so Biofilter runs on as many cores as Nextflow has
+            position_shards = split_biofilter_positions(
+                data_positions.map { nickname, positions, cached -> new Tuple(nickname, positions) }
+                ).flatMap { nickname, shards -> (shards instanceof List ? shards : [shards]).collect { shard -> new Tuple(nickname, shard) } }
+
+            shard_annot = call_biofilter_positions(
+                position_shards,
+                params['biofilter_script'],
+                params['biofilter_loki']
+                )
+
+            bf_annot = concat_biofilter_shards(shard_annot.groupTuple())
+
+            // Store the new annotations in params.biofilter_cache_db and add the cached ones back
+            raw_annot = merge_cached_annotations(
+                bf_annot.join(data_positions),
+                biofilter_cache_script,
+                params['biofilter_loki']
+                )
+        }
+
+        output_annot = assign_positions_rsids_genes(raw_annot, nearest_gene_module)
     emit:
         output_annot
 }
 
 ANNOTATIONS = 'position_label snp position gene upstream downstream'
 
+process split_biofilter_positions {
+    input:
+        tuple val(data_nickname), path(positions_file)
+    output:
+        tuple val(data_nickname), path("${data_nickname}.shard_*.txt")
+    script:
+        // Shard numbers follow the order of the positions, so concatenating them in name order keeps it
+        if (params.biofilter_shard_by == 'chromosome')
+            """
+            awk '!(\$1 in shard) { shard[\$1] = sprintf("${data_nickname}.shard_%05d.txt", n++) } { print > shard[\$1] }' ${positions_file}
+            [ -n "\$(ls ${data_nickname}.shard_*.txt 2> /dev/null)" ] || touch ${data_nickname}.shard_00000.txt
+            """
+        else if (params.biofilter_shard_by == 'positions')
+            """
+            split -l ${params.biofilter_shard_size} -d -a 5 --additional-suffix=.txt ${positions_file} ${data_nickname}.shard_
+            [ -n "\$(ls ${data_nickname}.shard_*.txt 2> /dev/null)" ] || touch ${data_nickname}.shard_00000.txt
+            """
+        else
+            """
+            cp ${positions_file} ${data_nickname}.shard_00000.txt
+            """
+    stub:
+        """
+        touch ${data_nickname}.shard_00000.txt
+        """
+}
+
 process call_biofilter_positions {
-    publishDir "${launchDir}/Annotations/"
+    tag "${positions_file.baseName}"
     errorStrategy 'retry'
     maxRetries 100
 
@@ -33,22 +97,63 @@ process call_biofilter_positions {
         val(biofilter_script)
         path(biofilter_loki)
     output:
-        tuple val(data_nickname), path("${data_nickname}_biofilter_positions_annotations.txt")
+        tuple val(data_nickname), path("${positions_file.baseName}.annotations.txt")
     script:
-        output_prefix = "${data_nickname}_biofilter_annotations"
+        output_prefix = "${positions_file.baseName}_biofilter_annotations"
         output_ext = ANNOTATIONS.split()[0] + '.' + ANNOTATIONS.split()[1..-1].join('-')
+        // Copy LOKI once per node, read-only, so parallel shards don't all read the shared filesystem copy
+        local_loki = params.biofilter_local_loki_dir == null ? '' : """
+            loki_source=\$(readlink -f ${biofilter_loki})
+            local_loki=${params.biofilter_local_loki_dir}/loki.\$(stat -c '%s.%Y' \$loki_source).db
+            mkdir -p ${params.biofilter_local_loki_dir}
+            (
+                flock 9
+                if [ ! -f \$local_loki ]; then
+                    cp \$loki_source \$local_loki.tmp
+                    chmod a-w \$local_loki.tmp
+                    mv \$local_loki.tmp \$local_loki
+                fi
+            ) 9> \$local_loki.lock
+            knowledge=\$local_loki
+        """
+        // Nothing to look up when every position came from the annotation cache
+        """
+        if [ -s ${positions_file} ]; then
+            knowledge=${biofilter_loki}
+            ${local_loki}
+            ${params.my_python} ${biofilter_script} \
+              --verbose \
+              --knowledge \$knowledge \
+              --position-file ${positions_file} \
+              --annotate ${ANNOTATIONS} \
+              --report-invalid-input \
+              --overwrite \
+              --prefix ${output_prefix} \
+              --ucsc-build-version ${params['biofilter_build']}
+
+            mv ${output_prefix}.${output_ext} ${positions_file.baseName}.annotations.txt
+        else
+            touch ${positions_file.baseName}.annotations.txt
+        fi
         """
-        ${params.my_python} ${biofilter_script} \
-          --verbose \
-          --knowledge ${biofilter_loki} \
-          --position-file ${positions_file} \
-          --annotate ${ANNOTATIONS} \
-          --report-invalid-input \
-          --overwrite \
-          --prefix ${output_prefix} \
-          --ucsc-build-version ${params['biofilter_build']}
+    stub:
+        """
+        touch ${positions_file.baseName}.annotations.txt
+        """
+}
+
+process concat_biofilter_shards {
+    publishDir "${params.output_dir}/Annotations/"
 
-        mv ${output_prefix}.${output_ext} ${data_nickname}_biofilter_positions_annotations.txt
+    input:
+        tuple val(data_nickname), path(shard_annots, stageAs: 'shards/*')
+    output:
+        tuple val(data_nickname), path("${data_nickname}_biofilter_positions_annotations.txt")
+    script:
+        // Keep the header of the first non-empty shard only; skipped or empty shards have no lines
+        """
+        awk 'FNR == 1 && header++ { next } { print }' ${shard_annots.sort { it.name }.join(' ')} \
+          > ${data_nickname}_biofilter_positions_annotations.txt
         """
     stub:
         """
@@ -56,11 +161,62 @@ process call_biofilter_positions {
         """
 }
 
+process merge_cached_annotations {
+    publishDir "${params.output_dir}/Annotations/"
+
+    input:
+        tuple val(data_nickname), path(new_annots), path(positions_file), path(cached_annots)
+        path biofilter_cache_script
+        path biofilter_loki
+    output:
+        tuple val(data_nickname), path("${data_nickname}_biofilter_merged_annotations.txt")
+    script:
+        cache_arg = params.biofilter_cache_db == null ? '' : "--cache_db ${params.biofilter_cache_db}"
+        cached_arg = cached_annots ? "--cached ${cached_annots}" : ''
+        """
+        ${params.my_python} ${biofilter_cache_script} merge \
+          --misses ${positions_file} \
+          --new ${new_annots} ${cached_arg} \
+          --build ${params['biofilter_build']} \
+          --loki ${biofilter_loki} ${cache_arg} \
+          --output ${data_nickname}_biofilter_merged_annotations.txt
+        """
+    stub:
+        """
+        touch ${data_nickname}_biofilter_merged_annotations.txt
+        """
+}
+
+process annotate_nearest_genes {
+    publishDir "${params.output_dir}/Annotations/"
+
+    input:
+        tuple val(data_nickname), path(positions_file)
+        path nearest_gene_module
+        path gene_source
+    output:
+        tuple val(data_nickname), path("${data_nickname}_nearest_gene_annotations.txt")
+    script:
+        source_arg = gene_source.name.endsWith('.db') ? "--loki ${gene_source}" : "--bed ${gene_source}"
+        """
+        ${params.my_python} ${nearest_gene_module} \
+          ${source_arg} \
+          --positions ${positions_file} \
+          --index_dir ${params.gene_index_dir ?: '.'} \
+          --output ${data_nickname}_nearest_gene_annotations.txt
+        """
+    stub:
+        """
+        touch ${data_nickname}_nearest_gene_annotations.txt
+        """
+}
+
 process assign_positions_rsids_genes {
-    publishDir "${launchDir}/Annotations"
+    publishDir "${params.output_dir}/Annotations"
 
     input:
         tuple val(data_nickname), path(annot_file)
+        path nearest_gene_module
     output:
         tuple val(data_nickname), path("${data_nickname}_biofilter_genes_rsids.csv")
     script:
@@ -68,31 +224,15 @@ process assign_positions_rsids_genes {
         #! ${params.my_python}
 
         import pandas as pd
-
-        def assign_gene_annotations(biofilter_df, close_dist=5E4):
-            # Picking first RSID by default because in dbSNP it's usually an SNV
-            biofilter_df = biofilter_df[~biofilter_df.index.duplicated(keep='first')]
-
-            # Define "close" as 50kb
-            biofilter_df[['u-close', 'd-close']] = biofilter_df[['distance', 'distance.1']] < float(close_dist)
-            biofilter_df['gene-combo'] = biofilter_df[['upstream', 'downstream']] \
-                                        .apply(lambda x: '/'.join(x.astype(str)),axis=1)
-            biofilter_df['missing'] = pd.isnull(biofilter_df['gene'])
-            biofilter_df['use-combo'] = (biofilter_df['u-close'] == biofilter_df['d-close']) \
-                                         & biofilter_df['missing']  # Both close or both far
-            biofilter_df['use-u'] = ~biofilter_df['use-combo'] & biofilter_df['missing'] & biofilter_df['u-close']
-            biofilter_df['use-d'] = ~biofilter_df['use-combo'] & biofilter_df['missing'] & biofilter_df['d-close']
-
-            biofilter_df['Gene'] = biofilter_df['gene']
-            for boolCol, geneCol in {'use-u': 'upstream', 'use-d': 'downstream', 'use-combo': 'gene-combo'}.items():
-                idx = biofilter_df.index[biofilter_df[boolCol]]
-                biofilter_df.loc[idx, 'Gene'] = biofilter_df.loc[idx, geneCol]
-
-            return biofilter_df
+        from nearest_gene_annotator import assign_gene_annotations
 
         df = pd.read_table('${annot_file}', index_col='position_label')
 
-        df = assign_gene_annotations(df, ${params['biofilter_close_dist']})
+        if df.empty:
+            # No position had an annotation
+            df = df.reindex(columns=['snp', 'chr', 'pos', 'Gene'])
+        else:
+            df = assign_gene_annotations(df, ${params['biofilter_close_dist']})
 
         outDF = df.reset_index()[['position_label', 'snp', 'chr', 'pos', 'Gene']]
         outDF = outDF.rename(columns={'position_label': 'Var_ID', 'snp': 'RSID',
@@ -10,7 +10,30 @@ params.putAll([
     quant_pheno_list: [],
     cohort_list: [],
     sex_strat_cohort_list: [],
-    chromosome_list: [21, 22]
+    chromosome_list: [21, 22],
+    two_stage_logistic: false,
+    firth_retest_p: 1E-3,
+    glm_cache_dir: null,
+    biofilter_cache_db: null,
+    biofilter_shard_by: null,
+    biofilter_shard_size: 10000,
+    biofilter_local_loki_dir: null,
+    gene_annotator: 'biofilter',
+    gene_regions_bed: null,
+    gene_index_dir: null,
+    skip_preflight: false,
+    smoke_test: false,
+    smoke_variants_per_chr: 1000,
+    smoke_variant_stride: 1,
+    smoke_samples_per_cohort: null,
+    smoke_output_dir: 'smoke_test',
+    metrics_dir: null,
+    python_profile_dir: null,
+    report_trace_file: null,
+    report_cache_dir: null,
+    report_incremental: false,
+    progress_dir: null,
+    progress_interval_s: 30
 ])
 
 params.related_list = null
@@ -18,6 +41,26 @@ params.related_list = null
 MIN_BIN_CASES = params.min_bin_cases
 MIN_QUANT_N = params.min_quant_n
 
+// Smoke runs publish to their own directory and report so they can't be mistaken for real results
+OUTPUT_DIR = params.smoke_test ? "${launchDir}/${params.smoke_output_dir}" : "${launchDir}"
+REPORT_ZIP = params.smoke_test ? 'Plink_2.0_GWAS_Report.SMOKE_TEST.zip' : 'Plink_2.0_GWAS_Report.zip'
+
+// Plot thumbnails (and other report build state) kept between runs so unchanged plots aren't reprocessed
+REPORT_CACHE_DIR = params.report_cache_dir == null ? "${OUTPUT_DIR}/.report_cache" : params.report_cache_dir
+
+PROGRESS_DIR = params.progress_dir == null ? "${OUTPUT_DIR}/Summary" : params.progress_dir
+// Live progress counters, updated from channel subscriptions in PLINK2_GWAS and written by write_progress()
+PROGRESS = [
+    combos: [:],               // "<cohort>.<pheno>" -> [cohort, pheno, glm_done, merged, plotted]
+    eligibility_channels_done: 0,
+    glm_done: 0, merged: 0, plotted: 0,
+    variants_tested: 0L, variant_samples: 0L,
+    // Time of the first GLM task (and its log) to finish, and the variant x samples of that log;
+    // rates are measured from there so cohort setup and phenotype standardization don't dilute them
+    first_glm_ms: null, first_glm_log_ms: null, first_variant_samples: 0L,
+    last_write_ms: 0L
+]
+
 workflow {
     log.info([
         "  NEXTFLOW - DSL2 - PLINK 2.0 GWAS - P I P E L I N E",
@@ -45,6 +88,15 @@ workflow {
         String.format("  %-25s : %s", "plink_flag", params.plink_flag),
         String.format("  %-25s : %s", "id_col", params.id_col),
         String.format("  %-25s : %s", "related_list", params.related_list),
+        String.format("  %-25s : %s", "glm_cache_dir", params.glm_cache_dir),
+        String.format("  %-25s : %s", "biofilter_cache_db", params.biofilter_cache_db),
+        String.format("  %-25s : %s", "biofilter_shard_by", params.biofilter_shard_by),
+        String.format("  %-25s : %s", "biofilter_shard_size", params.biofilter_shard_size),
+        String.format("  %-25s : %s", "biofilter_local_loki_dir", params.biofilter_local_loki_dir),
+        String.format("  %-25s : %s", "gene_annotator", params.gene_annotator),
+        String.format("  %-25s : %s", "gene_regions_bed", params.gene_regions_bed),
+        String.format("  %-25s : %s", "gene_index_dir", params.gene_index_dir),
+        String.format("  %-25s : %s", "skip_preflight", params.skip_preflight),
         "",
         "  Covariates",
         "  " + "=" * 50,
@@ -61,17 +113,237 @@ workflow {
         String.format("  %-25s : %s", "min_maf", params.min_maf),
         String.format("  %-25s : %s", "max_missing_per_variant", params.max_missing_per_var),
         String.format("  %-25s : %s", "min_hardy_p_value", params.hwe_min_pvalue),
+        String.format("  %-25s : %s", "two_stage_logistic", params.two_stage_logistic),
+        String.format("  %-25s : %s", "firth_retest_p", params.firth_retest_p),
         "",
         "  Output Parameters",
         "  " + "=" * 50,
         String.format("  %-25s : %s", "p-value filter", params.p_cutoff_summarize),
         String.format("  %-25s : %s", "column name map", params.plink2_col_names),
         String.format("  %-25s : %s", "annotate", params.annotate),
+        "",
+        "  Smoke Test",
+        "  " + "=" * 50,
+        String.format("  %-25s : %s", "smoke_test", params.smoke_test),
+        String.format("  %-25s : %s", "smoke_variants_per_chr", params.smoke_variants_per_chr),
+        String.format("  %-25s : %s", "smoke_variant_stride", params.smoke_variant_stride),
+        String.format("  %-25s : %s", "smoke_samples_per_cohort", params.smoke_samples_per_cohort),
+        String.format("  %-25s : %s", "output_dir", OUTPUT_DIR),
+        "",
+        "  Instrumentation",
+        "  " + "=" * 50,
+        String.format("  %-25s : %s", "metrics_dir", params.metrics_dir),
+        String.format("  %-25s : %s", "python_profile_dir", params.python_profile_dir),
+        String.format("  %-25s : %s", "report_trace_file", params.report_trace_file),
+        String.format("  %-25s : %s", "report_cache_dir", REPORT_CACHE_DIR),
+        String.format("  %-25s : %s", "report_incremental", params.report_incremental),
+        String.format("  %-25s : %s", "progress_dir", PROGRESS_DIR),
     ].join("\n"))
     // Channel with tuples of (cohort, phenotype, sumstats file)
     cohort_pheno_sumstats = PLINK2_GWAS()
 }
 
+workflow.onComplete {
+    write_progress(true)
+    if (workflow.success && params.report_trace_file != null) {
+        add_performance_page()
+    }
+}
+
+void add_performance_page() {
+    // The trace only covers every task once the run is over, so the Performance page is added to the
+    // published report here instead of in make_results_report; the other pages are copied unchanged
+    def command = [
+        params.my_python, "${projectDir}/scripts/generate_plink_reports.py".toString(),
+        '--manifest', 'results_manifest.json',
+        '--trace', file(params.report_trace_file).toString(),
+        '--incremental',
+        '--workers', '1',
+        '--no_report_dir',
+        '--cache_dir', REPORT_CACHE_DIR.toString(),
+        '--output_zip', REPORT_ZIP
+    ]
+    def proc = command.execute(null, new File(OUTPUT_DIR.toString()))
+    def output = new StringBuilder()
+    proc.consumeProcessOutput(output, output)
+    if (proc.waitFor() != 0) {
+        log.warn "Could not add the Pipeline Performance page to ${OUTPUT_DIR}/${REPORT_ZIP}:\n${output}"
+    }
+    else {
+        log.info "Added the Pipeline Performance page to ${OUTPUT_DIR}/${REPORT_ZIP}"
+    }
+}
+
+String summarize_glm_compression(summary_file) {
+    // One log line with the total space saved by compressing GLM outputs
+    def rows = summary_file.readLines().drop(1).collect { line -> line.split(',') }.findAll { row -> row.size() == 5 }
+    long compressed = rows.collect { row -> row[3].toLong() }.sum(0L)
+    long uncompressed = rows.collect { row -> row[4].toLong() }.sum(0L)
+    double ratio = compressed > 0 ? uncompressed / compressed : 0
+    return String.format("  GLM outputs: %,d bytes compressed vs %,d bytes uncompressed (%.1fx, %,d bytes saved) -> %s",
+        compressed, uncompressed, ratio, uncompressed - compressed, summary_file)
+}
+
+void progress_event(String event, String cohort = null, String pheno = null, glm_log = null) {
+    // Record one eligible combination or stage completion, then rewrite the progress files if due
+    synchronized (PROGRESS) {
+        def key = "${cohort}.${pheno}".toString()
+        if (event == 'eligible') {
+            PROGRESS.combos[key] = [cohort: cohort, pheno: pheno, glm_done: 0, merged: false, plotted: false]
+        }
+        else if (event == 'eligibility_known') {
+            PROGRESS.eligibility_channels_done += 1
+        }
+        else if (event == 'glm') {
+            if (PROGRESS.glm_done == 0) {
+                PROGRESS.first_glm_ms = System.currentTimeMillis()
+            }
+            PROGRESS.glm_done += 1
+            if (PROGRESS.combos[key] != null) {
+                PROGRESS.combos[key].glm_done += 1
+            }
+        }
+        else if (event == 'glm_log') {
+            // plink2 wraps long log lines, so match on the joined text
+            def text = glm_log.readLines()*.trim().join(' ')
+            def variants = (text =~ /(\d+) variants? remaining after main filters/)
+            def samples = (text =~ /(\d+) samples? \([^)]*\) remaining after main filters/)
+            if (variants.find() && samples.find()) {
+                long variant_samples = variants.group(1).toLong() * samples.group(1).toLong()
+                if (PROGRESS.first_glm_log_ms == null) {
+                    PROGRESS.first_glm_log_ms = System.currentTimeMillis()
+                    PROGRESS.first_variant_samples = variant_samples
+                }
+                PROGRESS.variants_tested += variants.group(1).toLong()
+                PROGRESS.variant_samples += variant_samples
+            }
+        }
+        else if (event in ['merged', 'plotted'] && PROGRESS.combos[key] != null && !PROGRESS.combos[key][event]) {
+            PROGRESS.combos[key][event] = true
+            PROGRESS[event] += 1
+        }
+    }
+    write_progress(false)
+}
+
+void write_progress(Boolean finished) {
+    // Status JSON and a Prometheus textfile-collector file, throttled to one write per progress_interval_s.
+    // Writes happen under the PROGRESS lock so concurrent channel callbacks never interleave
+    synchronized (PROGRESS) {
+        long now_ms = System.currentTimeMillis()
+        if (!finished && now_ms - PROGRESS.last_write_ms < params.progress_interval_s * 1000) {
+            return
+        }
+        PROGRESS.last_write_ms = now_ms
+
+        int n_chr = params.chromosome_list.size()
+        int n_combos = PROGRESS.combos.size()
+        int glm_eligible = n_combos * n_chr
+        double elapsed_s = (now_ms - workflow.start.toInstant().toEpochMilli()) / 1000.0
+        // Extrapolate from the chromosome tasks finished since the first one; unknown until a second one completes
+        double glm_elapsed_s = PROGRESS.first_glm_ms == null ? 0 : (now_ms - PROGRESS.first_glm_ms) / 1000.0
+        double glm_rate = glm_elapsed_s > 0 ? (PROGRESS.glm_done - 1) / glm_elapsed_s : 0
+        double log_elapsed_s = PROGRESS.first_glm_log_ms == null ? 0 : (now_ms - PROGRESS.first_glm_log_ms) / 1000.0
+        int glm_remaining = Math.max(glm_eligible - PROGRESS.glm_done, 0)
+        Long eta_s = glm_rate > 0 ? Math.round(glm_remaining / glm_rate) : null
+
+        def status = [
+            updated_at: java.time.Instant.ofEpochMilli(now_ms).toString(),
+            started_at: workflow.start.toString(),
+            elapsed_s: Math.round(elapsed_s),
+            finished: finished,
+            success: finished ? workflow.success : null,
+            eligible_combos: n_combos,
+            eligibility_final: PROGRESS.eligibility_channels_done >= 2,
+            stages: [
+                glm:   [completed: PROGRESS.glm_done, eligible: glm_eligible],
+                merge: [completed: PROGRESS.merged, eligible: n_combos],
+                plot:  [completed: PROGRESS.plotted, eligible: n_combos]
+            ],
+            throughput: [
+                variants_tested: PROGRESS.variants_tested,
+                variant_samples: PROGRESS.variant_samples,
+                variant_samples_per_s: log_elapsed_s > 0 ? Math.round((PROGRESS.variant_samples - PROGRESS.first_variant_samples) / log_elapsed_s) : 0
+            ],
+            eta: [
+                remaining_glm_tasks: glm_remaining,
+                glm_tasks_per_hour: Math.round(glm_rate * 3600 * 10) / 10.0,
+                eta_s: finished ? 0 : eta_s,
+                eta_at: (finished || eta_s == null) ? null : java.time.Instant.ofEpochMilli(now_ms + eta_s * 1000).toString()
+            ],
+            combos: PROGRESS.combos.values().collect { combo ->
+                combo + [glm_total: n_chr]
+            }
+        ]
+
+        def cohorts = status.combos.groupBy { combo -> combo.cohort }
+        def prom = [
+            '# HELP plink2_gwas_eligible_combos Cohort x phenotype combinations that passed the case/sample filters',
+            '# TYPE plink2_gwas_eligible_combos gauge',
+            "plink2_gwas_eligible_combos ${status.eligible_combos}",
+            '# HELP plink2_gwas_stage_completed Completed tasks per stage (glm counts chromosome tasks)',
+            '# TYPE plink2_gwas_stage_completed gauge',
+        ]
+        status.stages.each { stage, counts -> prom.add("plink2_gwas_stage_completed{stage=\"${stage}\"} ${counts.completed}") }
+        prom.addAll(['# HELP plink2_gwas_stage_eligible Eligible tasks per stage', '# TYPE plink2_gwas_stage_eligible gauge'])
+        status.stages.each { stage, counts -> prom.add("plink2_gwas_stage_eligible{stage=\"${stage}\"} ${counts.eligible}") }
+        prom.addAll(['# HELP plink2_gwas_cohort_combos_completed Combinations per cohort done with each stage',
+                     '# TYPE plink2_gwas_cohort_combos_completed gauge'])
+        cohorts.each { cohort, combos ->
+            prom.add("plink2_gwas_cohort_combos_completed{cohort=\"${cohort}\",stage=\"glm\"} ${combos.count { c -> c.glm_done >= c.glm_total }}")
+            prom.add("plink2_gwas_cohort_combos_completed{cohort=\"${cohort}\",stage=\"merge\"} ${combos.count { c -> c.merged }}")
+            prom.add("plink2_gwas_cohort_combos_completed{cohort=\"${cohort}\",stage=\"plot\"} ${combos.count { c -> c.plotted }}")
+        }
+        prom.addAll([
+            '# HELP plink2_gwas_variant_samples_per_second Variants tested x samples per second of run time',
+            '# TYPE plink2_gwas_variant_samples_per_second gauge',
+            "plink2_gwas_variant_samples_per_second ${status.throughput.variant_samples_per_s}",
+            '# HELP plink2_gwas_eta_seconds Estimated seconds until the last GLM task finishes (-1 if unknown)',
+            '# TYPE plink2_gwas_eta_seconds gauge',
+            "plink2_gwas_eta_seconds ${status.eta.eta_s == null ? -1 : status.eta.eta_s}",
+            '# HELP plink2_gwas_finished 1 once the workflow has completed',
+            '# TYPE plink2_gwas_finished gauge',
+            "plink2_gwas_finished ${finished ? 1 : 0}",
+            '# HELP plink2_gwas_progress_updated_seconds Unix time of this update',
+            '# TYPE plink2_gwas_progress_updated_seconds gauge',
+            "plink2_gwas_progress_updated_seconds ${PROGRESS.last_write_ms.intdiv(1000)}",
+        ])
+
+        // Write to a temporary file and rename so readers never see a partial file
+        def progress_dir = file(PROGRESS_DIR)
+        progress_dir.mkdirs()
+        [
+            'plink2_gwas_progress.json': new JsonBuilder(status).toPrettyString(),
+            'plink2_gwas_progress.prom': prom.join('\n') + '\n'
+        ].each { name, text ->
+            def tmp = progress_dir.resolve(".${name}.tmp".toString())
+            tmp.text = text
+            java.nio.file.Files.move(tmp, progress_dir.resolve(name), java.nio.file.StandardCopyOption.REPLACE_EXISTING)
+        }
+    }
+}
+
+String get_metrics_env() {
+    // Point the scripts' pipeline_metrics.py records (and optional cProfile dumps) at shared directories
+    def exports = []
+    if (params.metrics_dir != null) {
+        exports.add("export PLINK2_GWAS_METRICS_DIR=${file(params.metrics_dir)}")
+    }
+    if (params.python_profile_dir != null) {
+        exports.add("export PLINK2_GWAS_PROFILE_DIR=${file(params.python_profile_dir)}")
+    }
+    return exports.join('\n')
+}
+
+Boolean check_preflight_report(report) {
+    // Stop the run with the failed checks if the preflight report has any
+    def failures = report.readLines().drop(1).findAll { line -> line.split('\t')[1] == 'FAIL' }
+    if (failures.size() > 0) {
+        error("Preflight checks failed (see ${OUTPUT_DIR}/Summary/preflight_report.tsv):\n  " + failures.join('\n  '))
+    }
+    return true
+}
+
 def paramToList(param) {
     // Function to check if parameter is a file or list
     if (param instanceof List) {
@@ -89,7 +361,7 @@ def paramToList(param) {
     }
 }
 
-include { BIOFILTER_POSITIONS } from "${moduleDir}/biofilter_wrapper.nf"
+include { BIOFILTER_POSITIONS } from "${moduleDir}/biofilter_wrapper.nf" addParams(output_dir: OUTPUT_DIR)
 
 workflow PLINK2_GWAS {
     main:
@@ -103,11 +375,20 @@ workflow PLINK2_GWAS {
         chromosome = Channel.fromList(params.chromosome_list)
         plink_suffixes_list = params.plink_flag == '--bfile' ? ['.bed', '.bim', '.fam'] : ['.pgen', '.pvar', '.psam']
 
+        preflight_script = "${moduleDir}/scripts/preflight_checks.py"
         cohort_setup_script = "${moduleDir}/scripts/set_up_cohort_directory.py"
         standardize_pheno_script = "${moduleDir}/scripts/standardize_phenos.py"
         pheno_table_script = "${moduleDir}/scripts/make_pheno_summary_table.py"
         pheno_covar_plots_script = "${moduleDir}/scripts/make_pheno_covar_summary_plots.py"
         merge_plink2_script = "${moduleDir}/scripts/merge_and_filter_plink2_results.py"
+        firth_extract_script = "${moduleDir}/scripts/make_firth_extract_list.py"
+        glm_cache_script = "${moduleDir}/scripts/glm_result_cache.py"
+        biofilter_cache_script = "${moduleDir}/scripts/biofilter_annotation_cache.py"
+        aggregate_hits_script = "${moduleDir}/scripts/aggregate_filtered_sumstats.py"
+        glm_io_module = "${moduleDir}/scripts/glm_io.py"
+        metrics_module = "${moduleDir}/scripts/pipeline_metrics.py"
+        nextflow_trace_module = "${moduleDir}/scripts/nextflow_trace.py"
+        plink2_log_script = "${moduleDir}/scripts/parse_plink2_logs.py"
         plotting_script = "${moduleDir}/scripts/make_manhattan_qq_plots.py"
         manifest_script = "${moduleDir}/scripts/generate_plink_manifest.py"
         report_script = "${moduleDir}/scripts/generate_plink_reports.py"
@@ -115,16 +396,54 @@ workflow PLINK2_GWAS {
         pheno_covar_table = "${params.data_csv}"
         cohort_table = "${params.cohort_sets}"
         related_file = params.related_list == null ? [] : "${params.related_list}"
+        // The last published report, whose unchanged pages the report task can copy instead of rebuilding
+        previous_report = file("${OUTPUT_DIR}/${REPORT_ZIP}")
+        previous_report = params.report_incremental && previous_report.exists() ? previous_report : []
 
         plink_fam = "${params.plink_chr_prefix}${params.chromosome_list.get(0)}${params.plink_chr_suffix}${plink_suffixes_list.get(2)}"
+
+        // Cheap header / ID / file checks so bad inputs fail before any GLM task is queued
+        if (params.skip_preflight) {
+            preflight_passed = Channel.value(true)
+        }
+        else {
+            all_plink_files = params.chromosome_list.collectMany { chr ->
+                plink_suffixes_list.collect { suffix -> "${params.plink_chr_prefix}${chr}${params.plink_chr_suffix}${suffix}" }
+            }
+            // Checked here rather than in the task, which does not stage the genotype files
+            missing_plink_files = all_plink_files.findAll { f -> !file(f).exists() }
+            preflight_report = preflight_checks(
+                preflight_script,
+                pheno_covar_table,
+                cohort_table,
+                plink_fam,
+                related_file,
+                all_plink_files,
+                missing_plink_files,
+                bin_pheno_list,
+                quant_pheno_list
+            )
+            preflight_passed = preflight_report.map { report -> check_preflight_report(report) }
+        }
+
         cohort_tables_samples = set_up_cohort(
             cohort, cohort_setup_script,
             pheno_covar_table,
             cohort_table,
             plink_fam,
-            related_file
+            related_file,
+            preflight_passed,
+            metrics_module
         )
-        standardized_pheno_files = standardize_phenos(cohort_tables_samples, standardize_pheno_script)
+        standardized_pheno_files = standardize_phenos(cohort_tables_samples, standardize_pheno_script, metrics_module, bin_pheno_list + quant_pheno_list)
+
+        // Each GLM task stages only its own (cohort, pheno, pheno file, covariate file, sample list)
+        slim_pheno_files = standardized_pheno_files.phenos.flatMap { cohort, pheno_files ->
+            (pheno_files instanceof List ? pheno_files : [pheno_files]).collect { f ->
+                new Tuple(cohort, f.name.substring(cohort.length() + 1, f.name.length() - '.pheno.tsv'.length()), f)
+            }
+        }
+        slim_gwas_inputs = slim_pheno_files.combine(standardized_pheno_files.covars, by: 0)
 
         // make pheno summary table, conditionally handle empty phenotype lists
         pheno_table = make_pheno_summaries(
@@ -134,7 +453,8 @@ workflow PLINK2_GWAS {
                 plink_fam,
                 pheno_covar_table, cohort_table,
                 pheno_table_script,
-                related_file
+                related_file,
+                metrics_module
                 )
         pheno_plots = make_pheno_covar_summary_plots(
                 cohort.collect(),
@@ -146,7 +466,7 @@ workflow PLINK2_GWAS {
                 )
 
         // parse the pheno-cohort summary table
-        pheno_table_filename = "${launchDir}/Summary/pheno_summaries.csv"
+        pheno_table_filename = "${OUTPUT_DIR}/Summary/pheno_summaries.csv"
         // parse the pheno-cohort summary table
         all_pheno_table_lines = parse_pheno_summary_table(pheno_table, pheno_table_filename)
         num_combos = params.cohort_list.size() * (bin_pheno_list.size() + quant_pheno_list.size())
@@ -175,6 +495,9 @@ workflow PLINK2_GWAS {
                 cohort, pheno -> !sex_pheno_list.contains(pheno) || \
                 (sex_pheno_list.contains(pheno) && params.sex_strat_cohort_list.contains(cohort))
             }
+        keep_cohort_bin_pheno_combos.subscribe(
+            onNext: { cohort, pheno -> progress_event('eligible', cohort, pheno) },
+            onComplete: { progress_event('eligibility_known') })
         cohort_quant_pheno_ct = quant_pheno_info.map { row -> new Tuple(row.get(0), row.get(1), row.get(2) == '' ? 0 : row.get(2).toDouble()) }
         keep_cohort_quant_pheno_combos = cohort_quant_pheno_ct.filter { cohort, pheno, count -> count >= MIN_QUANT_N } \
             .map { cohort, pheno, count -> new Tuple(cohort, pheno) } \
@@ -186,34 +509,69 @@ workflow PLINK2_GWAS {
                 (sex_pheno_list.contains(pheno) && params.sex_strat_cohort_list.contains(cohort))
             }
 
-        gwas_bin_pheno_data = standardized_pheno_files.combine(bin_pheno).combine(chromosome).map { cohort, data, samples, pheno, chr -> new Tuple(cohort, pheno, chr, data, samples) }
+        keep_cohort_quant_pheno_combos.subscribe(
+            onNext: { cohort, pheno -> progress_event('eligible', cohort, pheno) },
+            onComplete: { progress_event('eligibility_known') })
+
+        gwas_bin_pheno_data = slim_gwas_inputs.combine(chromosome).map { cohort, pheno, pheno_file, covar_file, samples, chr -> new Tuple(cohort, pheno, chr, pheno_file, covar_file, samples) }
         gwas_bin_pheno_data = gwas_bin_pheno_data.join(keep_cohort_bin_pheno_combos.combine(chromosome), by: [0, 1, 2])
-        gwas_bin_pheno_all_input = gwas_bin_pheno_data.map { cohort, pheno, chr, data, samples ->
-            new Tuple(cohort, pheno, chr, data, samples, plink_suffixes_list.collect {
+        gwas_bin_pheno_all_input = gwas_bin_pheno_data.map { cohort, pheno, chr, pheno_file, covar_file, samples ->
+            new Tuple(cohort, pheno, chr, pheno_file, covar_file, samples, plink_suffixes_list.collect {
                 ext -> "${params.plink_chr_prefix}${chr}${params.plink_chr_suffix}${ext}"
             },
             "${params.plink_chr_prefix}${chr}${params.plink_chr_suffix}".tokenize('/').last()
             )
         }
 
-        gwas_bin_results_by_chr = call_plink2_logistic(gwas_bin_pheno_all_input)
+        if (params.two_stage_logistic) {
+            // Fast logistic pass on everything, then Firth only on small-P or unstable variants
+            (first_pass_by_chr, first_pass_logs) = call_plink2_logistic_first_pass(gwas_bin_pheno_all_input, glm_cache_script)
+            firth_retest_input = gwas_bin_pheno_all_input.join(first_pass_by_chr, by: [0, 1, 2])
+            (firth_by_chr, firth_logs) = call_plink2_firth_retest(firth_retest_input, firth_extract_script, glm_io_module, glm_cache_script)
+            gwas_bin_results_by_chr = first_pass_by_chr.join(firth_by_chr, by: [0, 1, 2]) \
+                .map { cohort, pheno, chr, first_pass, firth -> new Tuple(cohort, pheno, chr, [first_pass, firth]) }
+            gwas_bin_logs = first_pass_logs.concat(firth_logs)
+            // The Firth re-test only covers a subset of variants, so it doesn't count toward variants tested
+            gwas_bin_main_logs = first_pass_logs
+        }
+        else {
+            (gwas_bin_results_by_chr, gwas_bin_logs) = call_plink2_logistic(gwas_bin_pheno_all_input, glm_cache_script)
+            gwas_bin_main_logs = gwas_bin_logs
+        }
 
-        gwas_quant_pheno_data = standardized_pheno_files.combine(quant_pheno).combine(chromosome).map { cohort, data, samples, pheno, chr -> new Tuple(cohort, pheno, chr, data, samples) }
+        gwas_quant_pheno_data = slim_gwas_inputs.combine(chromosome).map { cohort, pheno, pheno_file, covar_file, samples, chr -> new Tuple(cohort, pheno, chr, pheno_file, covar_file, samples) }
         gwas_quant_pheno_data = gwas_quant_pheno_data.join(keep_cohort_quant_pheno_combos.combine(chromosome), by: [0, 1, 2])
-        gwas_quant_pheno_all_input = gwas_quant_pheno_data.map { cohort, pheno, chr, data, samples ->
-            new Tuple(cohort, pheno, chr, data, samples, plink_suffixes_list.collect {
+        gwas_quant_pheno_all_input = gwas_quant_pheno_data.map { cohort, pheno, chr, pheno_file, covar_file, samples ->
+            new Tuple(cohort, pheno, chr, pheno_file, covar_file, samples, plink_suffixes_list.collect {
                 ext -> "${params.plink_chr_prefix}${chr}${params.plink_chr_suffix}${ext}"
             },
             "${params.plink_chr_prefix}${chr}${params.plink_chr_suffix}".tokenize('/').last()
             )
         }
 
-        gwas_quant_results_by_chr = call_plink2_linear(gwas_quant_pheno_all_input)
+        (gwas_quant_results_by_chr, gwas_quant_logs) = call_plink2_linear(gwas_quant_pheno_all_input, glm_cache_script)
+
+        // One table of sample counts, variant QC losses, threads, memory and run time from every GLM task's plink2 log
+        all_glm_logs = gwas_bin_logs.concat(gwas_quant_logs).map { cohort, pheno, chr, glm_log -> glm_log }.collect().ifEmpty([])
+        glm_log_metrics = summarize_plink2_logs(all_glm_logs, plink2_log_script)
+
+        // Live progress: chromosome tasks, their plink2 logs (for throughput), merges and plots
+        gwas_bin_results_by_chr.concat(gwas_quant_results_by_chr) \
+            .subscribe { cohort, pheno, chr, glm_output -> progress_event('glm', cohort, pheno) }
+        gwas_bin_main_logs.concat(gwas_quant_logs) \
+            .subscribe { cohort, pheno, chr, glm_log -> progress_event('glm_log', cohort, pheno, glm_log) }
 
         all_gwas_results_by_chr = gwas_bin_results_by_chr.concat(gwas_quant_results_by_chr)
-        all_gwas_results_grouped = all_gwas_results_by_chr.groupTuple(by: [0, 1], size: params.chromosome_list.size())
+        all_gwas_results_grouped = all_gwas_results_by_chr.groupTuple(by: [0, 1], size: params.chromosome_list.size()) \
+            .map { cohort, pheno, chr_list, chr_inputs -> new Tuple(cohort, pheno, chr_list, chr_inputs.flatten()) }
+
+        (merged_sumstats, filtered_sumstats, glm_output_sizes) = merge_and_filter_plink2_output(all_gwas_results_grouped, merge_plink2_script, glm_io_module, metrics_module, params.p_cutoff_summarize, params.plink2_col_names)
+        merged_sumstats.subscribe { cohort, pheno, sumstats -> progress_event('merged', cohort, pheno) }
 
-        (merged_sumstats, filtered_sumstats) = merge_and_filter_plink2_output(all_gwas_results_grouped, merge_plink2_script, params.p_cutoff_summarize, params.plink2_col_names)
+        // Track how much scratch space the zstd-compressed per-chromosome GLM outputs save
+        glm_output_sizes.map { cohort, pheno, sizes -> sizes } \
+            .collectFile(name: 'glm_output_compression.csv', storeDir: "${OUTPUT_DIR}/Summary", keepHeader: true, skip: 1) \
+            .subscribe { summary_file -> log.info(summarize_glm_compression(summary_file)) }
 
         // take filtered output on a journey through BioFilter
         // plots and report post-processing
@@ -221,19 +579,23 @@ workflow PLINK2_GWAS {
         // tuple val(cohort), val(pheno), path("${pheno}.filtered.plink2.gz")
 
         filtered_sumstats_list = filtered_sumstats.map { cohort, pheno, sumstats -> sumstats }.collect()
+        // Read the filtered hits once; the summary table and the Biofilter input both start from this table
+        all_filtered_hits = make_summary_table(filtered_sumstats_list, aggregate_hits_script)
         if (params['annotate']) {
-            biofilter_input = make_biofilter_positions_input(filtered_sumstats_list)
+            biofilter_input = make_biofilter_positions_input(all_filtered_hits, biofilter_cache_script, params['biofilter_loki'])
             bf_input_channel = Channel.of('plink_stats').combine(biofilter_input)
             biofilter_annots = BIOFILTER_POSITIONS(bf_input_channel)
-            manhattan_qq_plots = plot_plink_results_with_annot(merged_sumstats.combine(biofilter_annots), plotting_script)
-            top_hit_table = make_summary_table_with_annot(filtered_sumstats_list, biofilter_annots)
+            gwas_plot_outputs = plot_plink_results_with_annot(merged_sumstats.combine(biofilter_annots), plotting_script, metrics_module)
+            top_hit_table = make_summary_table_with_annot(all_filtered_hits, biofilter_annots, aggregate_hits_script)
         }
         else {
-            manhattan_qq_plots = plot_plink_results(merged_sumstats, plotting_script)
-            top_hit_table = make_summary_table(filtered_sumstats_list)
+            gwas_plot_outputs = plot_plink_results(merged_sumstats, plotting_script, metrics_module)
+            top_hit_table = all_filtered_hits
         }
         // tuple val(cohort), val(pheno), path("${pheno}.plink2.gz")
         // tuple val(cohort), val(pheno), path("${pheno}.filtered.plink2.gz")
+        manhattan_qq_plots = gwas_plot_outputs.plots
+        gwas_plot_outputs.combo.subscribe { cohort, pheno -> progress_event('plotted', cohort, pheno) }
 
         // make results manifest
         // results_manifest = collect_plot_files(pheno_table)
@@ -264,7 +626,16 @@ workflow PLINK2_GWAS {
                 plink_suffix:      params.plink_chr_suffix,
                 plink_flag:        params.plink_flag,
                 id_col:            params.id_col,
-                related_list:      params.related_list
+                related_list:      params.related_list,
+                glm_cache_dir:     params.glm_cache_dir,
+                biofilter_cache_db: params.biofilter_cache_db,
+                biofilter_shard_by: params.biofilter_shard_by,
+                biofilter_shard_size: params.biofilter_shard_size,
+                biofilter_local_loki_dir: params.biofilter_local_loki_dir,
+                gene_annotator: params.gene_annotator,
+                gene_regions_bed: params.gene_regions_bed,
+                gene_index_dir: params.gene_index_dir,
+                skip_preflight:    params.skip_preflight
             ],
             covariates: [
                 cat_covars:            params.cat_covars,
@@ -278,12 +649,29 @@ workflow PLINK2_GWAS {
                 min_quant_n:            MIN_QUANT_N,
                 min_maf:                params.min_maf,
                 max_missing_per_variant: params.max_missing_per_var,
-                hwe_min_pvalue:         params.hwe_min_pvalue
+                hwe_min_pvalue:         params.hwe_min_pvalue,
+                two_stage_logistic:     params.two_stage_logistic,
+                firth_retest_p:         params.firth_retest_p
             ],
             output_parameters: [
                 p_cutoff_summarize: params.p_cutoff_summarize,
                 column_name_map:    params.plink2_col_names,
                 annotate:           params.annotate
+            ],
+            smoke_test: [
+                smoke_test:               params.smoke_test,
+                smoke_variants_per_chr:   params.smoke_variants_per_chr,
+                smoke_variant_stride:     params.smoke_variant_stride,
+                smoke_samples_per_cohort: params.smoke_samples_per_cohort,
+                output_dir:               OUTPUT_DIR
+            ],
+            instrumentation: [
+                metrics_dir:        params.metrics_dir,
+                python_profile_dir: params.python_profile_dir,
+                report_trace_file:  params.report_trace_file,
+                report_cache_dir:   REPORT_CACHE_DIR,
+                report_incremental: params.report_incremental,
+                progress_dir:       PROGRESS_DIR
             ]
         ]
         json_params = dump_params_to_json(run_params)
@@ -295,8 +683,12 @@ workflow PLINK2_GWAS {
             top_hit_table,
             pheno_table,
             json_params,
+            glm_log_metrics,
             manifest_script,
-            report_script
+            report_script,
+            metrics_module,
+            nextflow_trace_module,
+            previous_report
         )
 
     emit:
@@ -304,8 +696,51 @@ workflow PLINK2_GWAS {
         pheno_table
 }
 
+process preflight_checks {
+    publishDir "${OUTPUT_DIR}/Summary/", mode: 'copy'
+
+    input:
+        path preflight_script
+        path pheno_covar_table
+        path cohort_table
+        path plink_fam
+        path remove_relateds
+        val plink_files
+        val missing_plink_files
+        val bin_pheno_list
+        val quant_pheno_list
+    output:
+        path('preflight_report.tsv')
+    shell:
+        """
+        ${params.my_python} ${preflight_script} \
+          --data ${pheno_covar_table} \
+          --samples ${cohort_table} \
+          --id ${params.id_col} \
+          ${params.related_list == null ? '' : '--remove ' + remove_relateds} \
+          --cohorts ${params.cohort_list.join(' ')} \
+          --sexStratCohorts ${params.sex_strat_cohort_list.join(' ')} \
+          --binPhenotypes ${bin_pheno_list.join(' ')} \
+          --quantPhenotypes ${quant_pheno_list.join(' ')} \
+          --catCovars ${params.cat_covars.join(' ')} \
+          --contCovars ${params.cont_covars.join(' ')} \
+          --sexStratCatCovars ${params.sex_strat_cat_covars.join(' ')} \
+          --sexStratContCovars ${params.sex_strat_cont_covars.join(' ')} \
+          --plinkFiles ${plink_files.join(' ')} \
+          --missingPlinkFiles ${missing_plink_files.join(' ')} \
+          --plinkFam ${plink_fam} \
+          --output preflight_report.tsv \
+          --report_only
+        """
+    stub:
+        """
+        printf 'CHECK\\tSTATUS\\tDETAIL\\noverall\\tPASS\\tstub\\n' > preflight_report.tsv
+        """
+}
+
 process set_up_cohort {
-    publishDir "${launchDir}/${cohort}/"
+    tag "${cohort}"
+    publishDir "${OUTPUT_DIR}/${cohort}/"
 
     input:
         val cohort
@@ -314,22 +749,26 @@ process set_up_cohort {
         path cohort_table
         path plink_fam
         path remove_relateds
+        val preflight_passed
+        path metrics_module
     output:
         tuple val(cohort), path("${cohort}.plink2_pheno_covars.txt"), path("${cohort}.sample_list.txt")
     shell:
         """
+        ${get_metrics_env()}
         ${params.my_python} ${cohort_script} \
           --data ${pheno_covar_table} \
           --cohort ${cohort} \
           --samples ${cohort_table} \
           ${params.related_list == null ? '' : '--remove ' + remove_relateds} \
           --plinkFam ${plink_fam} \
+          ${params.smoke_test && params.smoke_samples_per_cohort != null ? '--maxSamples ' + params.smoke_samples_per_cohort : ''} \
           --id ${params.id_col}
         """
 }
 
 process make_pheno_summaries {
-    publishDir "${launchDir}/Summary/", mode: 'copy'
+    publishDir "${OUTPUT_DIR}/Summary/", mode: 'copy'
 
     input:
         val cohort_list
@@ -340,11 +779,13 @@ process make_pheno_summaries {
         path cohort_table
         path(pheno_table_script)
         path related_file
+        path metrics_module
     output:
         path('pheno_summaries.csv')
 
     shell:
         """
+        ${get_metrics_env()}
         ${params.my_python} ${pheno_table_script} \
           -c ${cohort_list.join(' ')} \
           -b ${bin_pheno_list.join(' ')} \
@@ -406,7 +847,7 @@ process parse_pheno_summary_table {
 }
 
 process make_pheno_covar_summary_plots {
-    publishDir "${launchDir}/Plots/"
+    publishDir "${OUTPUT_DIR}/Plots/"
 
     input:
         val cohort_list
@@ -437,25 +878,38 @@ process make_pheno_covar_summary_plots {
 }
 
 process standardize_phenos {
+    tag "${cohort}"
     //this process will standardize or normalize the raw phenoptype and covariates files
-    publishDir "${launchDir}/${cohort}/"
+    //and write the slim per-phenotype and per-cohort covariate inputs staged by the GLM tasks
+    publishDir "${OUTPUT_DIR}/${cohort}/", pattern: "*.plink2_pheno_covars_standardized.tsv"
 
     input:
         tuple val(cohort), path(pheno_covar_file), path(sample_list)
         path standardize_phenos_script
+        path metrics_module
+        val pheno_list
     output:
-        tuple val(cohort), path("${cohort}.plink2_pheno_covars_standardized.tsv"), path(sample_list)
+        tuple val(cohort), path("${cohort}.plink2_pheno_covars_standardized.tsv"), path(sample_list), emit: standardized
+        tuple val(cohort), path("${cohort}.covars.tsv.gz"), path(sample_list), emit: covars
+        tuple val(cohort), path("${cohort}.*.pheno.tsv"), emit: phenos
 
     script:
+    cohort_covars = get_cohort_covars(cohort)
     """
+        ${get_metrics_env()}
         ${params.my_python} ${standardize_phenos_script} \
           -c ${cohort} \
           -p ${pheno_covar_file} \
-          -s ${sample_list}
+          -s ${sample_list} \
+          --phenos ${pheno_list.join(' ')} \
+          --catCovars ${cohort_covars[0].join(' ')} \
+          --contCovars ${cohort_covars[1].join(' ')}
     """
     stub:
         """
         touch ${cohort}.plink2_pheno_covars_standardized.tsv
+        touch ${cohort}.covars.tsv.gz
+        ${pheno_list.collect { pheno -> "touch ${cohort}.${pheno}.pheno.tsv" }.join('\n')}
         """
 }
 
@@ -478,7 +932,58 @@ String get_covar_list_args(String cohort, cohort_cat_covars, cohort_cont_covars)
     return output
 }
 
+List get_cohort_covars(String cohort) {
+    // [categorical, continuous] covariates used in this cohort's models
+    if (params.sex_strat_cohort_list.contains(cohort)) {
+        return [params.sex_strat_cat_covars, params.sex_strat_cont_covars]
+    }
+    return [params.cat_covars, params.cont_covars]
+}
+
+String get_glm_cache_key_args(pheno, cohort_covars, pheno_file, covar_file, sample_list, plink_set, String glm_modifiers, extra_files = []) {
+    // Everything a GLM task's results depend on - other phenotypes in the cohort never change the key
+    String glm_options = "--glm ${glm_modifiers} --ci 0.95 --maf ${params.min_maf} --geno ${params.max_missing_per_var} --hwe ${params.hwe_min_pvalue} ${params.plink_flag}"
+    if (params.smoke_test) {
+        glm_options += " --extract smoke:${params.smoke_variants_per_chr}:${params.smoke_variant_stride}"
+    }
+    String output = "--plink_files ${plink_set.join(' ')} --samples ${sample_list} --pheno_file ${pheno_file} --covar_file ${covar_file} --pheno ${pheno} "
+    output += "--covars ${cohort_covars.flatten().join(' ')} --glm_args='${glm_options}'"
+    if (extra_files.size() > 0) {
+        output += " --extra_files ${extra_files.join(' ')}"
+    }
+    return output
+}
+
+String get_smoke_extract_command(plink_set) {
+    // Smoke runs test every k-th variant of each chromosome, up to N, listed from the .pvar/.bim
+    if (!params.smoke_test) {
+        return ''
+    }
+    int id_col = params.plink_flag == '--bfile' ? 2 : 3
+    return "awk '/^#/ { next } kept >= ${params.smoke_variants_per_chr} { exit } n++ % ${params.smoke_variant_stride} == 0 { print \$${id_col}; kept++ }' ${plink_set[1]} > smoke_variants.txt"
+}
+
+String with_glm_cache(String glm_command, glm_cache_script, String cache_key_args, List outputs) {
+    // Reuse outputs stored under the task's cache key in params.glm_cache_dir, which outlives the work dir
+    if (params.glm_cache_dir == null) {
+        return glm_command
+    }
+    String output_args = outputs.join(' ')
+    return """
+        glm_cache_key=\$(${params.my_python} ${glm_cache_script} key \
+            ${cache_key_args} \
+            --plink2_version "\$(plink2 --version)" \
+            --outputs ${output_args})
+
+        if ! ${params.my_python} ${glm_cache_script} restore --cache_dir ${params.glm_cache_dir} --key \$glm_cache_key --outputs ${output_args}; then
+        ${glm_command}
+            ${params.my_python} ${glm_cache_script} store --cache_dir ${params.glm_cache_dir} --key \$glm_cache_key --outputs ${output_args}
+        fi
+        """
+}
+
 process call_plink2_logistic {
+    tag "${cohort} ${pheno} chr${chromosome}"
     disk {
         def fileSizeGb = plink_set[0].size() / (1024 ** 3)
         return "${50 + fileSizeGb} GB"
@@ -489,40 +994,174 @@ process call_plink2_logistic {
 
     //this process will perform association test with logistic regression
     input:
-        tuple val(cohort), val(pheno), val(chromosome), path(pheno_covar), path(sample_list), path(plink_set), val(plink_prefix)
+        tuple val(cohort), val(pheno), val(chromosome), path(pheno_file), path(covar_file), path(sample_list), path(plink_set), val(plink_prefix)
+        path glm_cache_script
     output:
-        tuple  val(cohort), val(pheno), val(chromosome), path("${cohort}.${pheno}.${chromosome}.glm.logistic.hybrid")
+        tuple  val(cohort), val(pheno), val(chromosome), path("${cohort}.${pheno}.${chromosome}.glm.logistic.hybrid.zst")
+        tuple  val(cohort), val(pheno), val(chromosome), path("${cohort}.${pheno}.${chromosome}.logistic.plink2.log")
     script:
         use_mem = Math.floor(task.memory.toMega() * 0.85) // 85% of allocated memory in MB
-        covariate_args = get_covar_list_args(cohort,
-            params.sex_strat_cohort_list.contains(cohort) ? params.sex_strat_cat_covars : params.cat_covars,
-            params.sex_strat_cohort_list.contains(cohort) ? params.sex_strat_cont_covars : params.cont_covars)
+        cohort_covars = get_cohort_covars(cohort)
+        covariate_args = get_covar_list_args(cohort, cohort_covars[0], cohort_covars[1])
+        covar_args = cohort_covars.flatten().size() > 0 ? "--covar ${covar_file} ${covariate_args}" : ''
+        glm_modifiers = 'hide-covar firth-fallback zs cols=+a1freq,+a1freqcc,+firth'
+        glm_output = "${cohort}.${pheno}.${chromosome}.glm.logistic.hybrid.zst"
+        glm_log = "${cohort}.${pheno}.${chromosome}.logistic.plink2.log"
+        glm_command = """
+        ${get_smoke_extract_command(plink_set)}
+
+        plink2 --glm ${glm_modifiers} \
+            --ci 0.95 \
+            --memory ${use_mem} \
+            --keep ${sample_list} \
+            ${params.smoke_test ? '--extract smoke_variants.txt' : ''} \
+            --maf ${params.min_maf} \
+            --geno ${params.max_missing_per_var} \
+            --hwe ${params.hwe_min_pvalue} \
+            ${params.plink_flag} ${plink_prefix} \
+            --pheno ${pheno_file} \
+            --pheno-name ${pheno} \
+            ${covar_args} \
+            --out ${cohort}.${pheno}.${chromosome}
+
+        mv ${cohort}.${pheno}.${chromosome}.${pheno}.glm.logistic.hybrid.zst ${glm_output}
+        mv ${cohort}.${pheno}.${chromosome}.log ${glm_log}
+
+        """
+        with_glm_cache(glm_command, glm_cache_script,
+            get_glm_cache_key_args(pheno, cohort_covars, pheno_file, covar_file, sample_list, plink_set, glm_modifiers),
+            [glm_output, glm_log])
+    stub:
         """
+        touch ${cohort}.${pheno}.${chromosome}.glm.logistic.hybrid.zst
+        touch ${cohort}.${pheno}.${chromosome}.logistic.plink2.log
+        """
+}
 
-        plink2 --glm hide-covar firth-fallback cols=+a1freq,+a1freqcc,+firth \
+process call_plink2_logistic_first_pass {
+    tag "${cohort} ${pheno} chr${chromosome}"
+    disk {
+        def fileSizeGb = plink_set[0].size() / (1024 ** 3)
+        return "${50 + fileSizeGb} GB"
+    }
+
+    cpus 16
+    memory { params.host == 'AOU' ? '63GB' : '24GB' }
+
+    //this process will perform a fast logistic regression pass without Firth correction
+    input:
+        tuple val(cohort), val(pheno), val(chromosome), path(pheno_file), path(covar_file), path(sample_list), path(plink_set), val(plink_prefix)
+        path glm_cache_script
+    output:
+        tuple  val(cohort), val(pheno), val(chromosome), path("${cohort}.${pheno}.${chromosome}.glm.logistic.zst")
+        tuple  val(cohort), val(pheno), val(chromosome), path("${cohort}.${pheno}.${chromosome}.first_pass.plink2.log")
+    script:
+        use_mem = Math.floor(task.memory.toMega() * 0.85) // 85% of allocated memory in MB
+        cohort_covars = get_cohort_covars(cohort)
+        covariate_args = get_covar_list_args(cohort, cohort_covars[0], cohort_covars[1])
+        covar_args = cohort_covars.flatten().size() > 0 ? "--covar ${covar_file} ${covariate_args}" : ''
+        glm_modifiers = 'hide-covar no-firth zs cols=+a1freq,+a1freqcc'
+        glm_output = "${cohort}.${pheno}.${chromosome}.glm.logistic.zst"
+        glm_log = "${cohort}.${pheno}.${chromosome}.first_pass.plink2.log"
+        glm_command = """
+        ${get_smoke_extract_command(plink_set)}
+        plink2 --glm ${glm_modifiers} \
             --ci 0.95 \
             --memory ${use_mem} \
             --keep ${sample_list} \
+            ${params.smoke_test ? '--extract smoke_variants.txt' : ''} \
             --maf ${params.min_maf} \
             --geno ${params.max_missing_per_var} \
             --hwe ${params.hwe_min_pvalue} \
             ${params.plink_flag} ${plink_prefix} \
-            --pheno ${pheno_covar} \
+            --pheno ${pheno_file} \
             --pheno-name ${pheno} \
-            --covar ${pheno_covar} \
-            ${covariate_args} \
+            ${covar_args} \
             --out ${cohort}.${pheno}.${chromosome}
 
-        mv ${cohort}.${pheno}.${chromosome}.${pheno}.glm.logistic.hybrid ${cohort}.${pheno}.${chromosome}.glm.logistic.hybrid
+        mv ${cohort}.${pheno}.${chromosome}.${pheno}.glm.logistic.zst ${glm_output}
+        mv ${cohort}.${pheno}.${chromosome}.log ${glm_log}
+        """
+        with_glm_cache(glm_command, glm_cache_script,
+            get_glm_cache_key_args(pheno, cohort_covars, pheno_file, covar_file, sample_list, plink_set, glm_modifiers),
+            [glm_output, glm_log])
+    stub:
+        """
+        touch ${cohort}.${pheno}.${chromosome}.glm.logistic.zst
+        touch ${cohort}.${pheno}.${chromosome}.first_pass.plink2.log
+        """
+}
+
+process call_plink2_firth_retest {
+    tag "${cohort} ${pheno} chr${chromosome}"
+    disk {
+        def fileSizeGb = plink_set[0].size() / (1024 ** 3)
+        return "${50 + fileSizeGb} GB"
+    }
+
+    cpus 16
+    memory { params.host == 'AOU' ? '63GB' : '24GB' }
+
+    //this process will re-test small-P or unstable first-pass variants with Firth regression
+    input:
+        tuple val(cohort), val(pheno), val(chromosome), path(pheno_file), path(covar_file), path(sample_list), path(plink_set), val(plink_prefix), path(first_pass)
+        path firth_extract_script
+        path glm_io_module
+        path glm_cache_script
+    output:
+        tuple  val(cohort), val(pheno), val(chromosome), path("${cohort}.${pheno}.${chromosome}.glm.firth.zst")
+        tuple  val(cohort), val(pheno), val(chromosome), path("${cohort}.${pheno}.${chromosome}.firth.plink2.log")
+    script:
+        use_mem = Math.floor(task.memory.toMega() * 0.85) // 85% of allocated memory in MB
+        cohort_covars = get_cohort_covars(cohort)
+        covariate_args = get_covar_list_args(cohort, cohort_covars[0], cohort_covars[1])
+        covar_args = cohort_covars.flatten().size() > 0 ? "--covar ${covar_file} ${covariate_args}" : ''
+        glm_modifiers = 'hide-covar firth zs cols=+a1freq,+a1freqcc'
+        glm_output = "${cohort}.${pheno}.${chromosome}.glm.firth.zst"
+        glm_log = "${cohort}.${pheno}.${chromosome}.firth.plink2.log"
+        glm_command = """
+        # plink2 refuses an empty --extract, so an empty result means nothing needed Firth
+        if [ -s firth_retest_ids.txt ]; then
+            plink2 --glm ${glm_modifiers} \
+                --ci 0.95 \
+                --memory ${use_mem} \
+                --keep ${sample_list} \
+                --extract firth_retest_ids.txt \
+                --maf ${params.min_maf} \
+                --geno ${params.max_missing_per_var} \
+                --hwe ${params.hwe_min_pvalue} \
+                ${params.plink_flag} ${plink_prefix} \
+                --pheno ${pheno_file} \
+                --pheno-name ${pheno} \
+                ${covar_args} \
+                --out ${cohort}.${pheno}.${chromosome}
+
+            mv ${cohort}.${pheno}.${chromosome}.${pheno}.glm.firth.zst ${glm_output}
+            mv ${cohort}.${pheno}.${chromosome}.log ${glm_log}
+        else
+            touch ${glm_output} ${glm_log}
+        fi
+        """
+        glm_step = with_glm_cache(glm_command, glm_cache_script,
+            get_glm_cache_key_args(pheno, cohort_covars, pheno_file, covar_file, sample_list, plink_set, glm_modifiers, ['firth_retest_ids.txt']),
+            [glm_output, glm_log])
+        """
+        ${params.my_python} ${firth_extract_script} \
+          --sumstats ${first_pass} \
+          --pvalue ${params.firth_retest_p} \
+          --output firth_retest_ids.txt
 
+        ${glm_step}
         """
     stub:
         """
-        touch ${cohort}.${pheno}.${chromosome}.glm.logistic.hybrid
+        touch ${cohort}.${pheno}.${chromosome}.glm.firth.zst
+        touch ${cohort}.${pheno}.${chromosome}.firth.plink2.log
         """
 }
 
 process call_plink2_linear {
+    tag "${cohort} ${pheno} chr${chromosome}"
     disk {
         def fileSizeGb = plink_set[0].size() / (1024 ** 3)
         return "${50 + fileSizeGb} GB"
@@ -533,39 +1172,51 @@ process call_plink2_linear {
 
     //this process will perform association test with logistic regression
     input:
-        tuple val(cohort), val(pheno), val(chromosome), path(pheno_covar), path(sample_list), path(plink_set), val(plink_prefix)
+        tuple val(cohort), val(pheno), val(chromosome), path(pheno_file), path(covar_file), path(sample_list), path(plink_set), val(plink_prefix)
+        path glm_cache_script
     output:
-        tuple  val(cohort), val(pheno), val(chromosome), path("${cohort}.${pheno}.${chromosome}.glm.linear")
+        tuple  val(cohort), val(pheno), val(chromosome), path("${cohort}.${pheno}.${chromosome}.glm.linear.zst")
+        tuple  val(cohort), val(pheno), val(chromosome), path("${cohort}.${pheno}.${chromosome}.linear.plink2.log")
     script:
         use_mem = Math.floor(task.memory.toMega() * 0.85) // 85% of allocated memory in MB
-        covariate_args = get_covar_list_args(cohort,
-            params.sex_strat_cohort_list.contains(cohort) ? params.sex_strat_cat_covars : params.cat_covars,
-            params.sex_strat_cohort_list.contains(cohort) ? params.sex_strat_cont_covars : params.cont_covars)
-        """
-        plink2 --glm hide-covar cols=+a1freq \
+        cohort_covars = get_cohort_covars(cohort)
+        covariate_args = get_covar_list_args(cohort, cohort_covars[0], cohort_covars[1])
+        covar_args = cohort_covars.flatten().size() > 0 ? "--covar ${covar_file} ${covariate_args}" : ''
+        glm_modifiers = 'hide-covar zs cols=+a1freq'
+        glm_output = "${cohort}.${pheno}.${chromosome}.glm.linear.zst"
+        glm_log = "${cohort}.${pheno}.${chromosome}.linear.plink2.log"
+        glm_command = """
+        ${get_smoke_extract_command(plink_set)}
+        plink2 --glm ${glm_modifiers} \
             --ci 0.95 \
             --memory ${use_mem} \
             --keep ${sample_list} \
+            ${params.smoke_test ? '--extract smoke_variants.txt' : ''} \
             --maf ${params.min_maf} \
             --geno ${params.max_missing_per_var} \
             --hwe ${params.hwe_min_pvalue} \
             ${params.plink_flag} ${plink_prefix} \
-            --pheno ${pheno_covar} \
+            --pheno ${pheno_file} \
             --pheno-name ${pheno} \
-            --covar ${pheno_covar} \
-            ${covariate_args} \
+            ${covar_args} \
             --out ${cohort}.${pheno}.${chromosome}
 
-        mv ${cohort}.${pheno}.${chromosome}.${pheno}.glm.linear ${cohort}.${pheno}.${chromosome}.glm.linear
+        mv ${cohort}.${pheno}.${chromosome}.${pheno}.glm.linear.zst ${glm_output}
+        mv ${cohort}.${pheno}.${chromosome}.log ${glm_log}
         """
+        with_glm_cache(glm_command, glm_cache_script,
+            get_glm_cache_key_args(pheno, cohort_covars, pheno_file, covar_file, sample_list, plink_set, glm_modifiers),
+            [glm_output, glm_log])
     stub:
         """
-        touch ${cohort}.${pheno}.${chromosome}.glm.linear
+        touch ${cohort}.${pheno}.${chromosome}.glm.linear.zst
+        touch ${cohort}.${pheno}.${chromosome}.linear.plink2.log
         """
 }
 
 process merge_and_filter_plink2_output {
-    publishDir "${launchDir}/${cohort}/Sumstats/"
+    tag "${cohort} ${pheno}"
+    publishDir "${OUTPUT_DIR}/${cohort}/Sumstats/"
     maxRetries 5 // Retry up to 3 times
     errorStrategy { task.exitStatus in 137..140 ? 'retry' : 'terminate' } // Retry on OOM-related exit codes
     memory {
@@ -578,15 +1229,19 @@ process merge_and_filter_plink2_output {
         // variables
         tuple val(cohort), val(pheno), val(chr_list), path(chr_inputs)
         path merge_plink2_script
+        path glm_io_module
+        path metrics_module
         val pvalue_cutoff
         val column_names
     output:
         tuple val(cohort), val(pheno), path("${cohort}.${pheno}.plink2.gz")
         tuple val(cohort), val(pheno), path("${cohort}.${pheno}.filtered.plink2.csv")
+        tuple val(cohort), val(pheno), path("${cohort}.${pheno}.glm_output_sizes.csv")
     shell:
         """
         echo "${column_names.collect().join('\n')}" > colnames.txt
         cat colnames.txt
+        ${get_metrics_env()}
         ${params.my_python} ${merge_plink2_script} \
           -p ${pheno} \
           -c colnames.txt \
@@ -598,41 +1253,63 @@ process merge_and_filter_plink2_output {
         """
         touch ${cohort}.${pheno}.plink2.gz
         touch ${cohort}.${pheno}.filtered.plink2.csv
+        echo "COHORT,PHENO,N_FILES,COMPRESSED_BYTES,UNCOMPRESSED_BYTES" > ${cohort}.${pheno}.glm_output_sizes.csv
         """
 }
 
-process make_biofilter_positions_input {
-    publishDir "${launchDir}/Annotations/"
+process summarize_plink2_logs {
+    publishDir "${OUTPUT_DIR}/Summary/", mode: 'copy'
 
     input:
-        path(filtered_sumstats, stageAs: '?/*')
+        path(glm_logs, stageAs: 'logs/*')
+        path plink2_log_script
     output:
-        path('plink2_gwas_biofilter_input_positions.txt')
+        path('plink2_glm_log_metrics.csv')
     shell:
         """
-        #! ${params.my_python}
-        import pandas as pd
+        ${params.my_python} ${plink2_log_script} \
+          --cohorts ${params.cohort_list.join(' ')} \
+          --logs ${glm_logs} \
+          --output plink2_glm_log_metrics.csv
+        """
+    stub:
+        '''
+        touch plink2_glm_log_metrics.csv
+        '''
+}
 
-        dfs = []
-        input_list = '${filtered_sumstats.join(' ')}'.split()
-        id_col = '${params.plink2_col_names['ID']}'
-        chr_col = '${params.plink2_col_names['#CHROM']}'
-        pos_col = '${params.plink2_col_names['POS']}'
+process make_biofilter_positions_input {
+    publishDir "${OUTPUT_DIR}/Annotations/"
 
-        for f in input_list:
-            dfs.append(pd.read_csv(f))
-        all = pd.concat(dfs)
-        keep_cols = [chr_col, id_col, pos_col]
-        all[keep_cols].to_csv('plink2_gwas_biofilter_input_positions.txt', header=False, index=False, sep=' ')
+    input:
+        path all_filtered_hits
+        path biofilter_cache_script
+        path biofilter_loki
+    output:
+        tuple path('plink2_gwas_biofilter_input_positions.txt'), path('plink2_gwas_biofilter_cached_annotations.txt')
+    shell:
+        // Each variant is sent once, and only if params.biofilter_cache_db doesn't already hold its annotation.
+        // The interval annotator is fast enough to skip the cache, which only holds Biofilter's results
+        use_cache = params.biofilter_cache_db != null && params.gene_annotator != 'interval'
+        cache_arg = use_cache ? "--cache_db ${params.biofilter_cache_db}" : ''
+        """
+        ${params.my_python} ${biofilter_cache_script} split \
+          --sumstats ${all_filtered_hits} \
+          --columns '${params.plink2_col_names['#CHROM']}' '${params.plink2_col_names['ID']}' '${params.plink2_col_names['POS']}' \
+          --build ${params['biofilter_build']} \
+          --loki ${biofilter_loki} ${cache_arg} \
+          --misses plink2_gwas_biofilter_input_positions.txt \
+          --cached plink2_gwas_biofilter_cached_annotations.txt
         """
     stub:
         '''
-        touch plink2_gwas_biofilter_input_positions.txt
+        touch plink2_gwas_biofilter_input_positions.txt plink2_gwas_biofilter_cached_annotations.txt
         '''
 }
 
 process plot_plink_results_with_annot {
-    publishDir "${launchDir}/Plots/"
+    tag "${cohort} ${pheno}"
+    publishDir "${OUTPUT_DIR}/Plots/"
 
     maxRetries 5 // Retry up to 3 times
     errorStrategy { task.exitStatus in 137..140 ? 'retry' : 'terminate' } // Retry on OOM-related exit codes
@@ -645,13 +1322,16 @@ process plot_plink_results_with_annot {
     input:
         tuple val(cohort), val(pheno), path(sumstats), val(data_nickname), path(biofilter_annots)
         path(plotting_script)
+        path metrics_module
     output:
-        path "${cohort}.${pheno}.{manhattan.png,qq.png,qq.csv}"
+        path "${cohort}.${pheno}.{manhattan.png,qq.png,qq.csv}", emit: plots
+        tuple val(cohort), val(pheno), emit: combo
     shell:
         """
         echo "${params.plink2_col_names.collect().join('\n')}" > colnames.txt
         cat colnames.txt
 
+        ${get_metrics_env()}
         ${params.my_python} ${plotting_script} \
           --pheno ${pheno} \
           --cohort ${cohort} \
@@ -668,7 +1348,8 @@ process plot_plink_results_with_annot {
 }
 
 process plot_plink_results {
-    publishDir "${launchDir}/Plots/"
+    tag "${cohort} ${pheno}"
+    publishDir "${OUTPUT_DIR}/Plots/"
 
     maxRetries 5 // Retry up to 3 times
     errorStrategy { task.exitStatus in 137..140 ? 'retry' : 'terminate' } // Retry on OOM-related exit codes
@@ -681,13 +1362,16 @@ process plot_plink_results {
     input:
         tuple val(cohort), val(pheno), path(sumstats)
         path(plotting_script)
+        path metrics_module
     output:
-        path "${cohort}.${pheno}.{manhattan.png,qq.png,qq.csv}"
+        path "${cohort}.${pheno}.{manhattan.png,qq.png,qq.csv}", emit: plots
+        tuple val(cohort), val(pheno), emit: combo
     shell:
         """
         echo "${params.plink2_col_names.collect().join('\n')}" > colnames.txt
         cat colnames.txt
 
+        ${get_metrics_env()}
         ${params.my_python} ${plotting_script} \
           --pheno ${pheno} \
           --colnames colnames.txt \
@@ -703,28 +1387,22 @@ process plot_plink_results {
 }
 
 process make_summary_table {
-    publishDir "${launchDir}/Summary/", mode: 'copy'
+    // Without annotation this is the published top-hits table; otherwise make_summary_table_with_annot is
+    publishDir "${OUTPUT_DIR}/Summary/", mode: 'copy', enabled: !params['annotate']
+    cpus 4
 
     input:
         path(all_filtered_sumstats, stageAs: '?/*')
+        path aggregate_hits_script
     output:
         path('plink2_all_suggestive.csv')
     script:
         """
-        #! ${params.my_python}
-
-        import pandas as pd
-        dfs = []
-        input_list = '${all_filtered_sumstats.join(' ')}'.split()
-        output = "plink2_all_suggestive.csv"
-        id_col = '${params.plink2_col_names['ID']}'
-        chr_col = '${params.plink2_col_names['#CHROM']}'
-        pos_col = '${params.plink2_col_names['POS']}'
-
-        for f in input_list:
-            dfs.append(pd.read_csv(f))
-
-        pd.concat(dfs).sort_values(by=[chr_col,pos_col,id_col]).to_csv(output, index=False)
+        ${params.my_python} ${aggregate_hits_script} aggregate \
+          --sumstats ${all_filtered_sumstats.join(' ')} \
+          --columns '${params.plink2_col_names['#CHROM']}' '${params.plink2_col_names['ID']}' '${params.plink2_col_names['POS']}' \
+          --threads ${task.cpus} \
+          --output plink2_all_suggestive.csv
         """
     stub:
         '''
@@ -734,35 +1412,21 @@ process make_summary_table {
 
 // Make top hits summary table with RSIDs and nearest genes
 process make_summary_table_with_annot {
-    publishDir "${launchDir}/Summary/", mode: 'copy'
+    publishDir "${OUTPUT_DIR}/Summary/", mode: 'copy'
 
     input:
-        path(all_filtered_sumstats, stageAs: '?/*')
+        path(all_filtered_hits, stageAs: 'unannotated/*')
         tuple val(data_nickname), path(biofilter_annots)
+        path aggregate_hits_script
     output:
         path('plink2_all_suggestive.csv')
     script:
         """
-        #! ${params.my_python}
-
-        import pandas as pd
-        dfs = []
-        input_list = '${all_filtered_sumstats.join(' ')}'.split()
-        output = "plink2_all_suggestive.csv"
-
-        id_col = '${params.plink2_col_names['ID']}'
-        chr_col = '${params.plink2_col_names['#CHROM']}'
-        pos_col = '${params.plink2_col_names['POS']}'
-
-        for f in input_list:
-            dfs.append(pd.read_csv(f))
-
-        all_gwas = pd.concat(dfs).sort_values(by=[chr_col,pos_col,id_col])
-
-        annot_df = pd.read_csv('${biofilter_annots}', index_col='Var_ID')
-        all_gwas[['Gene', 'RSID']] = annot_df.loc[all_gwas[id_col], ['Gene', 'RSID']].values
-
-        all_gwas.to_csv(output, index=False)
+        ${params.my_python} ${aggregate_hits_script} annotate \
+          --table ${all_filtered_hits} \
+          --annotations ${biofilter_annots} \
+          --columns '${params.plink2_col_names['#CHROM']}' '${params.plink2_col_names['ID']}' '${params.plink2_col_names['POS']}' \
+          --output plink2_all_suggestive.csv
         """
     stub:
         '''
@@ -771,7 +1435,7 @@ process make_summary_table_with_annot {
 }
 
 process collect_plot_files {
-    publishDir "${launchDir}/Summary/", mode: 'copy'
+    publishDir "${OUTPUT_DIR}/Summary/", mode: 'copy'
 
     input:
         path(pheno_table)
@@ -802,7 +1466,7 @@ process collect_plot_files {
 
 import groovy.json.JsonBuilder
 process dump_params_to_json {
-    publishDir "${launchDir}/Summary", mode: 'copy'
+    publishDir "${OUTPUT_DIR}/Summary", mode: 'copy'
 
     input:
         val params_dict
@@ -815,31 +1479,46 @@ process dump_params_to_json {
 }
 
 process make_results_report {
-    publishDir "${launchDir}", mode: 'copy'
+    publishDir "${OUTPUT_DIR}", mode: 'copy'
 
+    cpus 4
+
+    // Tables staged under Summary/ as they are published, so the published manifest's paths hold in ${OUTPUT_DIR}
     input:
         path all_plots, stageAs: 'Plots/*'
-        path top_hits_table
-        path pheno_summaries
+        path top_hits_table, stageAs: 'Summary/*'
+        path pheno_summaries, stageAs: 'Summary/*'
         path params_json
+        path glm_log_metrics, stageAs: 'Summary/*'
         path manifest_script
         path report_script
+        path metrics_module
+        path nextflow_trace_module
+        path previous_report, stageAs: 'previous_report.zip'
     output:
-        path('Plink_2.0_GWAS_Report.zip')
+        path(REPORT_ZIP)
+        path('results_manifest.json')
     shell:
         """
+        ${get_metrics_env()}
         ${params.my_python} ${manifest_script} \
             --params_json ${params_json} \
             --pheno_summaries ${pheno_summaries} \
             --top_hits_csv ${top_hits_table} \
+            --glm_log_metrics ${glm_log_metrics} \
+            --checksum \
             --plots_dir Plots/
 
         ${params.my_python} ${report_script} \
             --manifest results_manifest.json \
-            --output_zip Plink_2.0_GWAS_Report.zip
+            --workers ${task.cpus} \
+            --no_report_dir \
+            --cache_dir ${REPORT_CACHE_DIR} \
+            ${params.report_incremental ? '--previous_zip previous_report.zip' : ''} \
+            --output_zip ${REPORT_ZIP}
         """
     stub:
-        '''
-        touch Plink_2.0_GWAS_Report.zip
-        '''
+        """
+        touch ${REPORT_ZIP} results_manifest.json
+        """
 }
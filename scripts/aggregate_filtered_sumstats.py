@@ -0,0 +1,75 @@
+import sys
+import argparse
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+
+def make_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="Combine the filtered summary statistics of every cohort x phenotype into one top-hits table, "
+                    "optionally joined with the gene and RSID annotations."
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    aggregate = subparsers.add_parser('aggregate', help='Read and concatenate the filtered summary statistics')
+    aggregate.add_argument('--sumstats', nargs='+', required=True, help='Filtered summary statistics .csv files')
+    aggregate.add_argument('--threads', type=int, default=4, help='Files read concurrently (default: 4)')
+
+    annotate = subparsers.add_parser('annotate', help='Add Gene and RSID columns to an aggregated table')
+    annotate.add_argument('--table', required=True, help='Output of the aggregate command')
+    annotate.add_argument('--annotations', required=True, help='Var_ID,RSID,#CHROM,POS,Gene annotation .csv')
+
+    for sub in [aggregate, annotate]:
+        sub.add_argument('--columns', nargs=3, default=['#CHROM', 'ID', 'POS'], metavar=('CHROM', 'ID', 'POS'),
+                         help='Chromosome, variant ID and position columns (default: #CHROM ID POS)')
+        sub.add_argument('--output', required=True, help='Output .csv')
+    return parser
+
+
+def read_sumstats(path, columns):
+    # Chromosome and ID as text, so '23'/'X' and numeric-looking IDs survive unchanged
+    chr_col, id_col, pos_col = columns
+    return pd.read_csv(path, dtype={chr_col: str, id_col: str, pos_col: 'int64'})
+
+
+def sort_hits(df, columns):
+    """Sort by chromosome (numeric chromosomes first, in numeric order), position and variant ID."""
+    chr_col, id_col, pos_col = columns
+    return df.assign(_chrom_order=pd.to_numeric(df[chr_col], errors='coerce')) \
+             .sort_values(['_chrom_order', chr_col, pos_col, id_col], kind='stable') \
+             .drop(columns='_chrom_order')
+
+
+def aggregate(args):
+    # Each file is small; reading them in threads overlaps the file system waits
+    with ThreadPoolExecutor(max_workers=max(args.threads, 1)) as pool:
+        dfs = list(pool.map(lambda f: read_sumstats(f, args.columns), args.sumstats))
+    all_hits = sort_hits(pd.concat(dfs, ignore_index=True), args.columns)
+    all_hits.to_csv(args.output, index=False)
+    print(f'Combined {len(all_hits)} hits from {len(dfs)} files into {args.output}', file=sys.stderr)
+    return 0
+
+
+def annotate(args):
+    id_col = args.columns[1]
+    all_hits = read_sumstats(args.table, args.columns)
+    # Biofilter can return more than one row per variant; keep the first, as the gene assignment does
+    annot_df = pd.read_csv(args.annotations, dtype={'Var_ID': str, 'RSID': str, 'Gene': str}) \
+                 .drop_duplicates('Var_ID')[['Var_ID', 'Gene', 'RSID']] \
+                 .rename(columns={'Var_ID': id_col})
+    # Variants without an annotation keep their row, with empty Gene and RSID
+    all_hits = all_hits.merge(annot_df, on=id_col, how='left', validate='many_to_one')
+    all_hits.to_csv(args.output, index=False)
+    print(f'Annotated {all_hits["Gene"].notna().sum()} of {len(all_hits)} hits', file=sys.stderr)
+    return 0
+
+
+def main():
+    args = make_arg_parser().parse_args()
+    if args.command == 'aggregate':
+        return aggregate(args)
+    return annotate(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,167 @@
+import os
+import sys
+import json
+import sqlite3
+import argparse
+import pandas as pd
+from pathlib import Path
+
+# Columns of the space-separated Biofilter --position-file input (no header)
+POSITION_COLUMNS = ['chrom', 'var_id', 'pos']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS annotations (
+    build        TEXT NOT NULL,
+    loki_version TEXT NOT NULL,
+    chrom        TEXT NOT NULL,
+    pos          INTEGER NOT NULL,
+    var_id       TEXT NOT NULL,
+    annotation   TEXT,  -- JSON of Biofilter's first output row for the position; NULL if it returned none
+    PRIMARY KEY (build, loki_version, chrom, pos, var_id)
+)
+"""
+
+
+def loki_version(path):
+    """Identify the LOKI database by its resolved path, size and modification time; a rebuilt LOKI starts a new cache."""
+    real_path = os.path.realpath(path)
+    stat = os.stat(real_path)
+    return f'{real_path}:{stat.st_size}:{stat.st_mtime_ns}'
+
+
+def make_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="Persistent SQLite cache of Biofilter position annotations, keyed on "
+                    "(build, LOKI version, chromosome, position, variant ID)."
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    split = subparsers.add_parser('split', help='De-duplicate positions and split them into cache hits and misses')
+    inputs = split.add_mutually_exclusive_group(required=True)
+    inputs.add_argument('--positions', nargs='+',
+                        help='Biofilter position files (chrom, variant ID, position; space-separated, no header)')
+    inputs.add_argument('--sumstats', nargs='+', help='Filtered summary statistics .csv files to take positions from')
+    split.add_argument('--columns', nargs=3, default=['#CHROM', 'ID', 'POS'], metavar=('CHROM', 'ID', 'POS'),
+                       help='Chromosome, variant ID and position columns of --sumstats (default: #CHROM ID POS)')
+    split.add_argument('--misses', required=True, help='Output position file of the positions Biofilter must annotate')
+    split.add_argument('--cached', required=True, help='Output .tsv of the cached annotations for the other positions')
+
+    merge = subparsers.add_parser('merge', help='Store new Biofilter annotations and merge them with the cached ones')
+    merge.add_argument('--misses', required=True, help='Position file that was sent to Biofilter')
+    merge.add_argument('--new', required=True, help='Biofilter annotation output for the misses (may be empty)')
+    merge.add_argument('--cached', default=None, help='Cached annotations from the split command')
+    merge.add_argument('--output', required=True, help='Merged annotations, in the Biofilter output format')
+
+    for sub in [split, merge]:
+        sub.add_argument('--cache_db', default=None, help='SQLite cache file; without it positions are only de-duplicated')
+        sub.add_argument('--build', required=True, help='UCSC build passed to Biofilter')
+        sub.add_argument('--loki', required=True, help='LOKI knowledge database (identified by path, size and mtime)')
+    return parser
+
+
+def connect(cache_db):
+    Path(cache_db).parent.mkdir(parents=True, exist_ok=True)
+    # Long timeout: concurrent runs sharing a cache wait for each other's writes instead of failing
+    con = sqlite3.connect(cache_db, timeout=600)
+    con.execute(SCHEMA)
+    return con
+
+
+def read_positions(files):
+    """Read and de-duplicate Biofilter position files; the same variant is a top hit in many cohorts and phenotypes."""
+    frames = [pd.read_csv(f, sep=' ', header=None, names=POSITION_COLUMNS, dtype=str)
+              for f in files if Path(f).stat().st_size > 0]
+    if not frames:
+        return pd.DataFrame(columns=POSITION_COLUMNS)
+    positions = pd.concat(frames, ignore_index=True).drop_duplicates()
+    positions['pos'] = positions['pos'].astype(int)
+    return positions
+
+
+def read_sumstats_positions(files, columns):
+    """Take de-duplicated Biofilter positions from filtered summary statistics."""
+    chr_col, id_col, pos_col = columns
+    frames = [pd.read_csv(f, usecols=columns, dtype=str)[[chr_col, id_col, pos_col]].set_axis(POSITION_COLUMNS, axis=1)
+              for f in files]
+    positions = pd.concat(frames, ignore_index=True).dropna().drop_duplicates()
+    positions['pos'] = positions['pos'].astype(int)
+    return positions
+
+
+def read_annotations(path):
+    """Read Biofilter annotation output (or an earlier merged file); empty when Biofilter was skipped."""
+    if not Path(path).exists() or Path(path).stat().st_size == 0:
+        return pd.DataFrame(columns=['position_label'])
+    return pd.read_table(path, dtype=str, keep_default_na=False)
+
+
+def split(args):
+    if args.sumstats:
+        positions = read_sumstats_positions(args.sumstats, args.columns)
+    else:
+        positions = read_positions(args.positions)
+    cached = pd.DataFrame(columns=['position_label'])
+    misses = positions
+
+    if args.cache_db is not None and not positions.empty:
+        con = connect(args.cache_db)
+        con.execute('CREATE TEMP TABLE wanted (chrom TEXT, pos INTEGER, var_id TEXT)')
+        con.executemany('INSERT INTO wanted VALUES (?, ?, ?)',
+                        positions[['chrom', 'pos', 'var_id']].itertuples(index=False, name=None))
+        found = pd.read_sql_query(
+            'SELECT w.chrom, w.pos, w.var_id, a.annotation FROM wanted w '
+            'JOIN annotations a ON a.build = ? AND a.loki_version = ? '
+            'AND a.chrom = w.chrom AND a.pos = w.pos AND a.var_id = w.var_id',
+            con, params=(args.build, loki_version(args.loki)))
+        con.close()
+
+        hit_keys = set(found[['chrom', 'pos', 'var_id']].itertuples(index=False, name=None))
+        is_hit = [key in hit_keys for key in positions[['chrom', 'pos', 'var_id']].itertuples(index=False, name=None)]
+        misses = positions[[not hit for hit in is_hit]]
+        rows = [json.loads(a) for a in found['annotation'].dropna()]
+        if rows:
+            cached = pd.DataFrame(rows)
+        print(f'Biofilter cache: {len(found)} of {len(positions)} unique positions cached, '
+              f'{len(misses)} to annotate', file=sys.stderr)
+    else:
+        print(f'{len(positions)} unique positions to annotate', file=sys.stderr)
+
+    misses[POSITION_COLUMNS].to_csv(args.misses, sep=' ', header=False, index=False)
+    cached.to_csv(args.cached, sep='\t', index=False)
+    return 0
+
+
+def merge(args):
+    misses = read_positions([args.misses])
+    new = read_annotations(args.new)
+    cached = read_annotations(args.cached) if args.cached else pd.DataFrame(columns=['position_label'])
+
+    if args.cache_db is not None and not misses.empty:
+        # Biofilter can return several rows per position; downstream only the first is used
+        first_rows = new.drop_duplicates('position_label', keep='first').set_index('position_label', drop=False)
+        annotations = {label: json.dumps(row.to_dict()) for label, row in first_rows.iterrows()}
+        version = loki_version(args.loki)
+        con = connect(args.cache_db)
+        with con:
+            con.executemany(
+                'INSERT OR REPLACE INTO annotations VALUES (?, ?, ?, ?, ?, ?)',
+                ((args.build, version, chrom, int(pos), var_id, annotations.get(var_id))
+                 for chrom, var_id, pos in misses[POSITION_COLUMNS].itertuples(index=False, name=None)))
+        con.close()
+        print(f'Biofilter cache: stored {len(misses)} positions ({len(annotations)} annotated)', file=sys.stderr)
+
+    columns = list(new.columns) if len(new.columns) > 1 else list(cached.columns)
+    merged = pd.concat([new, cached], ignore_index=True).reindex(columns=columns)
+    merged.to_csv(args.output, sep='\t', index=False)
+    return 0
+
+
+def main():
+    args = make_arg_parser().parse_args()
+    if args.command == 'split':
+        return split(args)
+    return merge(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
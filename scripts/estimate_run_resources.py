@@ -0,0 +1,418 @@
+import os
+import re
+import sys
+import argparse as ap
+import pandas as pd
+from pathlib import Path
+
+PIPELINE_NF = Path(__file__).resolve().parent.parent / 'plink2_gwas.nf'
+
+
+def make_arg_parser():
+    parser = ap.ArgumentParser(
+        description="Dry-run estimate of the GLM tasks, CPU-hours, memory and storage a plink2_gwas.config implies."
+    )
+    parser.add_argument('-c', '--config', action='append', required=True,
+                        help='Nextflow config with a params block (repeat like nextflow -c; later files win)')
+    parser.add_argument('--launch_dir', default=os.getcwd(),
+                        help='Directory substituted for ${launchDir}. Default: current working directory')
+    parser.add_argument('-o', '--output', default=None, help='Optional .csv copy of the per-stage table')
+    parser.add_argument('--pipeline', default=str(PIPELINE_NF),
+                        help='Workflow file to read the params defaults and process memory directives from. '
+                             'Default: plink2_gwas.nf')
+
+    costs = parser.add_argument_group('cost model', 'Tunable coefficients; calibrate against a finished run')
+    costs.add_argument('--linear_cost', type=float, default=2E-9,
+                       help='CPU-seconds per variant x sample x model term for plink2 --glm linear')
+    costs.add_argument('--logistic_cost', type=float, default=1E-8,
+                       help='CPU-seconds per variant x sample x model term for plink2 --glm logistic')
+    costs.add_argument('--firth_cost', type=float, default=1E-7,
+                       help='CPU-seconds per variant x sample x model term for Firth regression')
+    costs.add_argument('--firth_fallback_fraction', type=float, default=0.02,
+                       help='Fraction of variants refit with Firth by firth-fallback')
+    costs.add_argument('--task_overhead', type=float, default=30,
+                       help='CPU-seconds of fixed start-up cost per task')
+    costs.add_argument('--merge_cost', type=float, default=3E-6,
+                       help='CPU-seconds per variant row to merge and filter plink2 output')
+    costs.add_argument('--plot_cost', type=float, default=4E-6,
+                       help='CPU-seconds per variant row to draw Manhattan and QQ plots')
+    costs.add_argument('--glm_bytes_per_variant', type=float, default=40,
+                       help='Bytes per variant row of zstd-compressed GLM output')
+    costs.add_argument('--sumstats_bytes_per_variant', type=float, default=45,
+                       help='Bytes per variant row of merged .tsv.gz summary statistics')
+    costs.add_argument('--plot_bytes', type=float, default=1.5E6,
+                       help='Bytes per Manhattan + QQ plot pair')
+    costs.add_argument('--max_parallel', type=int, default=500,
+                       help='Tasks the executor runs at once (executor.queueSize), for peak memory')
+    return parser
+
+
+# ---------------------------------------------------------------------------
+# Minimal reader for the Groovy literals used in pipeline configs
+# ---------------------------------------------------------------------------
+
+TOKEN_RE = re.compile(r'''
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')
+  | (?P<number>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)
+  | (?P<ident>[A-Za-z_][\w.]*)
+  | (?P<space>\s+)
+  | (?P<op>.)
+''', re.VERBOSE | re.DOTALL)
+
+
+def tokenize(text):
+    tokens = []
+    for match in TOKEN_RE.finditer(text):
+        kind = match.lastgroup
+        if kind not in ('comment', 'space'):
+            tokens.append((kind, match.group()))
+    return tokens
+
+
+class ConfigReader:
+    """
+    Collects params from params { } blocks, params.x = ... lines and includeConfig files,
+    on top of the defaults in the workflow file (see read_defaults).
+    """
+
+    def __init__(self, launch_dir, params=None):
+        self.launch_dir = str(launch_dir)
+        self.params = dict(params or {})
+
+    def read(self, config_file):
+        config_file = Path(config_file)
+        self.tokens = tokenize(config_file.read_text())
+        self.pos = 0
+        depth = 0
+        while self.pos < len(self.tokens):
+            kind, value = self.tokens[self.pos]
+            if depth == 0 and value == 'params' and self.peek(1) == '{':
+                self.pos += 2
+                self.read_params_block()
+                continue
+            if depth == 0 and kind == 'ident' and value.startswith('params.') and self.peek(1) == '=':
+                self.pos += 2
+                self.params[value[len('params.'):]] = self.read_expression()
+                continue
+            if depth == 0 and value == 'includeConfig':
+                self.pos += 1
+                include = Path(self.read_value())
+                tokens, pos = self.tokens, self.pos
+                self.read(include if include.is_absolute() else config_file.parent / include)
+                self.tokens, self.pos = tokens, pos
+                continue
+            depth += {'{': 1, '}': -1}.get(value, 0)
+            self.pos += 1
+        return self.params
+
+    def read_defaults(self, pipeline_nf):
+        """Defaults from the params.putAll([...]) block and the top-level params.x = ... lines of the workflow."""
+        text = Path(pipeline_nf).read_text()
+        start = text.find('params.putAll(')
+        if start == -1:
+            raise ValueError(f'No params.putAll block in {pipeline_nf}')
+        # Only the map literal is read, so the Groovy code after it is never parsed
+        self.tokens = tokenize(text[start + len('params.putAll('):])
+        self.pos = 0
+        self.params.update(self.read_value())
+        for line in re.findall(r'^params\.\w+\s*=.*$', text, re.MULTILINE):
+            self.tokens = tokenize(line)
+            self.pos = 2
+            self.params[self.tokens[0][1][len('params.'):]] = self.read_expression()
+        return self.params
+
+    def peek(self, offset=0):
+        i = self.pos + offset
+        return self.tokens[i][1] if i < len(self.tokens) else None
+
+    def read_params_block(self):
+        while self.peek() not in ('}', None):
+            name = self.tokens[self.pos][1]
+            if self.peek(1) != '=':
+                raise ValueError(f'Cannot parse params entry near {name!r}')
+            self.pos += 2
+            self.params[name] = self.read_expression()
+        self.pos += 1
+
+    def read_expression(self):
+        value = self.read_value()
+        while self.peek() == '+':
+            self.pos += 1
+            value = value + self.read_value()
+        return value
+
+    def read_value(self):
+        kind, token = self.tokens[self.pos]
+        self.pos += 1
+        if kind == 'string':
+            return self.interpolate(token[1:-1]) if token[0] == '"' else token[1:-1]
+        if kind == 'number':
+            return float(token) if re.search(r'[.eE]', token) else int(token)
+        if token in ('true', 'false'):
+            return token == 'true'
+        if token == 'null':
+            return None
+        if token == '[':
+            return self.read_collection()
+        if kind == 'ident':
+            return self.lookup(token)
+        raise ValueError(f'Unsupported config value {token!r}')
+
+    def read_collection(self):
+        if self.peek() == ']':
+            self.pos += 1
+            return []
+        if self.peek() == ':' and self.peek(1) == ']':
+            self.pos += 2
+            return {}
+        is_map = self.peek(1) == ':'
+        items = {} if is_map else []
+        while True:
+            if is_map:
+                kind, key = self.tokens[self.pos]
+                key = key[1:-1] if kind == 'string' else key
+                self.pos += 2
+                items[key] = self.read_expression()
+            else:
+                items.append(self.read_expression())
+            if self.peek() == ',':
+                self.pos += 1
+            if self.peek() == ']':
+                self.pos += 1
+                return items
+
+    def lookup(self, name):
+        name = name[len('params.'):] if name.startswith('params.') else name
+        if name in ('launchDir', 'projectDir', 'baseDir'):
+            return self.launch_dir
+        return self.params.get(name)
+
+    def interpolate(self, text):
+        def replace(match):
+            value = self.lookup(match.group(1) or match.group(2))
+            return match.group(0) if value is None else str(value)
+        return re.sub(r'\$\{([\w.]+)\}|\$([A-Za-z_]\w*)', replace, text)
+
+
+def param_to_list(param):
+    # Same rules as paramToList in plink2_gwas.nf
+    if isinstance(param, list):
+        return param
+    if isinstance(param, str) and Path(param).exists():
+        return Path(param).read_text().splitlines()
+    return param
+
+
+# ---------------------------------------------------------------------------
+# Inputs
+# ---------------------------------------------------------------------------
+
+def plink_suffixes(params):
+    return ['.bed', '.bim', '.fam'] if params['plink_flag'] == '--bfile' else ['.pgen', '.pvar', '.psam']
+
+
+def count_variants(variant_file, params):
+    with open(variant_file) as f:
+        n = sum(1 for line in f if line.strip() and not line.startswith('#'))
+    if params['smoke_test']:
+        # every k-th variant, up to N, as in get_smoke_extract_command
+        n = min(params['smoke_variants_per_chr'], -(-n // params['smoke_variant_stride']))
+    return n
+
+
+def get_cohort_covars(params, cohort):
+    if cohort in params['sex_strat_cohort_list']:
+        return params['sex_strat_cat_covars'] + params['sex_strat_cont_covars']
+    return params['cat_covars'] + params['cont_covars']
+
+
+def eligible_combos(params, bin_phenos, quant_phenos):
+    """
+    Cohort x phenotype combinations PLINK2_GWAS will test, with sample counts.
+
+    Mirrors make_pheno_summary_table.py (cohort members with data and genotypes, minus relateds)
+    and the min_bin_cases / min_quant_n / sex-specific filters in the workflow. N and CASES are
+    full-cohort counts, which decide eligibility; N_TESTED is what the GLMs see after any smoke subsample.
+    """
+    id_col = params['id_col']
+    suffixes = plink_suffixes(params)
+    first_chr = params['chromosome_list'][0]
+    plink_fam = f"{params['plink_chr_prefix']}{first_chr}{params['plink_chr_suffix']}{suffixes[2]}"
+    fam_ids = pd.read_table(plink_fam, header=None, comment='#', usecols=[1], sep=r'\s+', dtype=str)[1]
+
+    header = pd.read_csv(params['data_csv'], nrows=0).columns
+    phenos = [p for p in bin_phenos + quant_phenos if p in header]
+    data = pd.read_csv(params['data_csv'], usecols=[id_col] + phenos, index_col=id_col, dtype={id_col: str})
+    cohorts = params['cohort_list']
+    sample_table = pd.read_csv(params['cohort_sets'],
+                               usecols=[id_col] + cohorts, index_col=id_col, dtype={id_col: str})
+
+    drop_samples = set()
+    if params.get('related_list') is not None:
+        drop_samples = set(Path(params['related_list']).read_text().splitlines())
+    sex_phenos = []
+    if params.get('sex_specific_pheno_file') is not None:
+        sex_phenos = Path(params['sex_specific_pheno_file']).read_text().splitlines()
+
+    rows = []
+    for cohort in cohorts:
+        members = sample_table.index[sample_table[cohort] == 1]
+        keep = data.index.intersection(members)
+        keep = keep[keep.isin(fam_ids) & ~keep.isin(drop_samples)]
+        cohort_data = data.loc[keep]
+        # Eligibility comes from make_pheno_summaries on the full cohort; smoke runs only test fewer samples
+        tested_data = cohort_data
+        max_samples = params['smoke_samples_per_cohort'] if params['smoke_test'] else None
+        if max_samples is not None and len(keep) > max_samples:
+            # Same fixed subsample as set_up_cohort_directory.py --maxSamples
+            tested = keep.to_series().sample(n=max_samples, random_state=0).sort_values().index
+            tested_data = cohort_data.loc[tested]
+        for pheno in phenos:
+            is_bin = pheno in bin_phenos
+            n = int(cohort_data[pheno].count())
+            cases = int((cohort_data[pheno] == 1).sum()) if is_bin else None
+            passes = cases >= params['min_bin_cases'] if is_bin else n >= params['min_quant_n']
+            sex_ok = pheno not in sex_phenos or cohort in params['sex_strat_cohort_list']
+            rows.append({'COHORT': cohort, 'PHENO': pheno, 'TYPE': 'binary' if is_bin else 'quantitative',
+                         'N': n, 'CASES': cases, 'N_TESTED': int(tested_data[pheno].count()),
+                         'N_TERMS': 2 + len(get_cohort_covars(params, cohort)), 'ELIGIBLE': passes and sex_ok})
+    combos = pd.DataFrame(rows, columns=['COHORT', 'PHENO', 'TYPE', 'N', 'CASES', 'N_TESTED', 'N_TERMS', 'ELIGIBLE'])
+    return combos.astype({'CASES': 'Int64'})
+
+
+# ---------------------------------------------------------------------------
+# Estimates
+# ---------------------------------------------------------------------------
+
+def process_memory_gb(nf_text, process, params):
+    """
+    First-attempt memory request of a process in plink2_gwas.nf, in GB, or None without a memory directive.
+
+    Understands the directive forms the workflow uses:
+        memory { params.host == 'AOU' ? '63GB' : '24GB' }
+        memory { def base_mem = 63.GB; base_mem * task.attempt ... }
+        memory '8 GB' / memory 8.GB
+    Any other memory directive gives None with a warning naming the process.
+    """
+    start = nf_text.find(f'process {process} {{')
+    if start == -1:
+        raise ValueError(f'Process {process} not found in the workflow')
+    end = nf_text.find('\n}', start)
+    block = nf_text[start:end if end != -1 else len(nf_text)]
+    block = block[:block.find('script:') if 'script:' in block else len(block)]
+
+    ternary = re.search(r"memory\s*\{\s*params\.(\w+)\s*==\s*'([^']*)'\s*\?\s*'([\d.]+)\s*GB'\s*:\s*'([\d.]+)\s*GB'",
+                        block)
+    if ternary:
+        name, value, if_true, if_false = ternary.groups()
+        return float(if_true if params.get(name) == value else if_false)
+    retrying = re.search(r'memory\s*\{[^}]*?base_mem\s*=\s*([\d.]+)\.GB', block, re.DOTALL)
+    if retrying:
+        # Retries multiply by task.attempt; the estimate covers the first attempt
+        return float(retrying.group(1))
+    fixed = re.search(r"^\s*memory\s+'?([\d.]+)\s*\.?\s*GB'?", block, re.MULTILINE)
+    if fixed:
+        return float(fixed.group(1))
+    if re.search(r'^\s*memory\b', block, re.MULTILINE):
+        print(f'Warning: could not read the memory directive of process {process}; '
+              f'its memory is left out of the estimate', file=sys.stderr)
+    return None
+
+
+def estimate_stages(params, combos, variants_by_chr, args):
+    eligible = combos[combos['ELIGIBLE']]
+    n_chr = len(variants_by_chr)
+    total_variants = sum(variants_by_chr.values())
+    n_cohorts = len(params['cohort_list'])
+    nf_text = Path(args.pipeline).read_text()
+
+    # Work per combo summed over chromosomes: variants x samples x model terms
+    work = eligible['N_TESTED'] * eligible['N_TERMS'] * total_variants
+    bin_work = work[eligible['TYPE'] == 'binary'].sum()
+    quant_work = work[eligible['TYPE'] == 'quantitative'].sum()
+    n_bin = int((eligible['TYPE'] == 'binary').sum())
+    n_quant = int((eligible['TYPE'] == 'quantitative').sum())
+
+    stages = []
+
+    def add(stage, tasks, cpu_seconds, output_bytes, process=None):
+        # Memory as requested by the process's directive; NaN when it leaves it to the executor default
+        mem_gb = process_memory_gb(nf_text, process or stage, params)
+        mem_gb = float('nan') if mem_gb is None else mem_gb
+        stages.append({'STAGE': stage, 'TASKS': int(tasks), 'CPU_HOURS': cpu_seconds / 3600,
+                       'MEM_PER_TASK_GB': mem_gb, 'PEAK_MEM_GB': mem_gb * min(tasks, args.max_parallel),
+                       'OUTPUT_GB': output_bytes / 1E9})
+
+    add('preflight_checks', 1, args.task_overhead, 0)
+    add('set_up_cohort', n_cohorts, n_cohorts * args.task_overhead, 0)
+    add('standardize_phenos', n_cohorts, n_cohorts * args.task_overhead, 0)
+
+    bin_tasks = n_bin * n_chr
+    bin_bytes = n_bin * total_variants * args.glm_bytes_per_variant
+    if params['two_stage_logistic']:
+        add('call_plink2_logistic_first_pass', bin_tasks,
+            bin_tasks * args.task_overhead + bin_work * args.logistic_cost, bin_bytes)
+        # Under the null about firth_retest_p of variants are re-tested
+        add('call_plink2_firth_retest', bin_tasks,
+            bin_tasks * args.task_overhead + bin_work * params['firth_retest_p'] * args.firth_cost,
+            bin_bytes * params['firth_retest_p'])
+    else:
+        add('call_plink2_logistic', bin_tasks,
+            bin_tasks * args.task_overhead + bin_work * (args.logistic_cost + args.firth_fallback_fraction * args.firth_cost),
+            bin_bytes)
+    quant_tasks = n_quant * n_chr
+    add('call_plink2_linear', quant_tasks, quant_tasks * args.task_overhead + quant_work * args.linear_cost,
+        n_quant * total_variants * args.glm_bytes_per_variant)
+
+    n_combos = len(eligible)
+    add('merge_and_filter_plink2_output', n_combos,
+        n_combos * (args.task_overhead + total_variants * args.merge_cost),
+        n_combos * total_variants * args.sumstats_bytes_per_variant)
+    plot_stage = 'plot_plink_results_with_annot' if params.get('annotate') else 'plot_plink_results'
+    add(plot_stage, n_combos, n_combos * (args.task_overhead + total_variants * args.plot_cost),
+        n_combos * args.plot_bytes)
+    # The report zip holds a copy of every plot
+    add('make_results_report', 1, args.task_overhead + n_combos * 0.5, n_combos * args.plot_bytes)
+
+    stages = pd.DataFrame(stages)
+    total = stages.sum(numeric_only=True)
+    total['STAGE'] = 'TOTAL'
+    total['MEM_PER_TASK_GB'] = stages['MEM_PER_TASK_GB'].max()
+    total['PEAK_MEM_GB'] = stages['PEAK_MEM_GB'].max()
+    stages = pd.concat([stages, total.to_frame().T], ignore_index=True)
+    return stages.astype({'TASKS': int})
+
+
+def main():
+    args = make_arg_parser().parse_args()
+
+    reader = ConfigReader(args.launch_dir)
+    reader.read_defaults(args.pipeline)
+    for config in args.config:
+        params = reader.read(config)
+
+    bin_phenos = param_to_list(params['bin_pheno_list'])
+    quant_phenos = param_to_list(params['quant_pheno_list'])
+
+    suffixes = plink_suffixes(params)
+    variants_by_chr = {
+        chr: count_variants(f"{params['plink_chr_prefix']}{chr}{params['plink_chr_suffix']}{suffixes[1]}", params)
+        for chr in params['chromosome_list']
+    }
+    combos = eligible_combos(params, bin_phenos, quant_phenos)
+    stages = estimate_stages(params, combos, variants_by_chr, args)
+
+    print(f"Variants: {sum(variants_by_chr.values()):,} across {len(variants_by_chr)} chromosomes")
+    print(f"Cohort x phenotype combinations: {int(combos['ELIGIBLE'].sum())} eligible of {len(combos)}\n")
+    print(combos.to_string(index=False))
+    print()
+    print(stages.to_string(index=False, float_format=lambda x: f'{x:,.2f}'))
+
+    if args.output is not None:
+        stages.to_csv(args.output, index=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,11 @@
+import os
 import json
+import hashlib
 import argparse
 from pathlib import Path
 
+GWAS_PLOT_TYPES = ['manhattan', 'qq']
+
 
 def make_arg_parser():
     parser = argparse.ArgumentParser(
@@ -13,8 +17,12 @@ def make_arg_parser():
                         help='Path to pheno_summaries.csv')
     parser.add_argument('--top_hits_csv', required=True,
                         help='Path to plink2_all_suggestive.csv')
+    parser.add_argument('--glm_log_metrics', default=None,
+                        help='Path to plink2_glm_log_metrics.csv parsed from the GLM tasks\' plink2 logs')
     parser.add_argument('--plots_dir', required=True,
                         help='Directory containing PNG plot files')
+    parser.add_argument('--checksum', action='store_true',
+                        help='Record a BLAKE2b checksum of every plot in the plot index (reads each file once)')
     parser.add_argument('--output', default='results_manifest.json',
                         help='Output path for the manifest JSON (default: results_manifest.json)')
     return parser
@@ -29,6 +37,67 @@ def to_list(val):
     return [val]
 
 
+def file_checksum(path):
+    """Fast 128-bit BLAKE2b checksum of a file, as hex."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def split_prefixes(name):
+    """Every (prefix, rest) split of a dotted name at a period."""
+    parts = name.split('.')
+    return [('.'.join(parts[:i]), '.'.join(parts[i:])) for i in range(1, len(parts))]
+
+
+def index_plots(plots_dir, cohort_list, all_phenos, checksum=False):
+    """
+    Index the PNGs in plots_dir from a single directory listing.
+
+    Names are matched against the run's cohorts and phenotypes rather than split blindly,
+    since either may contain periods:
+        {cohort}.{pheno}.manhattan.png / {cohort}.{pheno}.qq.png -> GWAS plots
+        {pheno}.{plot_type}.png                                  -> phenotype summary plots
+
+    Returns:
+        list: one dict per (cohort, pheno, plot type) with path, size, mtime and optionally checksum;
+              cohort is None for phenotype summary plots
+    """
+    cohorts, phenos = set(cohort_list), set(all_phenos)
+    index = []
+    # No plots staged (or none made yet): an empty index, as the per-file exists() checks gave
+    if not os.path.isdir(plots_dir):
+        return index
+    with os.scandir(plots_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith('.png') or not entry.is_file():
+                continue
+            stem = entry.name[:-len('.png')]
+            keys = []
+
+            # Same matches as the former glob('{pheno}.*.png') per phenotype
+            for prefix, rest in split_prefixes(stem):
+                if prefix in phenos:
+                    keys.append((None, prefix, rest))
+
+            cohort_pheno, _, plot_type = stem.rpartition('.')
+            if plot_type in GWAS_PLOT_TYPES:
+                for cohort, pheno in split_prefixes(cohort_pheno):
+                    if cohort in cohorts and pheno in phenos:
+                        keys.append((cohort, pheno, plot_type))
+
+            if not keys:
+                continue
+            stat = entry.stat()
+            file_info = {'path': str(Path(plots_dir) / entry.name), 'size': stat.st_size, 'mtime': stat.st_mtime}
+            if checksum:
+                file_info['checksum'] = file_checksum(entry.path)
+            index.extend({'cohort': c, 'pheno': p, 'plot_type': t, **file_info} for c, p, t in keys)
+    return sorted(index, key=lambda e: e['path'])
+
+
 def main():
     args = make_arg_parser().parse_args()
 
@@ -37,6 +106,7 @@ def main():
 
     cpc = params.get('cohorts_phenotypes_chromosomes', params)  # fallback to flat for compatibility
     out = params.get('output_parameters', params)
+    smoke = params.get('smoke_test', {})
 
     cohort_list = to_list(cpc.get('cohort_list', []))
     bin_pheno_list = to_list(cpc.get('bin_pheno_list', []))
@@ -44,29 +114,20 @@ def main():
     p_cutoff = out.get('p_cutoff_summarize', 1e-5)
     all_phenos = bin_pheno_list + quant_pheno_list
 
-    plots_dir = Path(args.plots_dir)
+    plot_index = index_plots(args.plots_dir, cohort_list, all_phenos, args.checksum)
 
     # Pheno-level summary plots: {pheno}.{plot_type}.png
     pheno_summary_plots = {}
-    for pheno in all_phenos:
-        plots = sorted(plots_dir.glob(f'{pheno}.*.png'))
-        if plots:
-            pheno_summary_plots[pheno] = [str(p) for p in plots]
+    for e in plot_index:
+        if e['cohort'] is None:
+            pheno_summary_plots.setdefault(e['pheno'], []).append(e['path'])
+    pheno_summary_plots = {pheno: pheno_summary_plots[pheno] for pheno in all_phenos if pheno in pheno_summary_plots}
 
     # GWAS result plots: {cohort}.{pheno}.manhattan.png and {cohort}.{pheno}.qq.png
-    gwas_plots = {}
-    for cohort in cohort_list:
-        gwas_plots[cohort] = {}
-        for pheno in all_phenos:
-            entry = {}
-            manhattan = plots_dir / f'{cohort}.{pheno}.manhattan.png'
-            qq = plots_dir / f'{cohort}.{pheno}.qq.png'
-            if manhattan.exists():
-                entry['manhattan'] = str(manhattan)
-            if qq.exists():
-                entry['qq'] = str(qq)
-            if entry:
-                gwas_plots[cohort][pheno] = entry
+    gwas_plots = {cohort: {} for cohort in cohort_list}
+    for e in plot_index:
+        if e['cohort'] is not None:
+            gwas_plots[e['cohort']].setdefault(e['pheno'], {})[e['plot_type']] = e['path']
 
     manifest = {
         'cohort_list': cohort_list,
@@ -75,8 +136,11 @@ def main():
         'p_cutoff_summarize': p_cutoff,
         'top_hits_csv': args.top_hits_csv,
         'pheno_summaries_csv': args.pheno_summaries,
+        'glm_log_metrics_csv': args.glm_log_metrics,
         'pheno_summary_plots': pheno_summary_plots,
         'gwas_plots': gwas_plots,
+        'plot_index': plot_index,
+        'smoke_test': bool(smoke.get('smoke_test', False)) if isinstance(smoke, dict) else bool(smoke),
         'params': params,
     }
 
@@ -1,9 +1,21 @@
+import os
 import json
+import hashlib
 import zipfile
 import argparse
 import shutil
+import multiprocessing
 import pandas as pd
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from pipeline_metrics import PipelineMetrics, file_bytes
+import nextflow_trace
+
+try:
+    from PIL import Image
+except ImportError:
+    # Without Pillow the pages fall back to the full-size plots
+    Image = None
 
 
 CSS = """
@@ -50,6 +62,18 @@ h3 {
     border-bottom: 2px solid #e2e8f0;
 }
 
+/* Smoke test warning banner */
+.smoke-banner {
+    background: #fff5f5;
+    border: 2px solid #e53e3e;
+    color: #c53030;
+    border-radius: 8px;
+    padding: 1rem;
+    margin: 1rem 0;
+    font-weight: 700;
+    text-align: center;
+}
+
 /* Plot container styling */
 .plot-container {
     background: white;
@@ -186,6 +210,62 @@ tr:hover {
     color: #2d3748;
 }
 
+/* Top hits search in the side menu */
+.search-box {
+    padding: 0.75rem 1rem;
+    border-bottom: 1px solid #4a5568;
+}
+
+.search-box input {
+    width: 100%;
+    box-sizing: border-box;
+    padding: 0.5rem 0.75rem;
+    border: none;
+    border-radius: 6px;
+    font-size: 0.9rem;
+}
+
+.search-results {
+    font-size: 0.85rem;
+    color: #cbd5e0;
+    max-height: 50vh;
+    overflow-y: auto;
+}
+
+.search-results .search-term {
+    margin-top: 0.5rem;
+    font-weight: 600;
+    color: white;
+}
+
+.side-menu .search-results a {
+    padding: 0.25rem 0 0.25rem 0.75rem;
+    font-size: 0.85rem;
+}
+
+/* Sorting and filtering of lazily loaded results tables */
+th.sortable {
+    cursor: pointer;
+    user-select: none;
+}
+
+th.sortable.sorted-asc::after {
+    content: ' \\25B2';
+}
+
+th.sortable.sorted-desc::after {
+    content: ' \\25BC';
+}
+
+.table-filter {
+    width: 100%;
+    max-width: 320px;
+    padding: 0.5rem 0.75rem;
+    border: 1px solid #cbd5e0;
+    border-radius: 8px;
+    font-size: 0.95rem;
+}
+
 /* Sidebar styling */
 .side-menu {
     position: fixed;
@@ -309,14 +389,236 @@ function toggleSubmenu(id) {
     submenu.style.display = (submenu.style.display === 'none') ? 'block' : 'none';
 }
 
-function toggleSubCohorts(pheno) {
-    const subCohortsDiv = document.getElementById(`${pheno}-subcohorts`);
+function menuLink(href, text, className, onclick) {
+    const a = document.createElement('a');
+    a.href = href;
+    a.textContent = text;
+    if (className) a.className = className;
+    if (onclick) a.addEventListener('click', event => { event.preventDefault(); onclick(); });
+    return a;
+}
+
+/*
+ * The side menu is built from the REPORT_NAV tree in nav.js, shared by every page.
+ * Cohort links under a phenotype are only created when that phenotype is expanded.
+ */
+function renderSidebar() {
+    const menu = document.querySelector('.side-menu');
+    if (!menu || typeof REPORT_NAV === 'undefined') return;
+    const submenu = document.createElement('div');
+    submenu.id = 'results-filter-submenu';
+    submenu.className = 'submenu';
+    REPORT_NAV.phenos.forEach(pheno => {
+        const group = document.createElement('div');
+        group.className = 'cohort-group';
+        const subCohortsDiv = document.createElement('div');
+        subCohortsDiv.className = 'subcohorts';
+        subCohortsDiv.style.display = 'none';
+        group.append(menuLink('#', pheno, null, () => toggleSubCohorts(pheno, subCohortsDiv)), subCohortsDiv);
+        submenu.append(group);
+    });
+    if (REPORT_NAV.search_prefix) {
+        const box = document.createElement('div');
+        box.className = 'search-box';
+        const input = document.createElement('input');
+        input.type = 'search';
+        input.id = 'report-search';
+        input.placeholder = 'Gene, RSID or variant';
+        input.addEventListener('input', runSearch);
+        const results = document.createElement('div');
+        results.id = 'search-results';
+        results.className = 'search-results';
+        box.append(input, results);
+        menu.append(box);
+    }
+    menu.append(
+        menuLink('index.html', 'Home'),
+        menuLink('phenotype_summary.html', 'Phenotype Summary'),
+        menuLink('#', 'Results Filter', null, () => toggleSubmenu('results-filter-submenu')),
+        submenu,
+        menuLink('method_summary.html', 'Analysis Logs'),
+    );
+    if (REPORT_NAV.performance) menu.append(menuLink('performance.html', 'Pipeline Performance'));
+}
+
+/*
+ * Search over top hits. search/meta.js lists the cohort x phenotype pages, and search/<prefix>.js
+ * holds every term (gene, RSID, variant ID) starting with that prefix, mapped to its
+ * [page, row, p-value] hits. Only the shard for the typed prefix is loaded.
+ */
+const reportSearch = {meta: null, shards: {}, requested: {}};
+
+function loadScript(src, onerror) {
+    const script = document.createElement('script');
+    script.src = src;
+    if (onerror) script.onerror = onerror;
+    document.body.appendChild(script);
+}
+
+function plinkSearchMeta(meta) {
+    reportSearch.meta = meta;
+    runSearch();
+}
+
+function plinkSearchShard(prefix, terms) {
+    reportSearch.shards[prefix] = terms;
+    runSearch();
+}
+
+function searchShardName(prefix) {
+    return prefix.replace(/[^a-z0-9]/g, c => '_' + c.charCodeAt(0).toString(16));
+}
+
+function runSearch() {
+    const input = document.getElementById('report-search');
+    const results = document.getElementById('search-results');
+    if (!input || !results) return;
+    const query = input.value.trim().toLowerCase();
+    const n = REPORT_NAV.search_prefix;
+    results.innerHTML = '';
+    if (!query) return;
+    if (query.length < n) { results.textContent = `Type at least ${n} characters`; return; }
+
+    const prefix = query.slice(0, n);
+    if (!reportSearch.requested.meta) {
+        reportSearch.requested.meta = true;
+        loadScript('search/meta.js');
+    }
+    if (!reportSearch.requested[prefix]) {
+        reportSearch.requested[prefix] = true;
+        // No shard file means no term starts with this prefix
+        loadScript(`search/${searchShardName(prefix)}.js`, () => plinkSearchShard(prefix, {}));
+    }
+    if (!reportSearch.meta || !(prefix in reportSearch.shards)) { results.textContent = 'Searching...'; return; }
+
+    const matches = Object.keys(reportSearch.shards[prefix]).filter(term => term.startsWith(query))
+        .sort((a, b) => (b === query) - (a === query) || a.localeCompare(b)).slice(0, 25);
+    if (!matches.length) { results.textContent = 'No matching top hits'; return; }
+    matches.forEach(term => {
+        const [label, hits] = reportSearch.shards[prefix][term];
+        const heading = document.createElement('div');
+        heading.className = 'search-term';
+        heading.textContent = label;
+        results.append(heading);
+        const byPage = {};
+        hits.forEach(([page, row, p]) => {
+            const entry = byPage[page] = byPage[page] || {rows: 0, p: null};
+            entry.rows++;
+            if (p !== null && (entry.p === null || p < entry.p)) entry.p = p;
+        });
+        Object.entries(byPage).forEach(([page, entry]) => {
+            const [pheno, cohort] = reportSearch.meta.pages[page];
+            const text = `${pheno} / ${cohort}: ${entry.rows} row${entry.rows > 1 ? 's' : ''}`
+                + (entry.p === null ? '' : `, p=${entry.p.toExponential(1)}`);
+            results.append(menuLink(`${pheno}.${cohort}.html#search=${encodeURIComponent(label)}`, text));
+        });
+    });
+}
+
+function toggleSubCohorts(pheno, subCohortsDiv) {
+    if (!subCohortsDiv.hasChildNodes()) {
+        REPORT_NAV.cohorts.forEach(cohort => {
+            subCohortsDiv.append(menuLink(`${pheno}.${cohort}.html`, cohort, 'subcohort-link'));
+        });
+    }
     subCohortsDiv.style.display = (subCohortsDiv.style.display === 'none') ? 'block' : 'none';
 }
 
 let currentPage = 1;
 let rowsPerPage = 10;
 
+/*
+ * Top hits tables: the page inlines its first rows as JSON and the full table lives in a
+ * data/<pheno>.<cohort>.js shard. The shard is loaded with a script tag (fetch() is blocked
+ * for file:// pages) only once the user pages past the inlined rows, sorts or filters.
+ */
+const resultsTable = {table: null, view: [], complete: false, loading: false, onLoad: null,
+                      sortCol: null, sortAsc: true, filter: ''};
+
+function initResultsTable() {
+    const inline = document.getElementById('results-data');
+    if (!inline) return;
+    resultsTable.table = JSON.parse(inline.textContent);
+    resultsTable.complete = resultsTable.table.data.length >= resultsTable.table.total;
+    // Links from the search box open the page filtered to the searched term
+    if (location.hash.startsWith('#search=')) {
+        const term = decodeURIComponent(location.hash.slice('#search='.length));
+        const filterInput = document.querySelector('.table-filter');
+        if (filterInput) filterInput.value = term;
+        filterResultsTable(term);
+        return;
+    }
+    applyTableView();
+}
+
+function loadFullTable(then) {
+    if (resultsTable.complete) { then(); return; }
+    resultsTable.onLoad = then;
+    if (resultsTable.loading) return;
+    resultsTable.loading = true;
+    window.plinkReportData = table => {
+        resultsTable.table.data = table.data;
+        resultsTable.complete = true;
+        resultsTable.loading = false;
+        resultsTable.onLoad();
+    };
+    const script = document.createElement('script');
+    script.src = document.getElementById('results-table').dataset.shard;
+    document.body.appendChild(script);
+}
+
+function compareCells(a, b, dir) {
+    // Missing values stay at the bottom in either direction
+    if (a === b) return 0;
+    if (a === null) return 1;
+    if (b === null) return -1;
+    if (typeof a === 'number' && typeof b === 'number') return (a - b) * dir;
+    return String(a).localeCompare(String(b), undefined, {numeric: true}) * dir;
+}
+
+function applyTableView() {
+    let rows = resultsTable.table.data;
+    const filter = resultsTable.filter;
+    if (filter) {
+        rows = rows.filter(row => row.some(v => v !== null && String(v).toLowerCase().includes(filter)));
+    }
+    if (resultsTable.sortCol !== null) {
+        const col = resultsTable.sortCol;
+        const dir = resultsTable.sortAsc ? 1 : -1;
+        rows = rows.slice().sort((a, b) => compareCells(a[col], b[col], dir));
+    }
+    resultsTable.view = rows;
+    currentPage = Math.min(currentPage, Math.max(1, Math.ceil(tableRowCount() / rowsPerPage)));
+    showCurrentPage();
+}
+
+function tableRowCount() {
+    return resultsTable.complete ? resultsTable.view.length : resultsTable.table.total;
+}
+
+function sortResultsTable(col) {
+    loadFullTable(() => {
+        resultsTable.sortAsc = (resultsTable.sortCol === col) ? !resultsTable.sortAsc : true;
+        resultsTable.sortCol = col;
+        currentPage = 1;
+        document.querySelectorAll('#results-table th').forEach((th, i) => {
+            th.classList.toggle('sorted-asc', i === col && resultsTable.sortAsc);
+            th.classList.toggle('sorted-desc', i === col && !resultsTable.sortAsc);
+        });
+        applyTableView();
+    });
+}
+
+function filterResultsTable(value) {
+    resultsTable.filter = value.trim().toLowerCase();
+    currentPage = 1;
+    loadFullTable(applyTableView);
+}
+
+function escapeHtml(value) {
+    return String(value).replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+}
+
 function updateRowsPerPage(value) {
     rowsPerPage = parseInt(value);
     currentPage = 1;
@@ -324,19 +626,22 @@ function updateRowsPerPage(value) {
 }
 
 function showCurrentPage() {
+    const table = document.getElementById('results-table');
+    if (!table || !resultsTable.table) return;
     const startIdx = (currentPage - 1) * rowsPerPage;
     const endIdx = startIdx + rowsPerPage;
-    const table = document.getElementById('results-table');
-    if (!table) return;
-    const tbody = table.querySelector('tbody');
-    const allRows = Array.from(tbody.getElementsByTagName('tr'));
-    allRows.forEach(row => row.style.display = 'none');
-    allRows.slice(startIdx, endIdx).forEach(row => { row.style.display = ''; });
-    updatePaginationInfo(allRows.length);
+    if (!resultsTable.complete && endIdx > resultsTable.view.length) {
+        // Past the inlined rows: re-render once the shard arrives
+        loadFullTable(applyTableView);
+    }
+    table.querySelector('tbody').innerHTML = resultsTable.view.slice(startIdx, endIdx).map(row =>
+        '<tr>' + row.map(v => `<td>${v === null ? 'NA' : escapeHtml(v)}</td>`).join('') + '</tr>'
+    ).join('');
+    updatePaginationInfo(tableRowCount());
 }
 
 function updatePaginationInfo(total) {
-    const totalPages = Math.ceil(total / rowsPerPage);
+    const totalPages = Math.max(1, Math.ceil(total / rowsPerPage));
     const pageInfo = document.getElementById('page-info');
     const prevButton = document.getElementById('prev-page');
     const nextButton = document.getElementById('next-page');
@@ -350,11 +655,8 @@ function previousPage() {
 }
 
 function nextPage() {
-    const table = document.getElementById('results-table');
-    if (!table) return;
-    const tbody = table.querySelector('tbody');
-    const totalRows = tbody.getElementsByTagName('tr').length;
-    const totalPages = Math.ceil(totalRows / rowsPerPage);
+    if (!resultsTable.table) return;
+    const totalPages = Math.ceil(tableRowCount() / rowsPerPage);
     if (currentPage < totalPages) { currentPage++; showCurrentPage(); }
 }
 
@@ -372,61 +674,302 @@ function togglePlotType(phenotype, plotType) {
 }
 
 function toggleImageSize(img) {
-    img.classList.toggle('enlarged');
+    // Thumbnails carry the full-size plot in data-full, which is only fetched when enlarged
+    const enlarged = img.classList.toggle('enlarged');
+    if (img.dataset.full) {
+        if (!img.dataset.thumb) img.dataset.thumb = img.getAttribute('src');
+        img.src = enlarged ? img.dataset.full : img.dataset.thumb;
+    }
 }
 
 document.addEventListener('DOMContentLoaded', () => {
-    showCurrentPage();
+    renderSidebar();
+    initResultsTable();
 });
 """
 
 
+class ReportArchive:
+    """
+    Writes report files straight into the zip as they are produced, and also into the
+    unzipped report directory when one is kept. Already-compressed formats are stored as-is.
+    """
+
+    STORED_SUFFIXES = {'.png', '.jpg', '.jpeg', '.gif', '.gz', '.bgz', '.zst', '.zip'}
+
+    def __init__(self, output_zip, report_name, output_dir=None, previous_zip=None):
+        self.report_name = report_name
+        self.output_dir = output_dir
+        self.names = []
+        # Built next to the target and renamed on close, so the previous zip stays readable meanwhile
+        self.output_zip = Path(output_zip)
+        self.tmp_zip = self.output_zip.with_name(self.output_zip.name + '.tmp')
+        self.zf = zipfile.ZipFile(self.tmp_zip, 'w', zipfile.ZIP_DEFLATED)
+        self.previous = zipfile.ZipFile(previous_zip) if previous_zip is not None else None
+        self.previous_names = set(self.previous.namelist()) if self.previous is not None else set()
+
+    def _compress_type(self, rel_path):
+        return zipfile.ZIP_STORED if Path(rel_path).suffix.lower() in self.STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+
+    def _dir_path(self, rel_path):
+        path = self.output_dir / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def write_text(self, rel_path, text):
+        self.zf.writestr(f'{self.report_name}/{rel_path}', text, compress_type=self._compress_type(rel_path))
+        if self.output_dir is not None:
+            self._dir_path(rel_path).write_text(text)
+        self.names.append(rel_path)
+
+    def add_file(self, rel_path, src_path):
+        self.zf.write(src_path, f'{self.report_name}/{rel_path}', compress_type=self._compress_type(rel_path))
+        if self.output_dir is not None:
+            shutil.copy(src_path, self._dir_path(rel_path))
+        self.names.append(rel_path)
+
+    def has_previous(self, rel_path):
+        return f'{self.report_name}/{rel_path}' in self.previous_names
+
+    def reuse(self, rel_path):
+        """Copy an unchanged file from the previous zip."""
+        data = self.previous.read(f'{self.report_name}/{rel_path}')
+        self.zf.writestr(f'{self.report_name}/{rel_path}', data, compress_type=self._compress_type(rel_path))
+        if self.output_dir is not None:
+            self._dir_path(rel_path).write_bytes(data)
+        self.names.append(rel_path)
+
+    def close(self):
+        self.zf.close()
+        if self.previous is not None:
+            self.previous.close()
+        os.replace(self.tmp_zip, self.output_zip)
+
+
+# Thumbnails match the on-page plot width (.plot-image max-width)
+THUMBNAIL_WIDTH = 800
+
+
+def _make_thumbnail(src, thumbnail_dir, checksum=None):
+    """
+    Return the cached thumbnail for a plot, making it if needed. Thumbnails are keyed by the
+    checksum recorded in the manifest's plot index, or else the SHA-256 of the source file,
+    so regenerated plots get new ones and unchanged plots are reused.
+    """
+    if checksum is None:
+        digest = hashlib.sha256()
+        with open(src, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        checksum = digest.hexdigest()
+    thumb_path = Path(thumbnail_dir) / f'{checksum}.{THUMBNAIL_WIDTH}.png'
+    if not thumb_path.exists():
+        try:
+            with Image.open(src) as img:
+                img.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_WIDTH * 10))
+                # Write then rename so concurrent reports never read a partial thumbnail
+                tmp_path = thumb_path.with_suffix(f'.{os.getpid()}.tmp')
+                img.save(tmp_path, format='PNG', optimize=True)
+        except OSError as e:
+            print(f"  Warning: no thumbnail for {src}: {e}")
+            return None
+        os.replace(tmp_path, thumb_path)
+    return str(thumb_path)
+
+
+# Search shards are keyed by this many leading characters of the lower-cased term
+SEARCH_PREFIX_LENGTH = 3
+# Gene annotations can name several genes, e.g. upstream/downstream pairs
+SEARCH_GENE_SEPARATORS = r'[/,;\s]+'
+
+
+def _search_shard_name(prefix):
+    """File-safe shard name; matches searchShardName() in the page script."""
+    return ''.join(c if c.isascii() and c.isalnum() else f'_{ord(c):x}' for c in prefix)
+
+
+# Input hashes of the cohort x phenotype pages, stored in the report for --incremental runs
+HASH_MANIFEST = 'report_hashes.json'
+
+# Top hits rows written into each results page; the full table is in the page's data shard
+INLINE_TABLE_ROWS = 100
+
+# Set in the parent before forking page workers so each worker reuses the loaded tables
+_PAGE_GENERATOR = None
+
+
+def _write_cohort_pheno_pages(combos):
+    # Only the parent writes to the zip, so workers hand back (path, text) pairs and their page hashes
+    _PAGE_GENERATOR._pending = []
+    for cohort, pheno in combos:
+        _PAGE_GENERATOR.generate_cohort_pheno_page(cohort, pheno)
+    return _PAGE_GENERATOR._pending, _PAGE_GENERATOR.page_hashes
+
+
 class PlinkReportGenerator:
-    def __init__(self, manifest_path, output_zip):
+    def __init__(self, manifest_path, output_zip, trace_path=None, workers=1, keep_report_dir=True,
+                 cache_dir='.report_cache', previous_zip=None):
+        self.metrics = PipelineMetrics(__file__)
+        self.workers = max(1, workers)
         with open(manifest_path) as f:
             self.manifest = json.load(f)
 
         self.output_zip = Path(output_zip)
         self.report_name = self.output_zip.stem
-        self.output_dir = Path(self.report_name)
-        self.output_dir.mkdir(parents=True, exist_ok=True)
-        (self.output_dir / 'Plots').mkdir(exist_ok=True)
+        # Without the unzipped copy, pages and assets only go into the zip
+        self.output_dir = Path(self.report_name) if keep_report_dir else None
+        self.archive = None
+        self._pending = None
+        self.thumbnail_dir = Path(cache_dir) / 'thumbnails'
+        self.thumbnails = {}
+
+        # Incremental mode: unchanged pages are copied from previous_zip, judged by the input hashes stored in it
+        self.previous_zip = Path(previous_zip) if previous_zip is not None else None
+        self.previous_hashes = {}
+        self.page_hashes = {}
+        self.pages_reused = 0
+        # Any change to this script (templates, CSS, JS) invalidates every page
+        self.code_hash = hashlib.sha256(Path(__file__).read_bytes()).hexdigest()
 
         self.cohort_list = self.manifest['cohort_list']
         self.bin_pheno_list = self.manifest.get('bin_pheno_list', [])
         self.quant_pheno_list = self.manifest.get('quant_pheno_list', [])
         self.all_phenos = self.bin_pheno_list + self.quant_pheno_list
-
-        self.top_hits_df = pd.read_csv(self.manifest['top_hits_csv'])
-        self.pheno_summaries_df = pd.read_csv(self.manifest['pheno_summaries_csv'])
+        self.smoke_test = self.manifest.get('smoke_test', False)
+        # Top hits columns are renamed by the pipeline's plink2_col_names map
+        col_map = self.manifest.get('params', {}).get('output_parameters', {}).get('column_name_map') or {}
+        self.id_col = col_map.get('ID', 'ID')
+        self.p_col = col_map.get('P', 'P')
+
+        with self.metrics.phase('read') as m:
+            self.top_hits_df = pd.read_csv(self.manifest['top_hits_csv'])
+            self.pheno_summaries_df = pd.read_csv(self.manifest['pheno_summaries_csv'])
+            m['rows'] = len(self.top_hits_df) + len(self.pheno_summaries_df)
+
+            # Split the top hits once instead of masking the full table for every results page
+            self.top_hits_by_combo = {}
+            if 'COHORT' in self.top_hits_df.columns and 'PHENO' in self.top_hits_df.columns:
+                self.top_hits_by_combo = dict(tuple(self.top_hits_df.groupby(['COHORT', 'PHENO'], sort=False)))
+            m['bytes_read'] = file_bytes(manifest_path, self.manifest['top_hits_csv'],
+                                         self.manifest['pheno_summaries_csv'])
+
+            # Per-task figures parsed from the plink2 logs; empty when no GLM task ran
+            self.glm_log_df = None
+            glm_log_csv = self.manifest.get('glm_log_metrics_csv')
+            if glm_log_csv and Path(glm_log_csv).exists() and Path(glm_log_csv).stat().st_size > 0:
+                self.glm_log_df = pd.read_csv(glm_log_csv)
+                m['rows'] += len(self.glm_log_df)
+                m['bytes_read'] += file_bytes(glm_log_csv)
+
+            # Optional Nextflow trace for the Pipeline Performance page
+            self.trace_df = None
+            if trace_path is not None:
+                self.trace_df = nextflow_trace.read_trace(trace_path, self.cohort_list, self.all_phenos)
+                m['rows'] += len(self.trace_df)
+                m['bytes_read'] += file_bytes(trace_path)
 
     def _plot_rel_path(self, src_path):
         """Return the HTML-relative path for a plot file (Plots/<filename>)."""
         return f"Plots/{Path(src_path).name}"
 
+    def _thumbnail_rel_path(self, src_path):
+        return f"Plots/thumbs/{Path(src_path).name}"
+
+    def _plot_img(self, src, alt):
+        """An <img> for a plot: its thumbnail, lazily loaded, with the full-size plot shown when clicked."""
+        if str(src) not in self.thumbnails:
+            return f'<img src="{self._plot_rel_path(src)}" alt="{alt}" class="plot-image" onclick="toggleImageSize(this)">'
+        return (
+            f'<img src="{self._thumbnail_rel_path(src)}" data-full="{self._plot_rel_path(src)}" alt="{alt}" '
+            'loading="lazy" class="plot-image" onclick="toggleImageSize(this)">'
+        )
+
+    def _plot_sources(self):
+        """All plot source paths in the manifest."""
+        all_plot_sources = set()
+        for plots in self.manifest.get('pheno_summary_plots', {}).values():
+            all_plot_sources.update(plots)
+        for cohort_plots in self.manifest.get('gwas_plots', {}).values():
+            for pheno_plots in cohort_plots.values():
+                all_plot_sources.update(pheno_plots.values())
+        return sorted(all_plot_sources)
+
+    def make_thumbnails(self):
+        """Make (or reuse cached) thumbnails for every plot in a process pool."""
+        if Image is None:
+            print("  Pillow not installed; pages will load full-size plots")
+            return
+        sources = [src for src in self._plot_sources() if Path(src).exists()]
+        self.thumbnail_dir.mkdir(parents=True, exist_ok=True)
+        dirs = [self.thumbnail_dir] * len(sources)
+        # Checksums from generate_plink_manifest.py --checksum save reading every plot twice
+        known = {e['path']: e.get('checksum') for e in self.manifest.get('plot_index', [])}
+        checksums = [known.get(src) for src in sources]
+        if self.workers == 1 or len(sources) < 2:
+            thumbs = list(map(_make_thumbnail, sources, dirs, checksums))
+        else:
+            chunk_size = max(1, len(sources) // (self.workers * 4))
+            with ProcessPoolExecutor(self.workers) as pool:
+                thumbs = list(pool.map(_make_thumbnail, sources, dirs, checksums, chunksize=chunk_size))
+        self.thumbnails = {src: thumb for src, thumb in zip(sources, thumbs) if thumb is not None}
+        print(f"  {len(self.thumbnails)} plot thumbnails")
+
+    def _write_text(self, rel_path, text):
+        """Write a report file; text None copies the unchanged file from the previous zip."""
+        if self._pending is not None:
+            self._pending.append((rel_path, text))
+        elif text is None:
+            self.archive.reuse(rel_path)
+        else:
+            self.archive.write_text(rel_path, text)
+
+    def _load_previous_hashes(self):
+        """Read the input hashes stored in the previous report zip; returns the zip path if usable."""
+        if self.previous_zip is None or not self.previous_zip.exists():
+            return None
+        try:
+            with zipfile.ZipFile(self.previous_zip) as zf:
+                self.previous_hashes = json.loads(zf.read(f'{self.report_name}/{HASH_MANIFEST}'))['pages']
+        except (zipfile.BadZipFile, KeyError, ValueError) as e:
+            print(f"  No usable page hashes in {self.previous_zip} ({e}); rebuilding every page")
+            return None
+        return self.previous_zip
+
+    def _page_inputs_unchanged(self, page, files, *inputs):
+        """
+        Record the hash of a page's inputs. If it matches the previous report and all of the page's
+        files are in the previous zip, copy them over and return True so the page isn't rebuilt.
+        """
+        digest = hashlib.sha256(self.code_hash.encode())
+        for part in inputs:
+            digest.update(part if isinstance(part, bytes) else json.dumps(part, sort_keys=True, default=str).encode())
+        self.page_hashes[page] = {'hash': digest.hexdigest(), 'files': files}
+        previous = self.previous_hashes.get(page)
+        if previous != self.page_hashes[page] or not all(self.archive.has_previous(f) for f in files):
+            return False
+        for rel_path in files:
+            self._write_text(rel_path, None)
+        self.pages_reused += 1
+        return True
+
     def _write_css(self):
-        (self.output_dir / 'styles.css').write_text(CSS)
-
-    def _create_sidebar(self):
-        sidebar = '<div class="side-menu">\n'
-        sidebar += '  <a href="index.html">Home</a>\n'
-        sidebar += '  <a href="phenotype_summary.html">Phenotype Summary</a>\n'
-        sidebar += "  <a href=\"#\" onclick=\"toggleSubmenu('results-filter-submenu')\">Results Filter</a>\n"
-        sidebar += '  <div id="results-filter-submenu" class="submenu">\n'
-        for pheno in self.all_phenos:
-            sidebar += '    <div class="cohort-group">\n'
-            sidebar += f"      <a href=\"#\" onclick=\"toggleSubCohorts('{pheno}')\">{pheno}</a>\n"
-            sidebar += f'      <div id="{pheno}-subcohorts" class="subcohorts" style="display: none;">\n'
-            for cohort in self.cohort_list:
-                sidebar += f'        <a href="{pheno}.{cohort}.html" class="subcohort-link">{cohort}</a>\n'
-            sidebar += '      </div>\n'
-            sidebar += '    </div>\n'
-        sidebar += '  </div>\n'
-        sidebar += '  <a href="method_summary.html">Analysis Logs</a>\n'
-        sidebar += '</div>\n'
-        return sidebar
+        self._write_text('styles.css', CSS)
+
+    def _write_scripts(self):
+        """Write the page script and the navigation tree once; every page links to both."""
+        self._write_text('report.js', JS)
+        nav = {'phenos': self.all_phenos, 'cohorts': self.cohort_list, 'performance': self.trace_df is not None,
+               'search_prefix': SEARCH_PREFIX_LENGTH if self.top_hits_by_combo else None}
+        self._write_text('nav.js', f'const REPORT_NAV = {json.dumps(nav)};\n')
 
     def _page_template(self, content, title="PLINK 2.0 Results Report"):
+        if self.smoke_test:
+            title = f'SMOKE TEST - {title}'
+            content = (
+                '        <div class="smoke-banner">SMOKE TEST: variant/sample subsample only. '
+                'These are not real results.</div>\n'
+                + content
+            )
         return (
             '<!DOCTYPE html>\n<html lang="en">\n<head>\n'
             '    <meta charset="UTF-8">\n'
@@ -436,12 +979,13 @@ class PlinkReportGenerator:
             '</head>\n<body>\n'
             '    <div class="menu-toggle" onclick="toggleMenu()">'
             '<span></span><span></span><span></span></div>\n'
-            + self._create_sidebar()
+            + '    <div class="side-menu"></div>\n'
             + '    <div class="container">\n'
             f'        <h1>{title}</h1>\n'
             + content
             + '    </div>\n'
-            '<script>\n' + JS + '\n</script>\n'
+            '<script src="nav.js"></script>\n'
+            '<script src="report.js"></script>\n'
             '</body>\n</html>\n'
         )
 
@@ -449,10 +993,11 @@ class PlinkReportGenerator:
         """Render a DataFrame as an HTML table string."""
         headers = df.columns.tolist()
         header_html = ''.join(f'<th>{h}</th>' for h in headers)
-        rows_html = ''.join(
-            '<tr>' + ''.join(f'<td>{row[c]}</td>' for c in headers) + '</tr>\n'
-            for _, row in df.iterrows()
-        )
+        # Build each row's cells column by column with vectorized string concatenation
+        rows = pd.Series('<tr>', index=range(len(df)), dtype=object)
+        for i in range(len(headers)):
+            rows += '<td>' + df.iloc[:, i].map(str).to_numpy(dtype=object) + '</td>'
+        rows_html = ''.join(rows + '</tr>\n')
         return (
             f'<div class="table-container"><table id="{table_id}">'
             f'<thead><tr>{header_html}</tr></thead>'
@@ -460,6 +1005,28 @@ class PlinkReportGenerator:
             '</table></div>\n'
         )
 
+    def _lazy_table_html(self, df, shard_name):
+        """
+        Write df to a data/<shard_name>.js shard and return a results table that inlines
+        only its first INLINE_TABLE_ROWS rows; the page script loads the shard on demand.
+        """
+        shard_rel = f'data/{shard_name}.js'
+        table_json = df.to_json(orient='split', index=False, double_precision=15)
+        self._write_text(shard_rel, f'plinkReportData({table_json});\n')
+
+        first_rows = json.loads(df.head(INLINE_TABLE_ROWS).to_json(orient='split', index=False, double_precision=15))
+        inline = json.dumps({'total': len(df), **first_rows}, separators=(',', ':')).replace('</', '<\\/')
+        header_html = ''.join(
+            f'<th class="sortable" onclick="sortResultsTable({i})">{h}</th>' for i, h in enumerate(df.columns)
+        )
+        return (
+            '<input type="search" class="table-filter" placeholder="Filter rows..." '
+            'oninput="filterResultsTable(this.value)">\n'
+            f'<div class="table-container"><table id="results-table" data-shard="{shard_rel}">'
+            f'<thead><tr>{header_html}</tr></thead><tbody></tbody></table></div>\n'
+            f'<script type="application/json" id="results-data">{inline}</script>\n'
+        )
+
     def _pagination_controls(self):
         return (
             '<div class="pagination-controls">'
@@ -493,9 +1060,7 @@ class PlinkReportGenerator:
             </ul>
         </div>
         """
-        (self.output_dir / 'index.html').write_text(
-            self._page_template(content, 'PLINK 2.0 Results Report')
-        )
+        self._write_text('index.html', self._page_template(content, 'PLINK 2.0 Results Report'))
         print("  index.html")
 
     def generate_phenotype_summary(self):
@@ -506,9 +1071,7 @@ class PlinkReportGenerator:
         plot_sections = ''
         for pheno, plots in self.manifest.get('pheno_summary_plots', {}).items():
             imgs = ''.join(
-                f'<div class="plot-wrapper">'
-                f'<img src="{self._plot_rel_path(p)}" alt="{pheno} summary plot" '
-                f'class="plot-image" onclick="toggleImageSize(this)"></div>\n'
+                f'<div class="plot-wrapper">{self._plot_img(p, f"{pheno} summary plot")}</div>\n'
                 for p in plots
             )
             plot_sections += (
@@ -522,13 +1085,20 @@ class PlinkReportGenerator:
             + '<h2>Phenotype Distribution Plots</h2>\n'
             + (plot_sections if plot_sections else '<p>No phenotype summary plots found.</p>')
         )
-        (self.output_dir / 'phenotype_summary.html').write_text(
-            self._page_template(content, 'Phenotype Summary')
-        )
+        self._write_text('phenotype_summary.html', self._page_template(content, 'Phenotype Summary'))
         print("  phenotype_summary.html")
 
     def generate_cohort_pheno_page(self, cohort, pheno):
         gwas_plots = self.manifest['gwas_plots'].get(cohort, {}).get(pheno, {})
+        df = self.top_hits_by_combo.get((cohort, pheno), pd.DataFrame())
+
+        # The page depends on its top hits rows and on which plots (and thumbnails) it links
+        page = f'{pheno}.{cohort}.html'
+        files = [page] if df.empty else [page, f'data/{pheno}.{cohort}.js']
+        rows_hash = pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()
+        plot_names = {k: [Path(v).name, str(v) in self.thumbnails] for k, v in gwas_plots.items()}
+        if self._page_inputs_unchanged(page, files, self.smoke_test, list(df.columns), rows_hash, plot_names):
+            return
 
         # Plot section
         plot_content = ''
@@ -546,25 +1116,16 @@ class PlinkReportGenerator:
                 if src:
                     plot_content += (
                         f'<div class="plot-wrapper" data-plot-type="{pt_type}" style="display: {display}">'
-                        f'<img src="{self._plot_rel_path(src)}" alt="{cohort} {pheno} {pt_type}" '
-                        f'class="plot-image" onclick="toggleImageSize(this)"></div>\n'
+                        f'{self._plot_img(src, f"{cohort} {pheno} {pt_type}")}</div>\n'
                     )
             plot_content += '</div>\n'
 
         # Top hits table
-        if 'COHORT' in self.top_hits_df.columns and 'PHENO' in self.top_hits_df.columns:
-            df = self.top_hits_df[
-                (self.top_hits_df['COHORT'] == cohort) &
-                (self.top_hits_df['PHENO'] == pheno)
-            ]
-        else:
-            df = pd.DataFrame()
-
         if df.empty:
             table_html = '<div class="table-container"><p>No significant hits found above the p-value threshold.</p></div>\n'
             pagination = ''
         else:
-            table_html = self._df_to_html_table(df)
+            table_html = self._lazy_table_html(df, f'{pheno}.{cohort}')
             pagination = self._pagination_controls()
 
         content = (
@@ -574,9 +1135,8 @@ class PlinkReportGenerator:
             + table_html
             + pagination
         )
-        (self.output_dir / f'{pheno}.{cohort}.html').write_text(
-            self._page_template(content, f'PLINK Results - {pheno} in {cohort}')
-        )
+        self._write_text(f'{pheno}.{cohort}.html',
+                         self._page_template(content, f'PLINK Results - {pheno} in {cohort}'))
         print(f"  {pheno}.{cohort}.html")
 
     def generate_method_summary(self):
@@ -612,53 +1172,198 @@ class PlinkReportGenerator:
             '<div id="method-summary">'
             '<h2>PLINK 2.0 Methods Summary</h2>'
             + body
+            + self._glm_log_section()
             + '</div>\n'
         )
-        (self.output_dir / 'method_summary.html').write_text(
-            self._page_template(content, 'Analysis Logs')
-        )
+        self._write_text('method_summary.html', self._page_template(content, 'Analysis Logs'))
         print("  method_summary.html")
 
-    def _copy_assets(self):
-        # Collect all plot source paths from manifest
-        all_plot_sources = set()
-        for plots in self.manifest.get('pheno_summary_plots', {}).values():
-            all_plot_sources.update(plots)
-        for cohort_plots in self.manifest.get('gwas_plots', {}).values():
-            for pheno_plots in cohort_plots.values():
-                all_plot_sources.update(pheno_plots.values())
+    def generate_cohort_pheno_pages(self):
+        global _PAGE_GENERATOR
+        combos = [(cohort, pheno) for pheno in self.all_phenos for cohort in self.cohort_list]
+        if self.workers == 1 or len(combos) < 2 * self.workers or 'fork' not in multiprocessing.get_all_start_methods():
+            for cohort, pheno in combos:
+                self.generate_cohort_pheno_page(cohort, pheno)
+            return
+
+        # Forked workers inherit the loaded tables; each one writes a contiguous chunk of pages
+        _PAGE_GENERATOR = self
+        chunk_size = -(-len(combos) // (self.workers * 4))
+        chunks = [combos[i:i + chunk_size] for i in range(0, len(combos), chunk_size)]
+        try:
+            with ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork')) as pool:
+                for pages, page_hashes in pool.map(_write_cohort_pheno_pages, chunks):
+                    for rel_path, text in pages:
+                        self._write_text(rel_path, text)
+                        self.pages_reused += text is None and rel_path.endswith('.html')
+                    self.page_hashes.update(page_hashes)
+        finally:
+            _PAGE_GENERATOR = None
+
+    def generate_search_index(self):
+        """
+        Write the top hits search index: search/meta.js lists the cohort x phenotype pages, and
+        search/<prefix>.js maps each gene, RSID and variant ID starting with <prefix> to its
+        [page, row in the page's data shard, p-value] hits.
+        """
+        if not self.top_hits_by_combo:
+            return 0
+        pages = list(self.top_hits_by_combo)
+        groups = self.top_hits_df.groupby(['COHORT', 'PHENO'], sort=False)
+        located = pd.DataFrame({
+            'page': groups.ngroup(),
+            'row': groups.cumcount(),
+            'p': (pd.to_numeric(self.top_hits_df[self.p_col], errors='coerce')
+                  if self.p_col in self.top_hits_df.columns else float('nan')),
+        })
+        located = located[located['page'] >= 0]
+
+        terms = []
+        for col in ['Gene', 'RSID', self.id_col]:
+            if col not in self.top_hits_df.columns:
+                continue
+            labels = self.top_hits_df.loc[located.index, col].dropna().astype(str)
+            if col == 'Gene':
+                labels = labels.str.split(SEARCH_GENE_SEPARATORS, regex=True).explode()
+            labels = labels.str.strip()
+            labels = labels[(labels != '') & ~labels.isin(['nan', 'NA', 'None', '.'])]
+            terms.append(located.loc[labels.index].assign(label=labels.to_numpy()))
+        if not terms:
+            return 0
+
+        terms = pd.concat(terms, ignore_index=True)
+        terms['term'] = terms['label'].str.lower()
+        terms = terms.drop_duplicates(['term', 'page', 'row']).sort_values(['term', 'p'], na_position='last')
+        terms['shard'] = terms['term'].str[:SEARCH_PREFIX_LENGTH]
+
+        for prefix, shard in terms.groupby('shard', sort=False):
+            entries = {}
+            for term, label, page, row, p in shard[['term', 'label', 'page', 'row', 'p']].itertuples(index=False):
+                entries.setdefault(term, [label, []])[1].append([page, row, None if pd.isna(p) else p])
+            self._write_text(f'search/{_search_shard_name(prefix)}.js',
+                             f'plinkSearchShard({json.dumps(prefix)}, {json.dumps(entries, separators=(",", ":"))});\n')
+        self._write_text('search/meta.js', f'plinkSearchMeta({json.dumps({"pages": [[ph, c] for c, ph in pages]})});\n')
+        print(f"  search index: {terms['term'].nunique()} terms in {terms['shard'].nunique()} shards")
+        return terms['term'].nunique()
+
+    def _glm_log_section(self):
+        """Per cohort x phenotype roll-up of the plink2 log metrics, with the full table in the zip."""
+        if self.glm_log_df is None or self.glm_log_df.empty:
+            return ''
+        logs = self.glm_log_df
+        # The Firth re-test only covers a subset of variants, so it doesn't count toward variants tested
+        main_pass = logs[logs['STEP'] != 'firth'].assign(
+            QC_REMOVED=lambda df: df[['GENO_REMOVED', 'HWE_REMOVED', 'MAF_REMOVED']].sum(axis=1)
+        )
+        per_combo = main_pass.groupby(['COHORT', 'PHENO']).agg(
+            CHROMOSOMES=('CHROM', 'nunique'),
+            SAMPLES=('SAMPLES_AFTER_FILTERS', 'max'),
+            PHENO_MISSING=('PHENO_MISSING', 'max'),
+            VARIANTS_LOADED=('VARIANTS_LOADED', 'sum'),
+            QC_REMOVED=('QC_REMOVED', 'sum'),
+            VARIANTS_TESTED=('VARIANTS_TESTED', 'sum'),
+            WARNINGS=('WARNINGS', 'sum'),
+            ELAPSED_MIN=('ELAPSED_S', 'sum'),
+        )
+        per_combo['ELAPSED_MIN'] /= 60
+        slowest = main_pass.loc[main_pass.groupby(['COHORT', 'PHENO'])['ELAPSED_S'].idxmax().dropna()] \
+                           .set_index(['COHORT', 'PHENO'])
+        per_combo['SLOWEST_CHROM'] = slowest['CHROM']
+        per_combo['SLOWEST_CHROM_MIN'] = slowest['ELAPSED_S'] / 60
+        return (
+            '<h3>GLM Task Log Metrics</h3>'
+            '<p>Summed over chromosomes from the plink2 log of each GLM task. '
+            'Per-task figures are in <code>plink2_glm_log_metrics.csv</code>.</p>\n'
+            + self._df_to_html_table(per_combo.reset_index().round(2).fillna('—'), table_id='glm-log-table')
+        )
+
+    def generate_performance_page(self):
+        trace = self.trace_df
+
+        def fmt_table(df, table_id):
+            if df.empty:
+                return '<div class="table-container"><p>None recorded.</p></div>\n'
+            return self._df_to_html_table(df.round(2).fillna('—'), table_id=table_id)
+
+        totals = ''.join(
+            f'<tr><td><b>{k}</b></td><td>{v}</td></tr>\n'
+            for k, v in nextflow_trace.run_totals(trace).items()
+        )
+        note = ''
+        if trace['requested_mem_bytes'].isna().all():
+            note = (
+                '<p>Requested memory is not in this trace, so efficiency ratios are blank. '
+                f'Set <code>trace.fields = \'{nextflow_trace.RECOMMENDED_TRACE_FIELDS}\'</code> '
+                'in nextflow.config to record it.</p>\n'
+            )
+
+        content = (
+            '<div id="performance">'
+            '<h2>Run Totals</h2>'
+            '<div class="table-container"><table>'
+            '<thead><tr><th>Measure</th><th>Value</th></tr></thead>'
+            f'<tbody>{totals}</tbody></table></div>\n'
+            + note
+            + '<h2>Resources per Process</h2>\n'
+            '<p>Memory efficiency is peak RSS &times; run time over requested memory &times; run time, '
+            'summed over the process\'s tasks.</p>\n'
+            + fmt_table(nextflow_trace.process_summary(trace), 'process-summary-table')
+            + '<h2>Out-of-Memory Retries</h2>\n'
+            f'<p>Task attempts ending with exit codes {", ".join(map(str, nextflow_trace.OOM_EXIT_CODES))}.</p>\n'
+            + fmt_table(nextflow_trace.oom_retries(trace), 'oom-table')
+            + '<h2>Critical Path per Cohort and Phenotype</h2>\n'
+            '<p>Sum over pipeline stages of the longest task in each stage; '
+            'cohort set-up stages count toward every phenotype of the cohort.</p>\n'
+            + fmt_table(nextflow_trace.critical_paths(trace), 'critical-path-table')
+            + '<h2>Slowest Tasks</h2>\n'
+            + fmt_table(nextflow_trace.slowest_tasks(trace), 'slowest-table')
+            + '</div>\n'
+        )
+        self._write_text('performance.html', self._page_template(content, 'Pipeline Performance'))
+        print("  performance.html")
 
-        for src in all_plot_sources:
+    def _copy_assets(self):
+        for src in self._plot_sources():
             src_path = Path(src)
             if src_path.exists():
-                shutil.copy(src_path, self.output_dir / 'Plots' / src_path.name)
+                self.archive.add_file(self._plot_rel_path(src_path), src_path)
             else:
                 print(f"  Warning: plot not found: {src}")
+            if src in self.thumbnails:
+                self.archive.add_file(self._thumbnail_rel_path(src_path), self.thumbnails[src])
 
-        shutil.copy(self.manifest['top_hits_csv'],
-                    self.output_dir / 'plink2_all_suggestive.csv')
-        shutil.copy(self.manifest['pheno_summaries_csv'],
-                    self.output_dir / 'pheno_summaries.csv')
-
-    def _create_zip(self):
-        with zipfile.ZipFile(self.output_zip, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for file_path in self.output_dir.rglob('*'):
-                if file_path.is_file():
-                    arcname = file_path.relative_to(self.output_dir.parent)
-                    zf.write(file_path, arcname)
-        print(f"Report written to {self.output_zip}")
+        self.archive.add_file('plink2_all_suggestive.csv', self.manifest['top_hits_csv'])
+        self.archive.add_file('pheno_summaries.csv', self.manifest['pheno_summaries_csv'])
+        if self.glm_log_df is not None:
+            self.archive.add_file('plink2_glm_log_metrics.csv', self.manifest['glm_log_metrics_csv'])
 
     def generate_all(self):
         print("Generating PLINK 2.0 report...")
-        self._write_css()
-        self.generate_index_page()
-        self.generate_phenotype_summary()
-        for pheno in self.all_phenos:
-            for cohort in self.cohort_list:
-                self.generate_cohort_pheno_page(cohort, pheno)
-        self.generate_method_summary()
-        self._copy_assets()
-        self._create_zip()
+        with self.metrics.phase('thumbnails') as m:
+            self.make_thumbnails()
+            m['rows'] = len(self.thumbnails)
+        previous_zip = self._load_previous_hashes()
+        self.archive = ReportArchive(self.output_zip, self.report_name, self.output_dir, previous_zip)
+        with self.metrics.phase('transform') as m:
+            self._write_css()
+            self._write_scripts()
+            self.generate_index_page()
+            self.generate_phenotype_summary()
+            self.generate_cohort_pheno_pages()
+            m['search_terms'] = self.generate_search_index()
+            self.generate_method_summary()
+            if self.trace_df is not None:
+                self.generate_performance_page()
+            self._write_text(HASH_MANIFEST, json.dumps({'pages': self.page_hashes}, indent=1))
+            m['pages'] = sum(name.endswith('.html') for name in self.archive.names)
+            m['pages_reused'] = self.pages_reused
+            if self.previous_zip is not None:
+                print(f"  {self.pages_reused} of {len(self.page_hashes)} results pages unchanged")
+        with self.metrics.phase('write') as m:
+            self._copy_assets()
+            self.archive.close()
+            m['bytes_written'] = file_bytes(self.output_zip)
+        print(f"Report written to {self.output_zip}")
         print("Done.")
 
 
@@ -670,9 +1375,24 @@ def main():
                         help='Path to results_manifest.json')
     parser.add_argument('--output_zip', default='Plink_2.0_GWAS_Report.zip',
                         help='Output zip file path (default: Plink_2.0_GWAS_Report.zip)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Processes writing the per cohort x phenotype pages (default: all CPUs)')
+    parser.add_argument('--no_report_dir', action='store_true',
+                        help='Write pages and assets straight into the zip without keeping the unzipped report folder')
+    parser.add_argument('--cache_dir', default='.report_cache',
+                        help='Directory for cached plot thumbnails, reused across runs (default: .report_cache)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Reuse results pages whose inputs are unchanged from the existing --output_zip')
+    parser.add_argument('--previous_zip', default=None,
+                        help='Earlier report zip to reuse unchanged pages from (implies --incremental)')
+    parser.add_argument('--trace', default=None,
+                        help='Optional Nextflow trace file (-with-trace) for a Pipeline Performance page')
     args = parser.parse_args()
 
-    generator = PlinkReportGenerator(args.manifest, args.output_zip)
+    previous_zip = args.previous_zip or (args.output_zip if args.incremental else None)
+    generator = PlinkReportGenerator(args.manifest, args.output_zip, args.trace, args.workers,
+                                     keep_report_dir=not args.no_report_dir, cache_dir=args.cache_dir,
+                                     previous_zip=previous_zip)
     generator.generate_all()
 
 
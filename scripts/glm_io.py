@@ -0,0 +1,81 @@
+import io
+import os
+import subprocess
+import pandas as pd
+
+
+class CountingReader(io.RawIOBase):
+    """Binary stream wrapper that counts the (decompressed) bytes read through it."""
+
+    def __init__(self, raw, proc=None):
+        self.raw = raw
+        self.proc = proc
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.raw.read(len(buffer))
+        n = len(data)
+        buffer[:n] = data
+        self.bytes_read += n
+        if n == 0 and self.proc is not None:
+            # End of the decompressor's output: only a clean exit means the file was read in full
+            returncode = self.proc.wait()
+            if returncode != 0:
+                raise OSError(f'{" ".join(self.proc.args)} exited with status {returncode}; '
+                              f'output is truncated or corrupt')
+        return n
+
+    def close(self):
+        self.raw.close()
+        if self.proc is not None and self.proc.poll() is None:
+            # Closed before the end of the output (e.g. nrows); stop the decompressor rather than wait on it
+            self.proc.kill()
+            self.proc.wait()
+        super().close()
+
+
+def open_glm_output(path):
+    """
+    Opens a plink2 GLM output for streaming, decompressing .zst output (--glm zs) on the fly.
+
+    Uses the zstandard module when it is installed and falls back to the zstd command line tool.
+
+    Args:
+        path (str): plink2 .glm.* output, optionally ending in .zst
+
+    Returns:
+        CountingReader: binary stream of the uncompressed text; with the zstd tool, reaching
+            the end of the stream raises OSError if zstd exited with an error
+    """
+    path = str(path)
+    if not path.endswith('.zst'):
+        return CountingReader(open(path, 'rb'))
+
+    try:
+        import zstandard
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    except ImportError:
+        proc = subprocess.Popen(['zstd', '-dc', path], stdout=subprocess.PIPE)
+        return CountingReader(proc.stdout, proc)
+    return CountingReader(raw)
+
+
+def read_glm_output(path, **kwargs):
+    """
+    Reads a (possibly zstd-compressed) plink2 GLM output into a DataFrame.
+
+    Returns:
+        tuple: (DataFrame, size on disk in bytes, uncompressed bytes parsed)
+    """
+    with open_glm_output(path) as stream:
+        df = pd.read_table(io.BufferedReader(stream, buffer_size=1 << 20), **kwargs)
+        return df, os.path.getsize(path), stream.bytes_read
+
+
+def glm_output_name(path):
+    """File name of a GLM output with any .zst suffix removed."""
+    name = os.path.basename(str(path))
+    return name[:-len('.zst')] if name.endswith('.zst') else name
@@ -0,0 +1,128 @@
+import os
+import sys
+import gzip
+import json
+import shutil
+import hashlib
+import tempfile
+import argparse
+from pathlib import Path
+
+# Bump when the key recipe changes so old entries are never matched by mistake
+CACHE_KEY_VERSION = 2
+
+
+def make_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="Content-addressed cache for plink2 GLM task outputs, keyed on the inputs each task actually uses."
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    key = subparsers.add_parser('key', help='Print the cache key for a GLM task')
+    key.add_argument('--plink_files', nargs='+', required=True,
+                     help='Genotype fileset (identified by path, size and modification time)')
+    key.add_argument('--samples', required=True, help='--keep sample list')
+    key.add_argument('--pheno_file', required=True, help='Slim ID + phenotype file passed to plink2 --pheno')
+    key.add_argument('--covar_file', required=True, help='Slim covariate file passed to plink2 --covar')
+    key.add_argument('--pheno', required=True, help='Phenotype column tested')
+    key.add_argument('--covars', nargs='*', default=[], help='Covariate columns used in the model')
+    key.add_argument('--glm_args', required=True, help='GLM modifiers and QC options passed to plink2')
+    key.add_argument('--plink2_version', required=True, help='Output of plink2 --version')
+    key.add_argument('--extra_files', nargs='*', default=[], help='Other small inputs hashed by content')
+    key.add_argument('--outputs', nargs='+', required=True, help='Output file names produced by the task')
+
+    for name, help_text in [('restore', 'Copy cached outputs into the working directory'),
+                            ('store', 'Save task outputs into the cache')]:
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('--cache_dir', required=True, help='Persistent cache directory')
+        sub.add_argument('--key', required=True, help='Cache key from the key command')
+        sub.add_argument('--outputs', nargs='+', required=True, help='Output file names')
+
+    return parser
+
+
+def file_identity(path):
+    """Identify a (possibly huge) file by its resolved path, size and modification time."""
+    real_path = os.path.realpath(path)
+    stat = os.stat(real_path)
+    return f'{real_path}:{stat.st_size}:{stat.st_mtime_ns}'
+
+
+def file_digest(path):
+    """Hash a small input by content; gzipped files are hashed decompressed so gzip headers don't matter."""
+    h = hashlib.sha256()
+    opener = gzip.open if str(path).endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def compute_key(args):
+    key_inputs = {
+        'version': CACHE_KEY_VERSION,
+        'genotypes': sorted(file_identity(f) for f in args.plink_files),
+        'samples': file_digest(args.samples),
+        'pheno': args.pheno,
+        'covars': args.covars,
+        'pheno_file': file_digest(args.pheno_file),
+        'covar_file': file_digest(args.covar_file),
+        'glm_args': ' '.join(args.glm_args.split()),
+        'plink2_version': args.plink2_version.strip(),
+        'extra_files': [file_digest(f) for f in args.extra_files],
+        'outputs': args.outputs,
+    }
+    key = hashlib.sha256(json.dumps(key_inputs, sort_keys=True).encode()).hexdigest()
+    return key, key_inputs
+
+
+def entry_dir(cache_dir, key):
+    return Path(cache_dir) / key[:2] / key
+
+
+def restore(args):
+    entry = entry_dir(args.cache_dir, args.key)
+    if not all((entry / name).exists() for name in args.outputs):
+        print(f'GLM cache miss: {args.key}', file=sys.stderr)
+        return 1
+    for name in args.outputs:
+        shutil.copyfile(entry / name, name)
+    print(f'GLM cache hit: {args.key}', file=sys.stderr)
+    return 0
+
+
+def store(args):
+    entry = entry_dir(args.cache_dir, args.key)
+    if entry.exists():
+        return 0
+    entry.parent.mkdir(parents=True, exist_ok=True)
+
+    # Fill a scratch directory next to the entry, then rename it into place so
+    # concurrent tasks never see a half-written entry
+    scratch = Path(tempfile.mkdtemp(prefix=f'.{args.key}.', dir=entry.parent))
+    os.chmod(scratch, 0o755)
+    for name in args.outputs:
+        shutil.copyfile(name, scratch / Path(name).name)
+    try:
+        os.rename(scratch, entry)
+    except OSError:
+        # Another task stored the same key first
+        shutil.rmtree(scratch, ignore_errors=True)
+    return 0
+
+
+def main():
+    args = make_arg_parser().parse_args()
+
+    if args.command == 'key':
+        key, key_inputs = compute_key(args)
+        print(json.dumps(key_inputs, indent=2), file=sys.stderr)
+        print(key)
+        return 0
+    if args.command == 'restore':
+        return restore(args)
+    return store(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,38 @@
+import argparse as ap
+from glm_io import read_glm_output
+
+
+def make_arg_parser():
+    parser = ap.ArgumentParser(
+        description="Select variants from a first-pass logistic GWAS to re-test with Firth regression."
+    )
+    parser.add_argument('-s', '--sumstats', required=True,
+                        help='First-pass plink2 .glm.logistic(.zst) output (no Firth)')
+    parser.add_argument('-p', '--pvalue', type=float, default=1E-3,
+                        help='Re-test variants with a first-pass P below this threshold')
+    parser.add_argument('-o', '--output', required=True,
+                        help='Output variant ID list for plink2 --extract')
+    return parser
+
+
+def main():
+    args = make_arg_parser().parse_args()
+
+    first_pass, _, _ = read_glm_output(args.sumstats, usecols=lambda c: c in {'ID', 'P', 'ERRCODE'},
+                                       dtype={'ID': str})
+
+    # Variants worth a second look: small P, or no usable P at all
+    retest = (first_pass['P'] < args.pvalue) | first_pass['P'].isna()
+
+    # plink2 flags unstable fits (separation, convergence failure, etc.) in ERRCODE
+    if 'ERRCODE' in first_pass.columns:
+        retest |= first_pass['ERRCODE'].astype(str) != '.'
+
+    retest_ids = first_pass.loc[retest, 'ID'].drop_duplicates()
+    retest_ids.to_csv(args.output, index=False, header=False)
+
+    print(f"{len(retest_ids)} of {len(first_pass)} variants selected for Firth re-test")
+
+
+if __name__ == '__main__':
+    main()
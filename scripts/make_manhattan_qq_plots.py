@@ -4,6 +4,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import argparse as ap
 import os
+from pipeline_metrics import PipelineMetrics, file_bytes
 
 
 def make_arg_parser():
@@ -42,6 +43,7 @@ pheno, cohort = args.phenotype, args.cohort
 # pheno_table = args.phenoTable # only used for trait cardinality for plot
 sumstats_file = args.sumstats
 annot_file = args.annot
+metrics = PipelineMetrics(__file__, cohort=cohort, pheno=pheno)
 
 
 output_manhattan = f'{output_dir}/{cohort}.{pheno}.manhattan.png'
@@ -53,39 +55,46 @@ output_qq = f'{output_dir}/{cohort}.{pheno}.qq.png'
 # Instantiate manhattan plot object
 plot_title = f'Plink2 GWAS Manhattan for {cohort}: {pheno.replace("_", " ")}'
 mp = ManhattanPlot(sumstats_file, title=plot_title)
-mp.load_data()
-# clean data, use parameter map function
-plink2_col_map = make_column_name_map_dict(args.colnames)
+with metrics.phase('read') as m:
+    mp.load_data()
+    m['bytes_read'] = file_bytes(sumstats_file, annot_file)
 
-map_keys = [k for k in ['#CHROM', 'POS', 'ID', 'P'] if k in plink2_col_map.keys()]
-neat_col_map = {plink2_col_map[k]: k for k in map_keys}
+with metrics.phase('transform') as m:
+    # clean data, use parameter map function
+    plink2_col_map = make_column_name_map_dict(args.colnames)
 
-mp.clean_data(col_map=neat_col_map)
+    map_keys = [k for k in ['#CHROM', 'POS', 'ID', 'P'] if k in plink2_col_map.keys()]
+    neat_col_map = {plink2_col_map[k]: k for k in map_keys}
 
-# add conditional adventure for annotations
-if annot_file is not None:
-    annot_df = pd.read_csv(annot_file)
-    annot_df['ID'] = annot_df['Gene']
-    mp.add_annotations(annot_df, extra_cols=['RSID'])
+    mp.clean_data(col_map=neat_col_map)
 
-mp.get_thinned_data()
-# mp.thinned = mp.thinned.dropna(subset='P')
-if ~np.any(mp.thinned['P'] < 5E-8):
-    p_thresh = np.nanquantile(mp.thinned['P'], 10 / len(mp.thinned))
-else:
-		p_thresh = 5E-8
+    # add conditional adventure for annotations
+    if annot_file is not None:
+        annot_df = pd.read_csv(annot_file)
+        annot_df['ID'] = annot_df['Gene']
+        mp.add_annotations(annot_df, extra_cols=['RSID'])
+
+    mp.get_thinned_data()
+    # mp.thinned = mp.thinned.dropna(subset='P')
+    if ~np.any(mp.thinned['P'] < 5E-8):
+        p_thresh = np.nanquantile(mp.thinned['P'], 10 / len(mp.thinned))
+    else:
+        p_thresh = 5E-8
+    m['rows'] = len(mp.thinned)
 
 mp.update_plotting_parameters(vertical=True,sig=p_thresh,sug=p_thresh,annot_thresh=p_thresh,merge_genes=True)
 
 
-# mp.update_plotting_parameters(vertical=True, merge_genes=True)
-# mp.full_plot(save=output_manhattan,rep_genes=known_genes,rep_boost=True)
-mp.full_plot(save=output_manhattan,rep_boost=True)
+with metrics.phase('plot') as m:
+    # mp.update_plotting_parameters(vertical=True, merge_genes=True)
+    # mp.full_plot(save=output_manhattan,rep_genes=known_genes,rep_boost=True)
+    mp.full_plot(save=output_manhattan,rep_boost=True)
 
-# close fig and save
-plt.clf()
-print(f"Saved Manhattan plot to: {output_manhattan}")
+    # close fig and save
+    plt.clf()
+    print(f"Saved Manhattan plot to: {output_manhattan}")
 
-# mp.qq_plot
-mp.qq_plot(save=output_qq)
-print(f"Saved qq plot to: {output_qq}")
+    # mp.qq_plot
+    mp.qq_plot(save=output_qq)
+    print(f"Saved qq plot to: {output_qq}")
+    m['bytes_written'] = file_bytes(output_manhattan, output_qq)
@@ -1,6 +1,7 @@
 import pandas as pd
 import argparse as ap
 import os
+from pipeline_metrics import PipelineMetrics, file_bytes
 
 def make_arg_parser():
     parser = ap.ArgumentParser(description=".")
@@ -35,14 +36,18 @@ plink_fam = args.plinkFam
 output_dir = args.outDir
 id_col = args.id
 remove = args.remove
+metrics = PipelineMetrics(__file__)
 
+metrics.start('read')
 plink_fam = pd.read_table(plink_fam, header=None, comment='#', index_col=1, sep=r'\s+', dtype={0: str, 1: str})
 
 pheno_info = []
 
 data = pd.read_csv(args.data, index_col=id_col, dtype={id_col: str})
 sample_table = pd.read_csv(args.samples, index_col=id_col, dtype={id_col: str})
+metrics.stop(rows=len(data), bytes_read=file_bytes(args.plinkFam, args.data, args.samples, remove))
 
+metrics.start('transform')
 for c in cohorts:
     samples = sample_table.index[sample_table[c] == 1]
 
@@ -85,6 +90,7 @@ for c in cohorts:
         quant_pheno_info = quant_pheno_info.reset_index()
         quant_pheno_info['COHORT'] = c
         pheno_info.append(quant_pheno_info)
+metrics.stop(rows=sum(len(info) for info in pheno_info))
 
 if pheno_info:
     pheno_info = pd.concat(pheno_info).reset_index(drop=True)
@@ -98,7 +104,9 @@ if pheno_info:
     else:
         outfile = f'pheno_summaries.csv'
     
+    metrics.start('write')
     pheno_info.to_csv(outfile, index=False)
+    metrics.stop(rows=len(pheno_info), bytes_written=file_bytes(outfile))
     print(f"\nOutput saved to: {outfile}")
     print(f"Final output shape: {pheno_info.shape}")
     print(f"Final output columns: {list(pheno_info.columns)}")
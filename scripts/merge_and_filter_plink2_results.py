@@ -1,5 +1,8 @@
 import pandas as pd
 import argparse as ap
+import os
+from glm_io import read_glm_output, glm_output_name
+from pipeline_metrics import PipelineMetrics, file_bytes
 
 def make_arg_parser():
     parser = ap.ArgumentParser(description=".")
@@ -10,9 +13,32 @@ def make_arg_parser():
     parser.add_argument('-p', '--pheno', help='Phenotype')
     parser.add_argument('--cohort', help='Cohort')
     parser.add_argument('--pvalue', help='P-value for filtering', type=float, default=1E-5)
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='Print the column map, each input file and the merged results table')
     
     return parser
 
+def splice_firth_results(first_pass, firth_dfs):
+    # Two-stage logistic mode: swap first-pass rows for their Firth re-test rows
+    # and record which method produced each row
+    first_pass['METHOD'] = 'logistic'
+    if len(firth_dfs) == 0:
+        return first_pass
+
+    firth = pd.concat(firth_dfs)
+    firth['METHOD'] = 'firth'
+
+    key_cols = ['#CHROM', 'POS', 'ID', 'REF', 'ALT']
+    retested = pd.MultiIndex.from_frame(firth[key_cols])
+    keep_first_pass = ~pd.MultiIndex.from_frame(first_pass[key_cols]).isin(retested)
+
+    # Restore the first-pass chromosome and position order
+    chrom_order = {c: i for i, c in enumerate(first_pass['#CHROM'].unique())}
+    spliced = pd.concat([first_pass[keep_first_pass], firth])
+    spliced['_chrom_order'] = spliced['#CHROM'].map(chrom_order)
+    spliced = spliced.sort_values(by=['_chrom_order', 'POS'], kind='stable')
+    return spliced.drop(columns='_chrom_order')
+
 args = make_arg_parser().parse_args()
 colnames_file = args.colnames
 input_files = args.sumstats
@@ -23,34 +49,73 @@ cohort = args.cohort
 
 merge_output = f'{cohort}.{pheno}.plink2.gz'
 filter_output = f'{cohort}.{pheno}.filtered.plink2.csv'
+sizes_output = f'{cohort}.{pheno}.glm_output_sizes.csv'
 
 colnames_rows = open(colnames_file).read().splitlines()
-print(colnames_rows)
 col_map = dict(zip([r.split('=')[0] for r in colnames_rows],
                    [r.split('=')[1] for r in colnames_rows]))
 
-print(col_map)
+if args.verbose:
+    print(col_map)
 
+metrics = PipelineMetrics(__file__, cohort=cohort, pheno=pheno)
+
+metrics.start('read')
 dfs = []
+firth_dfs = []
+two_stage = any(glm_output_name(f).endswith('.glm.firth') for f in input_files)
+compressed_bytes = 0
+uncompressed_bytes = 0
 
 for f in input_files:
-    print(f)
-    f_pheno = '.'.join(f.split('/')[-1].split('.')[:-3])
-    temp = pd.read_table(f)
+    if args.verbose:
+        print(f)
+    f_name = glm_output_name(f)
+    f_pheno = '.'.join(f_name.split('.')[:-3])
+    if f_name.endswith('.glm.firth'):
+        # Empty when no variant on that chromosome needed a Firth re-test
+        if os.path.getsize(f) > 0:
+            temp, on_disk, parsed = read_glm_output(f)
+            compressed_bytes += on_disk
+            uncompressed_bytes += parsed
+            temp['PHENO'] = f_pheno
+            firth_dfs.append(temp)
+        continue
+    temp, on_disk, parsed = read_glm_output(f)
+    compressed_bytes += on_disk
+    uncompressed_bytes += parsed
     temp['PHENO'] = f_pheno
     dfs.append(temp)
+metrics.stop(rows=sum(len(df) for df in dfs + firth_dfs), bytes_read=compressed_bytes,
+             uncompressed_bytes=uncompressed_bytes)
+
+# Record how much scratch space the compressed per-chromosome GLM outputs saved
+pd.DataFrame([{
+    'COHORT': cohort, 'PHENO': pheno, 'N_FILES': len(input_files),
+    'COMPRESSED_BYTES': compressed_bytes, 'UNCOMPRESSED_BYTES': uncompressed_bytes
+}]).to_csv(sizes_output, index=False)
+print(f'GLM outputs: {compressed_bytes:,} bytes on disk, {uncompressed_bytes:,} bytes uncompressed')
 
+metrics.start('transform')
 all = pd.concat(dfs)
-print(all)
+if two_stage:
+    all = splice_firth_results(all, firth_dfs)
 all['A2'] = all.apply(lambda x: x['REF'] if x['A1'] == x['ALT'] else x['ALT'], axis=1)
-print(all)
-print(all.columns)
+if args.verbose:
+    print(all)
+    print(all.columns)
 
 all = all.rename(columns=col_map)
+metrics.stop(rows=len(all))
+
+metrics.start('write')
 all.to_csv(merge_output, sep='\t', index=False, na_rep='NA')
+metrics.stop(rows=len(all), bytes_written=file_bytes(merge_output, sizes_output))
 
 
+metrics.start('filter')
 all_filtered = all[all[col_map['P']] <= p_thresh]
 all_filtered['COHORT'] = cohort
 all_filtered['PHENO'] = pheno
-all_filtered.to_csv(filter_output, index=False, na_rep='NA')
\ No newline at end of file
+all_filtered.to_csv(filter_output, index=False, na_rep='NA')
+metrics.stop(rows=len(all_filtered), bytes_written=file_bytes(filter_output))
\ No newline at end of file
@@ -0,0 +1,172 @@
+import csv
+import json
+import shutil
+import argparse
+from pathlib import Path
+from generate_plink_reports import PlinkReportGenerator
+
+# params sections that must agree across shards; run info, input paths and instrumentation may differ
+COMPATIBLE_SECTIONS = ['cohorts_phenotypes_chromosomes', 'covariates', 'plink_gwas_qc', 'output_parameters',
+                       'smoke_test']
+# Keys inside those sections that differ by design between phenotype batches
+PER_SHARD_KEYS = {'bin_pheno_list', 'quant_pheno_list', 'output_dir'}
+
+# Manifest entries naming a table, and the merged file written for each
+MERGED_TABLES = {
+    'top_hits_csv': 'plink2_all_suggestive.csv',
+    'pheno_summaries_csv': 'pheno_summaries.csv',
+    'glm_log_metrics_csv': 'plink2_glm_log_metrics.csv',
+}
+
+
+def make_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="Merge the manifests and tables of phenotype-sharded PLINK 2.0 GWAS runs into one HTML report."
+    )
+    parser.add_argument('-m', '--manifests', nargs='+', required=True,
+                        help='results_manifest.json of each run; relative paths inside resolve against its folder')
+    parser.add_argument('-d', '--merged_dir', default='merged_report_inputs',
+                        help='Directory for the merged tables and manifest (default: merged_report_inputs)')
+    parser.add_argument('--output_zip', default='Plink_2.0_GWAS_Report.zip',
+                        help='Output zip file path (default: Plink_2.0_GWAS_Report.zip)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Processes writing the per cohort x phenotype pages and thumbnails (default: 1)')
+    parser.add_argument('--no_report_dir', action='store_true',
+                        help='Write pages and assets straight into the zip without keeping the unzipped report folder')
+    parser.add_argument('--cache_dir', default='.report_cache',
+                        help='Directory for cached plot thumbnails, reused across runs (default: .report_cache)')
+    return parser
+
+
+def resolve(path, base_dir):
+    """Make a manifest path absolute, relative to the manifest's folder."""
+    return None if path is None else str((base_dir / path).resolve())
+
+
+def load_manifest(manifest_path):
+    """Read one shard's manifest with every file path made absolute, so plots are referenced in place."""
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    base_dir = Path(manifest_path).parent
+    for key in MERGED_TABLES:
+        manifest[key] = resolve(manifest.get(key), base_dir)
+    manifest['pheno_summary_plots'] = {
+        pheno: [resolve(p, base_dir) for p in plots] for pheno, plots in manifest.get('pheno_summary_plots', {}).items()
+    }
+    manifest['gwas_plots'] = {
+        cohort: {pheno: {t: resolve(p, base_dir) for t, p in plots.items()} for pheno, plots in phenos.items()}
+        for cohort, phenos in manifest.get('gwas_plots', {}).items()
+    }
+    manifest['plot_index'] = [{**e, 'path': resolve(e['path'], base_dir)} for e in manifest.get('plot_index', [])]
+    return manifest
+
+
+def check_compatible(manifests, manifest_paths):
+    """Raise ValueError if the shards were run with different cohorts or analysis settings, or share a phenotype."""
+    first = manifests[0]
+    for manifest, path in zip(manifests[1:], manifest_paths[1:]):
+        if manifest['cohort_list'] != first['cohort_list']:
+            raise ValueError(f'{path}: cohort_list {manifest["cohort_list"]} differs from {first["cohort_list"]}')
+        if manifest.get('smoke_test', False) != first.get('smoke_test', False):
+            raise ValueError(f'{path}: smoke_test differs from {manifest_paths[0]}')
+        for section in COMPATIBLE_SECTIONS:
+            ours, theirs = first['params'].get(section, {}), manifest['params'].get(section, {})
+            if not isinstance(ours, dict) or not isinstance(theirs, dict):
+                continue
+            differing = sorted(k for k in set(ours) | set(theirs)
+                               if k not in PER_SHARD_KEYS and ours.get(k) != theirs.get(k))
+            if differing:
+                raise ValueError(f'{path}: params.{section} differs from {manifest_paths[0]} in {differing}')
+
+    seen = {}
+    for manifest, path in zip(manifests, manifest_paths):
+        for pheno in manifest.get('bin_pheno_list', []) + manifest.get('quant_pheno_list', []):
+            if pheno in seen:
+                raise ValueError(f'Phenotype {pheno} is in both {seen[pheno]} and {path}')
+            seen[pheno] = path
+
+
+def merge_csvs(sources, output):
+    """
+    Concatenate CSVs in one streaming pass. Files with identical headers are copied through
+    unparsed; otherwise rows are written under the union of the headers, with blanks for missing columns.
+    """
+    headers = []
+    for src in sources:
+        with open(src, newline='') as f:
+            headers.append(next(csv.reader(f), []))
+    fieldnames = list(dict.fromkeys(col for header in headers for col in header))
+
+    with open(output, 'w', newline='') as out:
+        if all(header == fieldnames for header in headers):
+            out.write(','.join(fieldnames) + '\n')
+            for src in sources:
+                with open(src, newline='') as f:
+                    f.readline()
+                    shutil.copyfileobj(f, out, 1 << 20)
+            return
+        writer = csv.DictWriter(out, fieldnames=fieldnames, restval='')
+        writer.writeheader()
+        for src in sources:
+            with open(src, newline='') as f:
+                writer.writerows(csv.DictReader(f))
+
+
+def merge_manifests(manifests, merged_dir):
+    """One manifest covering every shard, with tables merged into merged_dir and plots left where they are."""
+    first = manifests[0]
+    merged = {
+        'cohort_list': first['cohort_list'],
+        'bin_pheno_list': [p for m in manifests for p in m.get('bin_pheno_list', [])],
+        'quant_pheno_list': [p for m in manifests for p in m.get('quant_pheno_list', [])],
+        'p_cutoff_summarize': first.get('p_cutoff_summarize'),
+        'pheno_summary_plots': {},
+        'gwas_plots': {cohort: {} for cohort in first['cohort_list']},
+        'plot_index': [e for m in manifests for e in m.get('plot_index', [])],
+        'smoke_test': first.get('smoke_test', False),
+    }
+    for m in manifests:
+        merged['pheno_summary_plots'].update(m.get('pheno_summary_plots', {}))
+        for cohort, phenos in m.get('gwas_plots', {}).items():
+            merged['gwas_plots'].setdefault(cohort, {}).update(phenos)
+
+    for key, name in MERGED_TABLES.items():
+        sources = [m[key] for m in manifests if m.get(key) and Path(m[key]).exists() and Path(m[key]).stat().st_size]
+        merged[key] = None
+        if sources:
+            merged[key] = str(merged_dir / name)
+            merge_csvs(sources, merged[key])
+
+    # Shown on the Analysis Logs page: the first shard's settings, with the combined phenotype lists
+    params = json.loads(json.dumps(first['params']))
+    cpc = params.get('cohorts_phenotypes_chromosomes', params)
+    cpc['bin_pheno_list'] = merged['bin_pheno_list']
+    cpc['quant_pheno_list'] = merged['quant_pheno_list']
+    merged['params'] = params
+    return merged
+
+
+def main():
+    args = make_arg_parser().parse_args()
+
+    manifests = [load_manifest(path) for path in args.manifests]
+    check_compatible(manifests, args.manifests)
+
+    merged_dir = Path(args.merged_dir)
+    merged_dir.mkdir(parents=True, exist_ok=True)
+    merged = merge_manifests(manifests, merged_dir)
+    manifest_path = merged_dir / 'results_manifest.json'
+    with open(manifest_path, 'w') as f:
+        json.dump(merged, f, indent=2)
+
+    print(f"Merged {len(manifests)} manifests into {manifest_path}")
+    print(f"  Cohorts            : {merged['cohort_list']}")
+    print(f"  Phenotypes         : {len(merged['bin_pheno_list']) + len(merged['quant_pheno_list'])}")
+
+    generator = PlinkReportGenerator(manifest_path, args.output_zip, workers=args.workers,
+                                     keep_report_dir=not args.no_report_dir, cache_dir=args.cache_dir)
+    generator.generate_all()
+
+
+if __name__ == '__main__':
+    main()
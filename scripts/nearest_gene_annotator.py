@@ -0,0 +1,219 @@
+import os
+import sys
+import sqlite3
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Bump when the index layout changes so old cached indexes are rebuilt
+INDEX_VERSION = 1
+
+# Columns of the space-separated Biofilter --position-file input (no header)
+POSITION_COLUMNS = ['chr', 'position_label', 'pos']
+# Output columns, as read back from Biofilter's 'position_label snp position gene upstream downstream' annotation
+ANNOTATION_COLUMNS = ['position_label', 'snp', 'chr', 'pos', 'gene', 'upstream', 'distance', 'downstream', 'distance.1']
+
+# LOKI stores chromosomes as integers; plink2 writes X, Y, XY and MT as 23-26
+CHROM_NAMES = {'23': 'X', '24': 'Y', '25': 'XY', '26': 'MT', 'M': 'MT'}
+
+# Gene regions of the default LD profile, with 1-based inclusive coordinates
+LOKI_GENE_QUERY = """
+SELECT br.chr, br.posMin, br.posMax, b.label
+FROM biopolymer_region br
+JOIN biopolymer b ON b.biopolymer_id = br.biopolymer_id
+JOIN type t ON t.type_id = b.type_id
+JOIN ldprofile l ON l.ldprofile_id = br.ldprofile_id
+WHERE t.type = 'gene' AND l.ldprofile = ''
+"""
+
+
+def make_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="Annotate positions with the overlapping, nearest upstream and nearest downstream gene "
+                    "from a sorted interval index, as a fast alternative to Biofilter."
+    )
+    genes = parser.add_mutually_exclusive_group(required=True)
+    genes.add_argument('--bed', help='Gene coordinates as BED (chrom, 0-based start, end, gene name)')
+    genes.add_argument('--loki', help='LOKI knowledge database to export gene coordinates from')
+    parser.add_argument('--positions', nargs='+', required=True,
+                        help='Biofilter position files (chrom, variant ID, position; space-separated, no header)')
+    parser.add_argument('--index_dir', default='.',
+                        help='Directory for the cached binary gene index, reused while the gene source is unchanged')
+    parser.add_argument('--output', required=True, help='Annotations .tsv, in the Biofilter output format')
+    return parser
+
+
+def normalize_chrom(chroms):
+    chroms = pd.Series(chroms).astype(str).str.replace(r'^chr', '', regex=True)
+    return chroms.replace(CHROM_NAMES).to_numpy()
+
+
+def read_bed(bed_file):
+    """Read BED gene coordinates as 1-based inclusive (chrom, start, end, name)."""
+    bed = pd.read_table(bed_file, header=None, usecols=[0, 1, 2, 3], names=['chrom', 'start', 'end', 'name'],
+                        comment='#', dtype={'chrom': str, 'name': str})
+    bed = bed[~bed['chrom'].str.startswith(('track', 'browser'))]
+    bed['start'] = bed['start'].astype(np.int64) + 1
+    return bed
+
+
+def read_loki_genes(loki_file):
+    """Export gene regions from LOKI, opened read-only so shared copies are never locked for writing."""
+    con = sqlite3.connect(f'file:{Path(loki_file).resolve()}?mode=ro', uri=True)
+    genes = pd.read_sql_query(LOKI_GENE_QUERY, con)
+    con.close()
+    return genes.set_axis(['chrom', 'start', 'end', 'name'], axis=1)
+
+
+def build_index(genes):
+    """
+    Arrays of gene intervals grouped by chromosome (offsets into the flat arrays), sorted by start.
+    Alongside: the running maximum end (and the gene reaching it) for overlap queries, and the
+    ends sorted on their own for nearest-upstream queries.
+    """
+    genes = genes.assign(chrom=normalize_chrom(genes['chrom'])) \
+                 .sort_values(['chrom', 'start', 'end', 'name'], kind='mergesort').reset_index(drop=True)
+    chroms, offsets = np.unique(genes['chrom'].to_numpy(), return_index=True)
+    offsets = np.append(offsets, len(genes))
+
+    starts = genes['start'].to_numpy(np.int64)
+    ends = genes['end'].to_numpy(np.int64)
+    max_end = np.empty_like(ends)
+    max_end_gene = np.empty_like(ends)
+    end_order = np.empty_like(ends)
+    for lo, hi in zip(offsets[:-1], offsets[1:]):
+        running = np.maximum.accumulate(ends[lo:hi])
+        max_end[lo:hi] = running
+        # Index of the gene that set each running maximum
+        is_new_max = np.r_[True, running[1:] > running[:-1]]
+        max_end_gene[lo:hi] = lo + np.maximum.accumulate(np.where(is_new_max, np.arange(hi - lo), 0))
+        end_order[lo:hi] = lo + np.argsort(ends[lo:hi], kind='mergesort')
+
+    return {'chroms': chroms.astype(str), 'offsets': offsets, 'starts': starts, 'ends': ends,
+            'names': genes['name'].to_numpy(str), 'max_end': max_end, 'max_end_gene': max_end_gene,
+            'end_order': end_order}
+
+
+def load_index(source, index_dir, read_genes):
+    """Load the gene index cached for this source file, building and saving it on first use."""
+    real_path = os.path.realpath(source)
+    stat = os.stat(real_path)
+    key = hashlib.blake2b(f'{INDEX_VERSION}:{real_path}:{stat.st_size}:{stat.st_mtime_ns}'.encode(),
+                          digest_size=8).hexdigest()
+    index_file = Path(index_dir) / f'gene_index.{key}.npz'
+    if index_file.exists():
+        with np.load(index_file) as cached:
+            return {name: cached[name] for name in cached.files}
+
+    index = build_index(read_genes(source))
+    index_file.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename so concurrent tasks never load a half-written index
+    tmp_file = index_file.with_suffix(f'.{os.getpid()}.tmp.npz')
+    np.savez(tmp_file, **index)
+    os.replace(tmp_file, index_file)
+    return index
+
+
+def annotate(positions, index):
+    """
+    Overlapping gene, nearest upstream gene (largest end before the position) and nearest downstream
+    gene (smallest start after it), with their distances, by binary search within each chromosome.
+    """
+    n = len(positions)
+    gene = np.full(n, None, dtype=object)
+    upstream = np.full(n, None, dtype=object)
+    downstream = np.full(n, None, dtype=object)
+    up_dist = np.full(n, np.nan)
+    down_dist = np.full(n, np.nan)
+
+    chrom = normalize_chrom(positions['chr'])
+    pos = positions['pos'].to_numpy(np.int64)
+    names = index['names']
+    for c, lo, hi in zip(index['chroms'], index['offsets'][:-1], index['offsets'][1:]):
+        rows = np.flatnonzero(chrom == c)
+        if rows.size == 0:
+            continue
+        p = pos[rows]
+        starts = index['starts'][lo:hi]
+
+        # Last gene starting at or before p; it or an earlier gene overlaps if the running max end reaches p
+        last = np.searchsorted(starts, p, side='right') - 1
+        has_start = last >= 0
+        covering = np.zeros(rows.size, dtype=bool)
+        covering[has_start] = index['max_end'][lo + last[has_start]] >= p[has_start]
+        gene[rows[covering]] = names[index['max_end_gene'][lo + last[covering]]]
+
+        end_order = index['end_order'][lo:hi]
+        ends = index['ends'][end_order]
+        before = np.searchsorted(ends, p, side='left') - 1
+        found = before >= 0
+        upstream[rows[found]] = names[end_order[before[found]]]
+        up_dist[rows[found]] = p[found] - ends[before[found]]
+
+        after = last + 1
+        found = after < hi - lo
+        downstream[rows[found]] = names[lo + after[found]]
+        down_dist[rows[found]] = starts[after[found]] - p[found]
+
+    return pd.DataFrame({
+        'position_label': positions['position_label'].to_numpy(),
+        # Only Biofilter looks up rsIDs; variant IDs that are already rsIDs are kept
+        'snp': positions['position_label'].where(positions['position_label'].str.match(r'rs\d+$')).to_numpy(),
+        'chr': positions['chr'].to_numpy(),
+        'pos': pos,
+        'gene': gene,
+        'upstream': upstream,
+        'distance': pd.array(up_dist, dtype='Int64'),
+        'downstream': downstream,
+        'distance.1': pd.array(down_dist, dtype='Int64'),
+    }, columns=ANNOTATION_COLUMNS)
+
+
+def assign_gene_annotations(biofilter_df, close_dist=5E4):
+    """
+    Fill the 'Gene' column: the overlapping gene if any, otherwise the nearest gene within close_dist,
+    or 'upstream/downstream' when both or neither are that close.
+    """
+    # Picking first RSID by default because in dbSNP it's usually an SNV
+    biofilter_df = biofilter_df[~biofilter_df.index.duplicated(keep='first')].copy()
+
+    u_close = (biofilter_df['distance'] < float(close_dist)).to_numpy()
+    d_close = (biofilter_df['distance.1'] < float(close_dist)).to_numpy()
+    missing = biofilter_df['gene'].isna().to_numpy()
+    use_combo = (u_close == d_close) & missing  # Both close or both far
+    use_u = ~use_combo & missing & u_close
+    use_d = ~use_combo & missing & d_close
+
+    # str() rather than astype(str) so a missing side reads 'nan' on every pandas version, as it always has
+    gene_combo = biofilter_df['upstream'].map(str) + '/' + biofilter_df['downstream'].map(str)
+    biofilter_df['Gene'] = np.select(
+        [use_u, use_d, use_combo],
+        [biofilter_df['upstream'].to_numpy(object), biofilter_df['downstream'].to_numpy(object),
+         gene_combo.to_numpy(object)],
+        default=biofilter_df['gene'].to_numpy(object))
+    return biofilter_df
+
+
+def main():
+    args = make_arg_parser().parse_args()
+
+    frames = [pd.read_csv(f, sep=' ', header=None, names=POSITION_COLUMNS, dtype={'chr': str, 'position_label': str})
+              for f in args.positions if Path(f).stat().st_size > 0]
+    positions = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=POSITION_COLUMNS)
+
+    if args.bed:
+        index = load_index(args.bed, args.index_dir, read_bed)
+    else:
+        index = load_index(args.loki, args.index_dir, read_loki_genes)
+
+    annotations = annotate(positions, index)
+    annotations.to_csv(args.output, sep='\t', index=False)
+    print(f'Annotated {len(annotations)} positions against {len(index["starts"])} gene regions '
+          f'({annotations["gene"].notna().sum()} inside a gene)', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import re
+import numpy as np
+import pandas as pd
+
+# Exit codes the pipeline's errorStrategy treats as out-of-memory kills (see the memory-retrying processes)
+OOM_EXIT_CODES = [137, 138, 139, 140]
+
+# Trace fields worth enabling in nextflow.config for the performance page; the defaults lack memory and attempt
+RECOMMENDED_TRACE_FIELDS = ('task_id,hash,name,process,tag,status,exit,attempt,submit,start,complete,'
+                            'duration,realtime,%cpu,cpus,memory,peak_rss,rchar,wchar')
+
+DURATION_UNITS = {'ms': 1E-3, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+MEMORY_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4, 'PB': 1024 ** 5}
+
+
+def parse_duration_seconds(values):
+    """
+    Convert a trace duration column to seconds. Handles both the human-readable
+    format ('1h 2m 3s', '350ms', '2.5s') and raw trace output (milliseconds).
+    """
+    values = values.astype(str).str.strip()
+    raw = pd.to_numeric(values, errors='coerce') / 1000
+    # Only the human-readable values need the (slower) unit parsing
+    human = values[raw.isna()]
+    parts = human.str.extractall(r'(?P<num>[\d.]+)\s*(?P<unit>ms|d|h|m|s)')
+    if parts.empty:
+        return raw
+    parts_seconds = parts['num'].astype(float) * parts['unit'].map(DURATION_UNITS)
+    return raw.fillna(parts_seconds.groupby(level=0).sum())
+
+
+def parse_memory_bytes(values):
+    """
+    Convert a trace memory/IO column to bytes. Handles '1.2 GB', '512 MB', '0' and raw byte counts.
+    """
+    values = values.astype(str).str.strip()
+    raw = pd.to_numeric(values, errors='coerce')
+    parts = values[raw.isna()].str.extract(r'^(?P<num>[\d.]+)\s*(?P<unit>[KMGTP]?B)$', flags=re.IGNORECASE)
+    return raw.fillna(parts['num'].astype(float) * parts['unit'].str.upper().map(MEMORY_UNITS))
+
+
+def read_trace(trace_file, cohort_list=(), pheno_list=()):
+    """
+    Read a Nextflow trace TSV into one row per task attempt with numeric columns:
+    realtime_s, duration_s, cpu_pct, peak_rss_bytes, requested_mem_bytes, cpu_hours.
+
+    Cohort and phenotype are taken from the task tag ('<cohort> <pheno> chr<N>' in plink2_gwas.nf),
+    matched against the run's cohort and phenotype lists so numeric default tags are ignored.
+    """
+    trace = pd.read_table(trace_file, dtype=str, na_values=['-', ''], keep_default_na=False)
+
+    # Task names are '<workflow>:<process> (<tag>)'
+    name_parts = trace['name'].fillna('').str.partition(' (')
+    if 'process' not in trace.columns:
+        trace['process'] = name_parts[0]
+    if 'tag' not in trace.columns:
+        trace['tag'] = name_parts[2].str[:-1].replace('', np.nan)
+    # Few distinct processes, so strip the workflow prefix once per name rather than once per row
+    trace['process'] = trace['process'].map({p: str(p).split(':')[-1] for p in trace['process'].unique()})
+
+    tag_parts = trace['tag'].fillna('').str.split(' ', n=2, expand=True).reindex(columns=[0, 1])
+    trace['cohort'] = tag_parts[0].where(tag_parts[0].isin(list(cohort_list)))
+    trace['pheno'] = tag_parts[1].where(trace['cohort'].notna() & tag_parts[1].isin(list(pheno_list)))
+
+    trace['status'] = trace['status'].fillna('UNKNOWN')
+    trace['exit'] = pd.to_numeric(trace.get('exit'), errors='coerce')
+    trace['attempt'] = pd.to_numeric(trace['attempt'], errors='coerce') if 'attempt' in trace.columns else np.nan
+
+    trace['realtime_s'] = parse_duration_seconds(trace['realtime']) if 'realtime' in trace.columns else np.nan
+    trace['duration_s'] = parse_duration_seconds(trace['duration']) if 'duration' in trace.columns else np.nan
+    trace['realtime_s'] = trace['realtime_s'].fillna(trace['duration_s'])
+    trace['cpu_pct'] = (pd.to_numeric(trace['%cpu'].str.rstrip('%'), errors='coerce')
+                        if '%cpu' in trace.columns else np.nan)
+    trace['cpus'] = pd.to_numeric(trace['cpus'], errors='coerce') if 'cpus' in trace.columns else np.nan
+    trace['peak_rss_bytes'] = parse_memory_bytes(trace['peak_rss']) if 'peak_rss' in trace.columns else np.nan
+    trace['requested_mem_bytes'] = parse_memory_bytes(trace['memory']) if 'memory' in trace.columns else np.nan
+
+    # Measured CPU use when %cpu is traced, otherwise the allocation
+    cpu_fraction = (trace['cpu_pct'] / 100).fillna(trace['cpus']).fillna(1)
+    trace['cpu_hours'] = trace['realtime_s'] * cpu_fraction / 3600
+    return trace
+
+
+def process_summary(trace):
+    """CPU-hours, wall time, task counts and memory efficiency per process (cached tasks excluded)."""
+    ran = trace[trace['status'] != 'CACHED'].assign(
+        failed=lambda df: df['status'] == 'FAILED',
+        requested_gb_hours=lambda df: df['requested_mem_bytes'] * df['realtime_s'] / 1024 ** 3 / 3600,
+        used_gb_hours=lambda df: df['peak_rss_bytes'] * df['realtime_s'] / 1024 ** 3 / 3600,
+    )
+    summary = ran.groupby('process').agg(
+        TASKS=('status', 'size'),
+        FAILED=('failed', 'sum'),
+        CPU_HOURS=('cpu_hours', 'sum'),
+        WALL_HOURS=('realtime_s', 'sum'),
+        MAX_TASK_MIN=('realtime_s', 'max'),
+        REQUESTED_GB=('requested_mem_bytes', 'max'),
+        PEAK_RSS_GB=('peak_rss_bytes', 'max'),
+        requested_gb_hours=('requested_gb_hours', 'sum'),
+        used_gb_hours=('used_gb_hours', 'sum'),
+    )
+    summary['WALL_HOURS'] /= 3600
+    summary['MAX_TASK_MIN'] /= 60
+    summary[['REQUESTED_GB', 'PEAK_RSS_GB']] /= 1024 ** 3
+    # Share of the requested memory-time actually used; low values mean memory can be lowered
+    summary['MEM_EFFICIENCY'] = summary.pop('used_gb_hours') / summary.pop('requested_gb_hours').replace(0, np.nan)
+    summary['CACHED'] = trace[trace['status'] == 'CACHED'].groupby('process').size()
+    summary['CACHED'] = summary['CACHED'].fillna(0).astype(int)
+    return summary.sort_values('CPU_HOURS', ascending=False).reset_index()
+
+
+def oom_retries(trace):
+    """Task attempts that ended with an OOM-related exit code, counted per process."""
+    oom = trace[trace['exit'].isin(OOM_EXIT_CODES)]
+    if oom.empty:
+        return pd.DataFrame(columns=['process', 'OOM_ATTEMPTS', 'TASKS_AFFECTED', 'MAX_REQUESTED_GB'])
+    return oom.groupby('process').agg(
+        OOM_ATTEMPTS=('exit', 'size'),
+        TASKS_AFFECTED=('tag', 'nunique'),
+        MAX_REQUESTED_GB=('requested_mem_bytes', 'max'),
+    ).assign(MAX_REQUESTED_GB=lambda df: df['MAX_REQUESTED_GB'] / 1024 ** 3) \
+     .sort_values('OOM_ATTEMPTS', ascending=False).reset_index()
+
+
+def slowest_tasks(trace, n=20):
+    """The n longest-running task attempts."""
+    cols = ['process', 'tag', 'status', 'exit', 'realtime_s', 'cpu_hours', 'peak_rss_bytes']
+    slowest = trace.nlargest(n, 'realtime_s')[cols].copy()
+    slowest['REALTIME_MIN'] = slowest.pop('realtime_s') / 60
+    slowest['PEAK_RSS_GB'] = slowest.pop('peak_rss_bytes') / 1024 ** 3
+    return slowest.rename(columns={'cpu_hours': 'CPU_HOURS'})
+
+
+def critical_paths(trace):
+    """
+    Approximate critical path per cohort x phenotype: the sum over pipeline stages of the
+    longest task in each stage. Per-chromosome GLM tasks run in parallel, so only the slowest
+    one counts; cohort-level tasks (set-up, standardization) count toward every phenotype of the cohort.
+    """
+    done = trace[trace['status'].isin(['COMPLETED', 'CACHED']) & trace['cohort'].notna()]
+    if done.empty:
+        return pd.DataFrame(columns=['cohort', 'pheno', 'CRITICAL_PATH_MIN', 'STAGES', 'BOTTLENECK', 'BOTTLENECK_MIN'])
+
+    stage_max = done.groupby(['cohort', 'pheno', 'process'], dropna=False)['realtime_s'].max().reset_index()
+    combo_stages = stage_max[stage_max['pheno'].notna()]
+    cohort_stages = stage_max[stage_max['pheno'].isna()].drop(columns='pheno')
+    combos = combo_stages[['cohort', 'pheno']].drop_duplicates()
+    stages = pd.concat([combo_stages, combos.merge(cohort_stages, on='cohort')], ignore_index=True)
+
+    paths = stages.groupby(['cohort', 'pheno']).agg(CRITICAL_PATH_MIN=('realtime_s', 'sum'),
+                                                   STAGES=('process', 'size'))
+    paths['CRITICAL_PATH_MIN'] /= 60
+    bottleneck = stages.loc[stages.groupby(['cohort', 'pheno'])['realtime_s'].idxmax()] \
+                       .set_index(['cohort', 'pheno'])
+    paths['BOTTLENECK'] = bottleneck['process']
+    paths['BOTTLENECK_MIN'] = bottleneck['realtime_s'] / 60
+    return paths.sort_values('CRITICAL_PATH_MIN', ascending=False).reset_index()
+
+
+def run_totals(trace):
+    """Headline numbers for the whole run."""
+    ran = trace[trace['status'] != 'CACHED']
+    return {
+        'Task attempts': len(trace),
+        'Cached tasks': int((trace['status'] == 'CACHED').sum()),
+        'Failed attempts': int((trace['status'] == 'FAILED').sum()),
+        'OOM-related retries': int(trace['exit'].isin(OOM_EXIT_CODES).sum()),
+        'CPU-hours': round(float(ran['cpu_hours'].sum()), 2),
+        'Task wall-hours': round(float(ran['realtime_s'].sum()) / 3600, 2),
+    }
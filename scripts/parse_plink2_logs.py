@@ -0,0 +1,121 @@
+import re
+import argparse as ap
+import pandas as pd
+from pathlib import Path
+
+# Log names written by the call_plink2_* processes: <cohort>.<pheno>.<chromosome>.<step>.plink2.log
+LOG_SUFFIX = '.plink2.log'
+
+# Counts read from the log text; plink2 wraps long lines, so these run on the log joined into one line
+COUNT_PATTERNS = {
+    'SAMPLES_LOADED': r'(\d+) samples? \([^)]*\) loaded from',
+    'SAMPLES_AFTER_KEEP': r'--keep: (\d+) samples? remaining',
+    'SAMPLES_AFTER_FILTERS': r'(\d+) samples? \([^)]*\) remaining after main filters',
+    'CASES': r'(\d+) cases? and \d+ controls? remaining after main filters',
+    'CONTROLS': r'\d+ cases? and (\d+) controls? remaining after main filters',
+    'VARIANTS_LOADED': r'(\d+) variants? loaded from',
+    'VARIANTS_AFTER_EXTRACT': r'--extract: (\d+) variants? remaining',
+    'GENO_REMOVED': r'--geno: (\d+) variants? removed',
+    'HWE_REMOVED': r'--hwe: (\d+) variants? removed',
+    'MAF_REMOVED': r'(\d+) variants? removed due to allele frequency threshold',
+    'VARIANTS_TESTED': r'(\d+) variants? remaining after main filters',
+    'THREADS': r'Using (?:up to )?(\d+) (?:compute )?threads?',
+    'RAM_DETECTED_MIB': r'(\d+) MiB RAM detected',
+    'WORKSPACE_MIB': r'reserving (\d+) MiB for main workspace',
+}
+BIN_PHENO_PATTERN = r'binary phenotypes? loaded \((\d+) cases?, (\d+) controls?\)'
+QUANT_PHENO_PATTERN = r'quantitative phenotypes? loaded \((\d+) values?\)'
+
+LOG_TIME_FORMAT = '%a %b %d %H:%M:%S %Y'
+
+COLUMN_ORDER = ['COHORT', 'PHENO', 'CHROM', 'STEP', 'PLINK2_VERSION', 'THREADS', 'RAM_DETECTED_MIB', 'WORKSPACE_MIB',
+                'SAMPLES_LOADED', 'SAMPLES_AFTER_KEEP', 'SAMPLES_AFTER_FILTERS', 'CASES', 'CONTROLS',
+                'PHENO_NONMISSING', 'PHENO_MISSING', 'VARIANTS_LOADED', 'VARIANTS_AFTER_EXTRACT',
+                'GENO_REMOVED', 'HWE_REMOVED', 'MAF_REMOVED', 'VARIANTS_TESTED', 'WARNINGS',
+                'START_TIME', 'END_TIME', 'ELAPSED_S', 'VARIANTS_PER_S', 'LOG_FILE']
+
+
+def make_arg_parser():
+    parser = ap.ArgumentParser(
+        description="Parse the plink2 .log files of the GLM tasks into one table keyed by cohort, phenotype and chromosome."
+    )
+    parser.add_argument('-l', '--logs', nargs='*', default=[], help='plink2 .log files from the call_plink2_* tasks')
+    parser.add_argument('-c', '--cohorts', nargs='*', default=[],
+                        help='Cohort names, used to split <cohort>.<pheno> when either contains a period')
+    parser.add_argument('-o', '--output', default='plink2_glm_log_metrics.csv', help='Output .csv')
+    return parser
+
+
+def split_log_name(log_file, cohorts):
+    """Return (cohort, pheno, chromosome, step) from a <cohort>.<pheno>.<chromosome>.<step>.plink2.log name."""
+    stem = Path(log_file).name[:-len(LOG_SUFFIX)]
+    cohort_pheno, chromosome, step = stem.rsplit('.', 2)
+    matches = [c for c in cohorts if cohort_pheno.startswith(f'{c}.')]
+    cohort = max(matches, key=len) if matches else cohort_pheno.split('.')[0]
+    return cohort, cohort_pheno[len(cohort) + 1:], chromosome, step
+
+
+def parse_plink2_log(log_file):
+    """Pull sample, phenotype, variant QC, resource and timing figures out of one plink2 log."""
+    lines = open(log_file).read().splitlines()
+    text = ' '.join(line.strip() for line in lines)
+    row = {}
+
+    version = re.match(r'PLINK (v\S+)', lines[0]) if lines else None
+    row['PLINK2_VERSION'] = version.group(1) if version else None
+
+    for col, pattern in COUNT_PATTERNS.items():
+        found = re.search(pattern, text)
+        row[col] = int(found.group(1)) if found else None
+
+    bin_pheno = re.search(BIN_PHENO_PATTERN, text)
+    quant_pheno = re.search(QUANT_PHENO_PATTERN, text)
+    if bin_pheno:
+        row['PHENO_NONMISSING'] = int(bin_pheno.group(1)) + int(bin_pheno.group(2))
+    elif quant_pheno:
+        row['PHENO_NONMISSING'] = int(quant_pheno.group(1))
+    else:
+        row['PHENO_NONMISSING'] = None
+    # The slim phenotype file only holds the cohort's samples, so the rest of the --keep set is missing
+    kept = row['SAMPLES_AFTER_KEEP']
+    if kept is not None and row['PHENO_NONMISSING'] is not None:
+        row['PHENO_MISSING'] = max(kept - row['PHENO_NONMISSING'], 0)
+    else:
+        row['PHENO_MISSING'] = None
+
+    row['WARNINGS'] = sum(line.startswith('Warning:') for line in lines)
+    for col, prefix in [('START_TIME', 'Start time: '), ('END_TIME', 'End time: ')]:
+        stamp = next((line[len(prefix):].strip() for line in lines if line.startswith(prefix)), None)
+        row[col] = pd.to_datetime(stamp, format=LOG_TIME_FORMAT, errors='coerce') if stamp else pd.NaT
+    return row
+
+
+def main():
+    args = make_arg_parser().parse_args()
+
+    rows = []
+    for log_file in args.logs:
+        # The Firth re-test leaves an empty log when no variant needed re-testing
+        if Path(log_file).stat().st_size == 0:
+            continue
+        cohort, pheno, chromosome, step = split_log_name(log_file, args.cohorts)
+        row = {'COHORT': cohort, 'PHENO': pheno, 'CHROM': chromosome, 'STEP': step, 'LOG_FILE': Path(log_file).name}
+        row.update(parse_plink2_log(log_file))
+        rows.append(row)
+
+    metrics = pd.DataFrame(rows, columns=COLUMN_ORDER)
+    if not metrics.empty:
+        metrics['ELAPSED_S'] = (metrics['END_TIME'] - metrics['START_TIME']).dt.total_seconds()
+        # Logs only have whole-second timestamps, so count sub-second runs as one second
+        metrics['VARIANTS_PER_S'] = (metrics['VARIANTS_TESTED'] / metrics['ELAPSED_S'].clip(lower=1)).round(1)
+        chrom_order = pd.to_numeric(metrics['CHROM'], errors='coerce')
+        metrics = metrics.assign(_chrom_order=chrom_order) \
+                         .sort_values(['COHORT', 'PHENO', '_chrom_order', 'CHROM', 'STEP']) \
+                         .drop(columns='_chrom_order')
+
+    metrics.to_csv(args.output, index=False, na_rep='NA')
+    print(f'Parsed {len(metrics)} plink2 logs into {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import atexit
+import socket
+import cProfile
+import resource
+from pathlib import Path
+from contextlib import contextmanager
+
+# Environment variables set by the workflow when params.metrics_dir / params.python_profile_dir are given;
+# without PLINK2_GWAS_METRICS_DIR nothing is written, so command-line runs leave no files behind
+METRICS_DIR_ENV = 'PLINK2_GWAS_METRICS_DIR'
+PROFILE_DIR_ENV = 'PLINK2_GWAS_PROFILE_DIR'
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (ru_maxrss is KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def children_peak_rss_mb():
+    """Largest peak RSS of the finished child processes (e.g. process pool workers), 0 if there were none."""
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+
+def file_bytes(*paths):
+    """Total size of the given files, ignoring None and paths that don't exist."""
+    return sum(os.path.getsize(p) for p in paths if p is not None and os.path.exists(p))
+
+
+class PipelineMetrics:
+    """
+    Per-phase timing and memory records for one script run, written as JSON lines
+    when PLINK2_GWAS_METRICS_DIR is set.
+
+    Each phase record holds wall and CPU seconds, peak RSS of the script and of its finished
+    worker processes, and the rows and bytes the phase reports reading or writing. A final
+    'total' record covers the whole run. If PLINK2_GWAS_PROFILE_DIR is set the run is also
+    profiled with cProfile.
+
+    Example:
+        metrics = PipelineMetrics(__file__, cohort=cohort)
+        metrics.start('read')
+        df = pd.read_csv(path)
+        metrics.stop(rows=len(df), bytes_read=file_bytes(path))
+    """
+
+    def __init__(self, script, **context):
+        self.script = Path(script).stem
+        self.context = {k: v for k, v in context.items() if v is not None}
+        self.host = socket.gethostname()
+        self.pid = os.getpid()
+
+        self.path = None
+        metrics_dir = os.environ.get(METRICS_DIR_ENV)
+        if metrics_dir:
+            Path(metrics_dir).mkdir(parents=True, exist_ok=True)
+            # One file per process so concurrent tasks never interleave writes
+            self.path = Path(metrics_dir) / f'{self.script}.{self.host}.{self.pid}.jsonl'
+
+        self.profiler = None
+        self.profile_dir = os.environ.get(PROFILE_DIR_ENV)
+        if self.profile_dir:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._totals = {'rows': None, 'bytes_read': 0, 'bytes_written': 0}
+        self._status = 'ok'
+        self._phase = None
+        self._closed = False
+        atexit.register(self.close)
+
+    def start(self, name, **fields):
+        """
+        Start timing a phase, ending any phase still open. Returns the phase record, which takes
+        'rows', 'bytes_read', 'bytes_written' and any extra fields until stop() is called.
+        """
+        if self._phase is not None:
+            self.stop()
+        record = {'rows': None, 'bytes_read': 0, 'bytes_written': 0, **fields}
+        self._phase = (name, record, time.perf_counter(), time.process_time())
+        return record
+
+    def stop(self, status='ok', **fields):
+        """End the open phase and write its record, with any last fields (e.g. rows=len(df))."""
+        if self._phase is None:
+            return
+        name, record, wall_start, cpu_start = self._phase
+        self._phase = None
+        record.update(fields)
+        record['wall_s'] = round(time.perf_counter() - wall_start, 4)
+        record['cpu_s'] = round(time.process_time() - cpu_start, 4)
+        record['peak_rss_mb'] = round(peak_rss_mb(), 1)
+        record['children_peak_rss_mb'] = round(children_peak_rss_mb(), 1)
+        record['status'] = status
+        if status != 'ok':
+            self._status = status
+        self._totals['bytes_read'] += record['bytes_read'] or 0
+        self._totals['bytes_written'] += record['bytes_written'] or 0
+        self.write(name, record)
+
+    @contextmanager
+    def phase(self, name, **fields):
+        """Time a phase as a block; the yielded dict is the phase record, as returned by start()."""
+        record = self.start(name, **fields)
+        try:
+            yield record
+        except BaseException:
+            self.stop(status='error')
+            raise
+        self.stop()
+
+    def write(self, phase, record):
+        if self.path is None:
+            return
+        line = {'script': self.script, 'phase': phase, **self.context,
+                'host': self.host, 'pid': self.pid, 'time': time.time(), **record}
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(line, default=str) + '\n')
+
+    def close(self):
+        """Write the 'total' record and the cProfile dump; runs automatically at exit."""
+        if self._closed:
+            return
+        self._closed = True
+        # A phase still open at exit was cut short by an error
+        if self._phase is not None:
+            self.stop(status='error')
+        if self.profiler is not None:
+            self.profiler.disable()
+            Path(self.profile_dir).mkdir(parents=True, exist_ok=True)
+            self.profiler.dump_stats(Path(self.profile_dir) / f'{self.script}.{self.host}.{self.pid}.prof')
+        self.write('total', {
+            **self._totals,
+            'wall_s': round(time.perf_counter() - self._wall_start, 4),
+            'cpu_s': round(time.process_time() - self._cpu_start, 4),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+            'children_peak_rss_mb': round(children_peak_rss_mb(), 1),
+            'status': self._status,
+        })
@@ -0,0 +1,164 @@
+import sys
+import argparse as ap
+import pandas as pd
+from pathlib import Path
+
+
+def make_arg_parser():
+    parser = ap.ArgumentParser(
+        description="Cheap preflight checks of PLINK 2.0 GWAS inputs, run before any cohort is set up."
+    )
+    parser.add_argument('-d', '--data', required=True, help='.csv Phenotype and covariate file')
+    parser.add_argument('-s', '--samples', required=True, help='.csv of cohort assignments')
+    parser.add_argument('-i', '--id', required=True, help='Column with sample IDs')
+    parser.add_argument('-r', '--remove', required=False, help='.txt list of related sample IDs to remove')
+
+    parser.add_argument('-c', '--cohorts', nargs='+', required=True, help='List of cohorts')
+    parser.add_argument('--sexStratCohorts', nargs='*', default=[], help='Sex-stratified cohorts')
+    parser.add_argument('-b', '--binPhenotypes', nargs='*', default=[], help='List of binary phenotypes')
+    parser.add_argument('-q', '--quantPhenotypes', nargs='*', default=[], help='List of quantitative phenotypes')
+
+    parser.add_argument('--catCovars', nargs='*', default=[], help='Categorical covariates')
+    parser.add_argument('--contCovars', nargs='*', default=[], help='Continuous covariates')
+    parser.add_argument('--sexStratCatCovars', nargs='*', default=[], help='Categorical covariates for sex-stratified cohorts')
+    parser.add_argument('--sexStratContCovars', nargs='*', default=[], help='Continuous covariates for sex-stratified cohorts')
+
+    parser.add_argument('--plinkFiles', nargs='+', required=True, help='Every genotype file the run will read')
+    parser.add_argument('--missingPlinkFiles', nargs='*', default=None,
+                        help='Genotype files found missing by the workflow, which sees the files this task does not stage; '
+                             'without it the --plinkFiles paths are checked here')
+    parser.add_argument('--plinkFam', required=True, help='.fam or .psam sample file checked for ID overlap')
+
+    parser.add_argument('-o', '--output', default='preflight_report.tsv', help='Pass/fail report')
+    parser.add_argument('--report_only', action='store_true',
+                        help='Always exit 0; failures are only recorded in the report')
+    return parser
+
+
+class PreflightReport:
+    def __init__(self):
+        self.rows = []
+
+    def add(self, check, passed, detail, warn_only=False):
+        status = 'PASS' if passed else ('WARN' if warn_only else 'FAIL')
+        self.rows.append({'CHECK': check, 'STATUS': status, 'DETAIL': detail})
+
+    @property
+    def failed(self):
+        return any(r['STATUS'] == 'FAIL' for r in self.rows)
+
+    def write(self, output):
+        df = pd.DataFrame(self.rows, columns=['CHECK', 'STATUS', 'DETAIL'])
+        overall = pd.DataFrame([{'CHECK': 'overall', 'STATUS': 'FAIL' if self.failed else 'PASS',
+                                 'DETAIL': f"{(df['STATUS'] == 'FAIL').sum()} failed, "
+                                           f"{(df['STATUS'] == 'WARN').sum()} warnings, {len(df)} checks"}])
+        df = pd.concat([df, overall])
+        df.to_csv(output, sep='\t', index=False)
+        return df
+
+
+def read_genotype_sample_ids(sample_file):
+    """Read only the IIDs from a .fam or .psam file."""
+    sample_file = str(sample_file)
+    with open(sample_file) as f:
+        first_line = f.readline()
+    if sample_file.endswith('.psam') and first_line.startswith('#'):
+        header = first_line.lstrip('#').split()
+        iid_col = header.index('IID')
+        return set(pd.read_table(sample_file, sep=r'\s+', comment='#', header=None,
+                                 usecols=[iid_col], dtype=str)[iid_col])
+    return set(pd.read_table(sample_file, sep=r'\s+', comment='#', header=None,
+                             usecols=[1], dtype=str)[1])
+
+
+def main():
+    args = make_arg_parser().parse_args()
+    id_col = args.id
+    report = PreflightReport()
+
+    # Genotype files for every chromosome
+    if args.missingPlinkFiles is None:
+        missing_geno = [f for f in args.plinkFiles if not Path(f).exists()]
+    else:
+        missing_geno = args.missingPlinkFiles
+    report.add('genotype_files', len(missing_geno) == 0,
+               f'missing: {", ".join(missing_geno)}' if missing_geno else f'{len(args.plinkFiles)} files found')
+
+    # Headers only
+    data_cols = pd.read_csv(args.data, nrows=0).columns.tolist()
+    cohort_cols = pd.read_csv(args.samples, nrows=0).columns.tolist()
+    report.add('data_csv_id_col', id_col in data_cols, f'{id_col} in {args.data}')
+    report.add('cohort_sets_id_col', id_col in cohort_cols, f'{id_col} in {args.samples}')
+
+    missing_cohorts = [c for c in args.cohorts if c not in cohort_cols]
+    report.add('cohorts_in_cohort_sets', len(missing_cohorts) == 0,
+               f'missing: {missing_cohorts}' if missing_cohorts else f'{len(args.cohorts)} cohorts found')
+
+    phenos = args.binPhenotypes + args.quantPhenotypes
+    missing_phenos = [p for p in phenos if p not in data_cols]
+    report.add('phenotypes_in_data_csv', len(missing_phenos) == 0,
+               f'missing: {missing_phenos}' if missing_phenos else f'{len(phenos)} phenotypes found')
+
+    all_covars = list(dict.fromkeys(args.catCovars + args.contCovars +
+                                    args.sexStratCatCovars + args.sexStratContCovars))
+    missing_covars = [c for c in all_covars if c not in data_cols]
+    report.add('covariates_in_data_csv', len(missing_covars) == 0,
+               f'missing: {missing_covars}' if missing_covars else f'{len(all_covars)} covariates found')
+
+    if id_col not in data_cols or id_col not in cohort_cols or not Path(args.plinkFam).exists():
+        report.write(args.output)
+        return finish(report, args)
+
+    # ID columns only
+    data_ids = pd.read_csv(args.data, usecols=[id_col], dtype={id_col: str})[id_col]
+    geno_ids = read_genotype_sample_ids(args.plinkFam)
+    overlap = data_ids[data_ids.isin(geno_ids)]
+    overlap_detail = f'{len(overlap)} of {len(data_ids)} {id_col} values found in {args.plinkFam} ({len(geno_ids)} samples)'
+    report.add('id_overlap_data_genotypes', len(overlap) > 0, overlap_detail)
+    if len(overlap) > 0:
+        report.add('id_all_genotyped', len(overlap) == len(data_ids), overlap_detail, warn_only=True)
+    report.add('id_unique_data_csv', not data_ids.duplicated().any(),
+               f'{data_ids.duplicated().sum()} duplicated {id_col} values')
+
+    drop_samples = set(open(args.remove).read().splitlines()) if args.remove is not None else set()
+
+    present_cohorts = [c for c in args.cohorts if c in cohort_cols]
+    cohort_table = pd.read_csv(args.samples, usecols=[id_col] + present_cohorts,
+                               index_col=id_col, dtype={id_col: str})
+    covar_data = pd.read_csv(args.data, usecols=[id_col] + [c for c in all_covars if c in data_cols],
+                             index_col=id_col, dtype={id_col: str})
+
+    # Per-cohort sample counts and covariate variance
+    for cohort in present_cohorts:
+        members = cohort_table.index[cohort_table[cohort] == 1]
+        keep = covar_data.index.intersection(members)
+        keep = keep[keep.isin(geno_ids) & ~keep.isin(drop_samples)]
+        report.add(f'{cohort}:samples', len(keep) > 0, f'{len(keep)} samples with data and genotypes')
+
+        if cohort in args.sexStratCohorts:
+            covars = args.sexStratCatCovars + args.sexStratContCovars
+        else:
+            covars = args.catCovars + args.contCovars
+        covars = [c for c in dict.fromkeys(covars) if c in covar_data.columns]
+        if len(keep) == 0 or len(covars) == 0:
+            continue
+
+        n_distinct = covar_data.loc[keep, covars].nunique(dropna=True)
+        constant = n_distinct.index[n_distinct <= 1].tolist()
+        report.add(f'{cohort}:covariate_variance', len(constant) == 0,
+                   f'no variance: {constant}' if constant else f'{len(covars)} covariates vary')
+
+    report.write(args.output)
+    return finish(report, args)
+
+
+def finish(report, args):
+    for row in report.rows:
+        if row['STATUS'] != 'PASS':
+            print(f"{row['STATUS']}\t{row['CHECK']}\t{row['DETAIL']}")
+    print(f"Preflight {'FAILED' if report.failed else 'passed'}: report written to {args.output}")
+    return 1 if report.failed and not args.report_only else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,6 @@
 import pandas as pd
 import argparse as ap
+from pipeline_metrics import PipelineMetrics, file_bytes
 
 def make_arg_parser():
     parser = ap.ArgumentParser(description=".")
@@ -10,6 +11,9 @@ def make_arg_parser():
     parser.add_argument('-r', '--remove', required=False, help='list of related individuals to filter out')
     parser.add_argument('-i', '--id', required=True, help='Column with sample IDs')
     parser.add_argument('--plinkFam', required=True)
+    parser.add_argument('--maxSamples', type=int, default=None,
+                        help='Keep a fixed random subsample of at most this many samples (smoke runs)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Print the full input tables')
 
     return parser
 
@@ -18,14 +22,20 @@ args = make_arg_parser().parse_args()
 id_col = args.id
 cohort = args.cohort
 plink_fam = args.plinkFam
+metrics = PipelineMetrics(__file__, cohort=cohort)
 
+metrics.start('read')
 data = pd.read_csv(args.data, index_col=id_col, dtype={id_col: str})
 samples = pd.read_csv(args.samples, index_col=id_col, dtype={id_col: str})
 remove = args.remove
+metrics.stop(rows=len(data), bytes_read=file_bytes(args.data, args.samples))
 
-print(data)
-print(samples)
+if args.verbose:
+    print(data)
+    print(samples)
 
+# The .fam/.psam and related-sample reads are timed with the filtering they feed
+metrics.start('transform', bytes_read=file_bytes(args.plinkFam, remove))
 if args.remove is not None:
     samples = samples[~samples.index.isin(open(remove).read().splitlines())]
 
@@ -34,6 +44,10 @@ plink_fam = pd.read_table(plink_fam, header=None, comment='#', index_col=1, sep=
 cohort_samples = samples.index[samples[cohort] == 1]
 keep_samples = data.index.intersection(samples.index).intersection(plink_fam.index).intersection(cohort_samples)
 
+if args.maxSamples is not None and len(keep_samples) > args.maxSamples:
+    # Fixed seed so repeated smoke runs test the same samples
+    keep_samples = keep_samples.to_series().sample(n=args.maxSamples, random_state=0).sort_values().index
+
 data = data.loc[keep_samples]
 plink_fam = plink_fam.loc[keep_samples]
 
@@ -48,7 +62,10 @@ if len(FIDs.unique()) == 1:
     data.insert(0, 'FID', 0)
 else:
     data.insert(0, 'FID', data.index)
+metrics.stop(rows=len(data))
 
+metrics.start('write')
 data.to_csv(f'{cohort}.plink2_pheno_covars.txt', sep='\t', index=False)
 data[['FID', 'IID']].to_csv(f'{cohort}.sample_list.txt', sep=' ', index=False, header=False)
+metrics.stop(rows=len(data), bytes_written=file_bytes(f'{cohort}.plink2_pheno_covars.txt', f'{cohort}.sample_list.txt'))
 
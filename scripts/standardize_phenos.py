@@ -3,6 +3,7 @@ import pandas as pd
 import numpy as np
 
 from pathlib import Path
+from pipeline_metrics import PipelineMetrics, file_bytes
 # from sklearn.preprocessing import StandardScaler
 
 
@@ -14,6 +15,9 @@ def make_arg_parser():
     parser.add_argument('-s', '--samples', required=True, help='.tsv with sample IDs. Should have IID and FID columns.')
     parser.add_argument('-o','--outfile',default=None, help='Name of standardized output file')
     parser.add_argument('-c', '--cohort', required=True, help='Cohort run on')
+    parser.add_argument('--phenos', nargs='*', default=[], help='Phenotypes to write slim per-task plink2 inputs for')
+    parser.add_argument('--catCovars', nargs='*', default=[], help='Categorical covariates used for this cohort')
+    parser.add_argument('--contCovars', nargs='*', default=[], help='Continuous covariates used for this cohort')
 
     return parser
 
@@ -44,6 +48,33 @@ def get_basename(filepath, parent=False, suffixes=None):
         filename = filename.name
     return filename
 
+
+def write_slim_inputs(df, cohort, phenos, covars):
+    """
+    Writes the small files each plink2 GLM task stages instead of the full table:
+    one shared gzipped covariate file per cohort and one ID + phenotype file per phenotype.
+
+    Args:
+        df (DataFrame): standardized phenotypes and covariates indexed by FID, IID
+        cohort (str): cohort name used to prefix output files
+        phenos (list): phenotypes to write per-task files for
+        covars (list): covariates used in this cohort's models
+    """
+    missing_covars = [c for c in covars if c not in df.columns]
+    if missing_covars:
+        raise ValueError(f'Covariates missing from phenotype/covariate table: {missing_covars}')
+
+    out = df.reset_index()
+    # mtime=0 keeps the gzip bytes identical across reruns with identical content
+    out[['FID', 'IID'] + covars].to_csv(f'{cohort}.covars.tsv.gz', sep='\t', index=False, na_rep='NA',
+                                         compression={'method': 'gzip', 'mtime': 0})
+
+    for pheno in phenos:
+        if pheno not in out.columns:
+            print(f'WARNING: phenotype {pheno} not in phenotype/covariate table, no slim input written')
+            continue
+        out[['FID', 'IID', pheno]].to_csv(f'{cohort}.{pheno}.pheno.tsv', sep='\t', index=False, na_rep='NA')
+
 # parse arguments
 args = make_arg_parser().parse_args()
 
@@ -51,10 +82,15 @@ samplefile = args.samples
 pheno_covar_file = args.phenoCovarTable
 outfile = args.outfile
 cohort = args.cohort
+metrics = PipelineMetrics(__file__, cohort=cohort)
 
 # read in the datafiles
+metrics.start('read')
 df = pd.read_table(pheno_covar_file, index_col=['FID', 'IID'], dtype={'FID': str, 'IID': str})
 samples = [l.split()[1] for l in open(samplefile).read().splitlines()]
+metrics.stop(rows=len(df), bytes_read=file_bytes(pheno_covar_file, samplefile))
+
+metrics.start('transform')
 
 # subsample by ID
 df = df[df.index.get_level_values('IID').isin(samples)]
@@ -102,12 +138,21 @@ for col in df[binary_columns]:
         print('binary encodings are not correct, recoding values and transforming missing values')
         df[col]=df[col].replace({0: 1, 1: 2}).fillna(-9)
 
+metrics.stop(rows=len(df))
+
 #df[binary_columns] = df[binary_columns].replace({0: 1, 1: 2}).fillna(-9)
 
 # save
+metrics.start('write')
 if outfile:
     df.reset_index().to_csv(outfile, sep='\t', index=False)
 else:
     # outfile = base = get_basename(pheno_covar_file,parent=False) + '_standardized.tsv'
     outfile = f'{cohort}.plink2_pheno_covars_standardized.tsv'
-    df.reset_index().to_csv(outfile, sep='\t', index=False, na_rep='NA')
\ No newline at end of file
+    df.reset_index().to_csv(outfile, sep='\t', index=False, na_rep='NA')
+
+# continuous covariates first, matching the --covar-name order used for the GLM
+covars = list(dict.fromkeys(args.contCovars + args.catCovars))
+write_slim_inputs(df, cohort, args.phenos, covars)
+metrics.stop(rows=len(df), bytes_written=file_bytes(outfile, f'{cohort}.covars.tsv.gz',
+                                                    *[f'{cohort}.{pheno}.pheno.tsv' for pheno in args.phenos]))
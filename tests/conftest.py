@@ -0,0 +1,20 @@
+import os
+import sys
+import subprocess
+from pathlib import Path
+
+import pytest
+
+SCRIPTS_DIR = Path(__file__).resolve().parents[1] / 'scripts'
+# The scripts import each other as top-level modules, as they do when staged into a task directory
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+
+@pytest.fixture
+def run_script(tmp_path):
+    """Run a pipeline script from scripts/ in tmp_path, as a Nextflow task would; fails the test on a non-zero exit."""
+    def run(script, *args):
+        return subprocess.run([sys.executable, str(SCRIPTS_DIR / script), *map(str, args)],
+                              cwd=tmp_path, env={**os.environ, 'PYTHONPATH': str(SCRIPTS_DIR)}, capture_output=True,
+                              text=True, check=True)
+    return run
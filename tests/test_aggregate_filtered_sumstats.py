@@ -0,0 +1,56 @@
+import pandas as pd
+
+COLUMNS = ['#CHROM', 'POS', 'ID', 'P', 'COHORT', 'PHENO']
+
+
+def write_csv(path, rows, columns):
+    pd.DataFrame(rows, columns=columns).to_csv(path, index=False)
+    return path.name
+
+
+def test_aggregate_concatenates_and_sorts_hits(tmp_path, run_script):
+    a = write_csv(tmp_path / 'EUR.BMI.filtered.plink2.csv',
+                  [['X', 50, 'X:50', 1E-6, 'EUR', 'BMI'], ['10', 5, '0010', 1E-7, 'EUR', 'BMI']], COLUMNS)
+    b = write_csv(tmp_path / 'AFR.BMI.filtered.plink2.csv',
+                  [['2', 20, '2:20', 1E-8, 'AFR', 'BMI'], ['10', 5, '0009', 1E-6, 'AFR', 'BMI']], COLUMNS)
+    empty = write_csv(tmp_path / 'AFR.HDL.filtered.plink2.csv', [], COLUMNS)
+
+    run_script('aggregate_filtered_sumstats.py', 'aggregate', '--sumstats', a, b, empty, '--threads', 2,
+               '--output', 'all.csv')
+
+    hits = pd.read_csv(tmp_path / 'all.csv', dtype={'#CHROM': str, 'ID': str})
+    # Numeric chromosomes first in numeric order, then by position and ID; IDs keep their leading zeros
+    assert hits['ID'].tolist() == ['2:20', '0009', '0010', 'X:50']
+    assert hits['COHORT'].tolist() == ['AFR', 'AFR', 'EUR', 'EUR']
+
+
+def test_annotate_keeps_hits_without_annotations(tmp_path, run_script):
+    write_csv(tmp_path / 'all.csv', [['1', 100, '1:100', 1E-8, 'EUR', 'BMI'],
+                                     ['1', 100, '1:100', 1E-7, 'AFR', 'BMI'],
+                                     ['2', 200, '2:200', 1E-6, 'EUR', 'BMI']], COLUMNS)
+    write_csv(tmp_path / 'annotations.csv', [['1:100', 'rs100', '1', 100, 'GENE1'],
+                                             ['1:100', 'rs101', '1', 100, 'GENE1'],
+                                             ['3:300', 'rs300', '3', 300, 'GENE3']],
+              ['Var_ID', 'RSID', '#CHROM', 'POS', 'Gene'])
+
+    run_script('aggregate_filtered_sumstats.py', 'annotate', '--table', 'all.csv', '--annotations', 'annotations.csv',
+               '--output', 'all.annotated.csv')
+
+    annotated = pd.read_csv(tmp_path / 'all.annotated.csv')
+    assert annotated.columns.tolist() == COLUMNS + ['Gene', 'RSID']
+    # One row per hit: the first annotation of a variant is used, and unannotated hits stay with empty fields
+    assert annotated['ID'].tolist() == ['1:100', '1:100', '2:200']
+    assert annotated['RSID'].tolist()[:2] == ['rs100', 'rs100']
+    assert annotated.loc[2, ['Gene', 'RSID']].isna().all()
+
+
+def test_annotate_with_an_empty_annotation_file(tmp_path, run_script):
+    write_csv(tmp_path / 'all.csv', [['2', 200, '2:200', 1E-6, 'EUR', 'BMI']], COLUMNS)
+    write_csv(tmp_path / 'annotations.csv', [], ['Var_ID', 'RSID', '#CHROM', 'POS', 'Gene'])
+
+    run_script('aggregate_filtered_sumstats.py', 'annotate', '--table', 'all.csv', '--annotations', 'annotations.csv',
+               '--output', 'all.annotated.csv')
+
+    annotated = pd.read_csv(tmp_path / 'all.annotated.csv')
+    assert len(annotated) == 1
+    assert annotated.loc[0, ['Gene', 'RSID']].isna().all()
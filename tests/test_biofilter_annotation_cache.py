@@ -0,0 +1,76 @@
+import os
+
+import pandas as pd
+
+ANNOTATION_COLUMNS = ['position_label', 'snp', 'chr', 'pos', 'gene', 'upstream', 'distance', 'downstream', 'distance.1']
+BIOFILTER_ROWS = [
+    ['1:100:A:G', 'rs100', '1', '100', 'GENE1', '', '', '', ''],
+    ['1:100:A:G', 'rs101', '1', '100', 'GENE1', '', '', '', ''],
+    ['2:500:C:T', 'rs500', '2', '500', '', 'GENE2', '300', 'GENE3', '7000'],
+]
+
+
+def write_positions(path, rows):
+    path.write_text(''.join(f'{chrom} {var_id} {pos}\n' for chrom, var_id, pos in rows))
+    return path.name
+
+
+def split(run_script, *inputs, loki='loki.db'):
+    return run_script('biofilter_annotation_cache.py', 'split', '--positions', *inputs, '--misses', 'misses.txt',
+                      '--cached', 'cached.tsv', '--build', '38', '--loki', loki, '--cache_db', 'cache/biofilter.db')
+
+
+def merge(run_script, new, output):
+    return run_script('biofilter_annotation_cache.py', 'merge', '--misses', 'misses.txt', '--new', new,
+                      '--cached', 'cached.tsv', '--output', output, '--build', '38', '--loki', 'loki.db',
+                      '--cache_db', 'cache/biofilter.db')
+
+
+def read_misses(path):
+    return sorted(path.read_text().splitlines())
+
+
+def test_split_merge_round_trip(tmp_path, run_script):
+    (tmp_path / 'loki.db').write_text('loki')
+    # The same variant is a hit in more than one cohort; 3:900 has no annotation at all
+    a = write_positions(tmp_path / 'EUR.positions.txt', [('1', '1:100:A:G', 100), ('2', '2:500:C:T', 500)])
+    b = write_positions(tmp_path / 'AFR.positions.txt', [('1', '1:100:A:G', 100), ('3', '3:900:G:A', 900)])
+
+    split(run_script, a, b)
+    assert read_misses(tmp_path / 'misses.txt') == ['1 1:100:A:G 100', '2 2:500:C:T 500', '3 3:900:G:A 900']
+    pd.DataFrame(BIOFILTER_ROWS, columns=ANNOTATION_COLUMNS).to_csv(tmp_path / 'biofilter.txt', sep='\t', index=False)
+    merge(run_script, 'biofilter.txt', 'first_run.txt')
+    first_run = pd.read_table(tmp_path / 'first_run.txt', dtype=str, keep_default_na=False)
+    assert first_run.values.tolist() == pd.DataFrame(BIOFILTER_ROWS).values.tolist()
+
+    # Every position is cached now, including the one Biofilter returned nothing for
+    split(run_script, a, b)
+    assert (tmp_path / 'misses.txt').read_text() == ''
+    (tmp_path / 'empty_biofilter.txt').touch()
+    merge(run_script, 'empty_biofilter.txt', 'second_run.txt')
+    second_run = pd.read_table(tmp_path / 'second_run.txt', dtype=str, keep_default_na=False)
+
+    # Only the first Biofilter row per position is kept in the cache, as the gene assignment only uses that one
+    expected = first_run.drop_duplicates('position_label')
+    assert sorted(second_run.columns) == sorted(ANNOTATION_COLUMNS)
+    assert second_run[ANNOTATION_COLUMNS].sort_values('position_label').values.tolist() == \
+        expected.sort_values('position_label').values.tolist()
+
+
+def test_cache_is_keyed_on_the_loki_version_and_variant(tmp_path, run_script):
+    (tmp_path / 'loki.db').write_text('loki')
+    a = write_positions(tmp_path / 'EUR.positions.txt', [('2', '2:500:C:T', 500)])
+    split(run_script, a)
+    pd.DataFrame(BIOFILTER_ROWS[2:], columns=ANNOTATION_COLUMNS).to_csv(tmp_path / 'biofilter.txt', sep='\t', index=False)
+    merge(run_script, 'biofilter.txt', 'merged.txt')
+
+    # Another allele at the same position is a different variant
+    b = write_positions(tmp_path / 'AFR.positions.txt', [('2', '2:500:C:T', 500), ('2', '2:500:C:G', 500)])
+    split(run_script, b)
+    assert read_misses(tmp_path / 'misses.txt') == ['2 2:500:C:G 500']
+
+    # A rebuilt LOKI starts over
+    stat = os.stat(tmp_path / 'loki.db')
+    os.utime(tmp_path / 'loki.db', ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    split(run_script, a)
+    assert read_misses(tmp_path / 'misses.txt') == ['2 2:500:C:T 500']
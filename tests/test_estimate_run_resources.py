@@ -0,0 +1,58 @@
+import estimate_run_resources
+
+PIPELINE = """nextflow.enable.dsl = 2
+
+params.putAll([
+    min_bin_cases: 50,
+    chromosome_list: [21, 22],
+    two_stage_logistic: false,
+    firth_retest_p: 1E-3,
+    gene_annotator: 'biofilter',
+    glm_cache_dir: null
+])
+
+params.related_list = null
+
+OUTPUT_DIR = params.smoke_test ? "${launchDir}/${params.smoke_output_dir}" : "${launchDir}"
+
+process fixed_memory {
+    memory '8 GB'
+    script:
+        \"\"\"echo\"\"\"
+}
+
+process computed_memory {
+    memory { task.attempt * 4.GB }
+    script:
+        \"\"\"echo\"\"\"
+}
+
+process no_memory {
+    script:
+        \"\"\"echo\"\"\"
+}
+"""
+
+
+def test_read_defaults_takes_the_put_all_block_and_top_level_params(tmp_path):
+    pipeline = tmp_path / 'plink2_gwas.nf'
+    pipeline.write_text(PIPELINE)
+    config = tmp_path / 'plink2_gwas.config'
+    config.write_text('params {\n    min_bin_cases = 20\n    related_list = "${launchDir}/related.txt"\n}\n')
+
+    reader = estimate_run_resources.ConfigReader(tmp_path)
+    reader.read_defaults(pipeline)
+    params = reader.read(config)
+
+    assert params == {'min_bin_cases': 20, 'chromosome_list': [21, 22], 'two_stage_logistic': False,
+                      'firth_retest_p': 1E-3, 'gene_annotator': 'biofilter', 'glm_cache_dir': None,
+                      'related_list': f'{tmp_path}/related.txt'}
+
+
+def test_process_memory_gb_warns_about_unreadable_directives(capsys):
+    assert estimate_run_resources.process_memory_gb(PIPELINE, 'fixed_memory', {}) == 8
+    assert estimate_run_resources.process_memory_gb(PIPELINE, 'no_memory', {}) is None
+    assert capsys.readouterr().err == ''
+
+    assert estimate_run_resources.process_memory_gb(PIPELINE, 'computed_memory', {}) is None
+    assert 'computed_memory' in capsys.readouterr().err
@@ -0,0 +1,51 @@
+import pandas as pd
+
+GLM_COLUMNS = ['#CHROM', 'POS', 'ID', 'REF', 'ALT', 'A1', 'OBS_CT', 'OR', 'LOG(OR)_SE', 'Z_STAT', 'P', 'ERRCODE']
+
+
+def write_glm(path, rows):
+    pd.DataFrame(rows, columns=GLM_COLUMNS).to_csv(path, sep='\t', index=False, na_rep='NA')
+    return path
+
+
+def test_extract_list_selects_small_p_missing_p_and_errcodes(tmp_path, run_script):
+    write_glm(tmp_path / 'first.glm.logistic', [
+        [1, 100, 'small_p', 'A', 'G', 'G', 500, 1.5, 0.1, 4.0, 1E-5, '.'],
+        [1, 200, 'large_p', 'A', 'G', 'G', 500, 1.0, 0.1, 0.1, 0.9, '.'],
+        [1, 300, 'no_p', 'A', 'G', 'G', 500, None, None, None, None, '.'],
+        [1, 400, 'unstable', 'A', 'G', 'G', 500, 1.0, 0.1, 0.1, 0.5, 'FIRTH_CONVERGE_FAIL'],
+        [1, 401, 'small_p', 'A', 'T', 'T', 500, 1.5, 0.1, 4.0, 1E-4, '.'],
+    ])
+    run_script('make_firth_extract_list.py', '--sumstats', 'first.glm.logistic', '--pvalue', 1E-3,
+               '--output', 'extract.txt')
+
+    # One ID per multi-allelic site, in first-pass order
+    assert (tmp_path / 'extract.txt').read_text().split() == ['small_p', 'no_p', 'unstable']
+
+
+def test_merge_splices_firth_rows_over_first_pass(tmp_path, run_script):
+    for chrom in [1, 2]:
+        write_glm(tmp_path / f'C1.P1.{chrom}.P1.glm.logistic', [
+            [chrom, 100, f'{chrom}:100', 'A', 'G', 'G', 500, 3.0, 0.1, 5.0, 1E-6, '.'],
+            [chrom, 200, f'{chrom}:200', 'A', 'G', 'A', 500, 1.0, 0.1, 0.1, 0.9, '.'],
+        ])
+    # Chromosome 1's small-P variant was re-tested; chromosome 2 had nothing to re-test
+    write_glm(tmp_path / 'C1.P1.1.P1.glm.firth', [
+        [1, 100, '1:100', 'A', 'G', 'G', 500, 2.5, 0.2, 4.5, 1E-5, '.'],
+    ])
+    (tmp_path / 'C1.P1.2.P1.glm.firth').touch()
+    (tmp_path / 'colnames.txt').write_text('#CHROM=CHR\nP=PVALUE\n')
+
+    run_script('merge_and_filter_plink2_results.py', '--cohort', 'C1', '--pheno', 'P1', '--colnames', 'colnames.txt',
+               '--pvalue', 1E-4, '--sumstats', 'C1.P1.1.P1.glm.logistic', 'C1.P1.1.P1.glm.firth',
+               'C1.P1.2.P1.glm.logistic', 'C1.P1.2.P1.glm.firth')
+
+    merged = pd.read_table(tmp_path / 'C1.P1.plink2.gz')
+    assert merged['ID'].tolist() == ['1:100', '1:200', '2:100', '2:200']
+    assert merged['METHOD'].tolist() == ['firth', 'logistic', 'logistic', 'logistic']
+    assert merged.loc[0, 'OR'] == 2.5
+    assert merged['A2'].tolist() == ['A', 'G', 'A', 'G']
+
+    filtered = pd.read_csv(tmp_path / 'C1.P1.filtered.plink2.csv')
+    assert filtered['ID'].tolist() == ['1:100', '2:100']
+    assert filtered['PVALUE'].tolist() == [1E-5, 1E-6]
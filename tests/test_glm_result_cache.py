@@ -0,0 +1,86 @@
+import gzip
+import os
+
+import glm_result_cache
+
+
+def make_inputs(tmp_path):
+    for name in ['chr1.pgen', 'chr1.pvar', 'chr1.psam']:
+        (tmp_path / name).write_text(name)
+    (tmp_path / 'samples.txt').write_text('S1\nS2\n')
+    (tmp_path / 'pheno.tsv').write_text('IID\tP1\nS1\t1\nS2\t0\n')
+    (tmp_path / 'covars.tsv').write_text('IID\tAGE\nS1\t40\nS2\t50\n')
+
+
+def key_for(tmp_path, *extra):
+    args = glm_result_cache.make_arg_parser().parse_args([
+        'key', '--plink_files', *(str(tmp_path / f) for f in ['chr1.pgen', 'chr1.pvar', 'chr1.psam']),
+        '--samples', str(tmp_path / 'samples.txt'), '--pheno_file', str(tmp_path / 'pheno.tsv'),
+        '--covar_file', str(tmp_path / 'covars.tsv'), '--pheno', 'P1', '--covars', 'AGE',
+        '--glm_args', '--glm hide-covar  --maf 0.01', '--plink2_version', 'PLINK v2.00a5 64-bit\n',
+        '--outputs', 'C1.P1.1.glm.logistic.hybrid.zst', 'C1.P1.1.logistic.plink2.log', *extra])
+    return glm_result_cache.compute_key(args)[0]
+
+
+def test_key_follows_input_content(tmp_path):
+    make_inputs(tmp_path)
+    key = key_for(tmp_path)
+    assert key == key_for(tmp_path)
+
+    (tmp_path / 'pheno.tsv').write_text('IID\tP1\nS1\t0\nS2\t1\n')
+    assert key_for(tmp_path) != key
+
+
+def test_key_ignores_whitespace_and_gzip_headers(tmp_path):
+    make_inputs(tmp_path)
+    for name, mtime in [('a.gz', 0), ('b.gz', 1000)]:
+        with open(tmp_path / name, 'wb') as f, gzip.GzipFile(fileobj=f, mode='wb', mtime=mtime) as gz:
+            gz.write(b'same content')
+    assert (tmp_path / 'a.gz').read_bytes() != (tmp_path / 'b.gz').read_bytes()
+    assert key_for(tmp_path, '--extra_files', str(tmp_path / 'a.gz')) == \
+        key_for(tmp_path, '--extra_files', str(tmp_path / 'b.gz'))
+
+    args = glm_result_cache.make_arg_parser().parse_args(
+        ['key', '--plink_files', str(tmp_path / 'chr1.pgen'), '--samples', str(tmp_path / 'samples.txt'),
+         '--pheno_file', str(tmp_path / 'pheno.tsv'), '--covar_file', str(tmp_path / 'covars.tsv'),
+         '--pheno', 'P1', '--glm_args', ' --glm   hide-covar ', '--plink2_version', 'v2', '--outputs', 'out'])
+    _, key_inputs = glm_result_cache.compute_key(args)
+    assert key_inputs['glm_args'] == '--glm hide-covar'
+
+
+def test_key_changes_when_genotypes_are_rewritten(tmp_path):
+    make_inputs(tmp_path)
+    key = key_for(tmp_path)
+    stat = os.stat(tmp_path / 'chr1.pgen')
+    os.utime(tmp_path / 'chr1.pgen', ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert key_for(tmp_path) != key
+
+
+def test_store_then_restore_round_trip(tmp_path, monkeypatch):
+    cache_dir = tmp_path / 'cache'
+    outputs = ['C1.P1.1.glm.linear.zst', 'C1.P1.1.linear.plink2.log']
+    task_dir = tmp_path / 'task'
+    task_dir.mkdir()
+    for name in outputs:
+        (task_dir / name).write_text(f'{name} contents')
+
+    monkeypatch.chdir(task_dir)
+    parser = glm_result_cache.make_arg_parser()
+    restore_args = parser.parse_args(['restore', '--cache_dir', str(cache_dir), '--key', 'ab12', '--outputs', *outputs])
+    assert glm_result_cache.restore(restore_args) == 1
+
+    assert glm_result_cache.store(parser.parse_args(
+        ['store', '--cache_dir', str(cache_dir), '--key', 'ab12', '--outputs', *outputs])) == 0
+    assert sorted(p.name for p in (cache_dir / 'ab' / 'ab12').iterdir()) == sorted(outputs)
+
+    # A second store of the same key keeps the first entry
+    (task_dir / outputs[0]).write_text('rerun contents')
+    glm_result_cache.store(parser.parse_args(
+        ['store', '--cache_dir', str(cache_dir), '--key', 'ab12', '--outputs', *outputs]))
+
+    new_task_dir = tmp_path / 'new_task'
+    new_task_dir.mkdir()
+    monkeypatch.chdir(new_task_dir)
+    assert glm_result_cache.restore(restore_args) == 0
+    assert (new_task_dir / outputs[0]).read_text() == f'{outputs[0]} contents'
+    assert (new_task_dir / outputs[1]).read_text() == f'{outputs[1]} contents'
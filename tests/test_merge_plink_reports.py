@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+import merge_plink_reports
+
+
+def make_manifest(bin_phenos, **qc):
+    return {
+        'cohort_list': ['EUR', 'AFR'],
+        'bin_pheno_list': bin_phenos,
+        'quant_pheno_list': [],
+        'smoke_test': False,
+        'params': {
+            'run_info': {'started_at': 'any'},
+            'cohorts_phenotypes_chromosomes': {'cohort_list': ['EUR', 'AFR'], 'bin_pheno_list': bin_phenos,
+                                               'chromosome_list': [1, 2]},
+            'plink_gwas_qc': {'min_maf': 0.01, 'hwe_min_pvalue': 1E-6, **qc},
+        },
+    }
+
+
+def test_check_compatible_accepts_phenotype_batches():
+    # Phenotype lists and run info differ between batches by design
+    merge_plink_reports.check_compatible([make_manifest(['T2D']), make_manifest(['CAD'])], ['a.json', 'b.json'])
+
+
+def test_check_compatible_rejects_differing_params():
+    with pytest.raises(ValueError, match=r"b.json: params.plink_gwas_qc differs from a.json in \['min_maf'\]"):
+        merge_plink_reports.check_compatible([make_manifest(['T2D']), make_manifest(['CAD'], min_maf=0.05)],
+                                             ['a.json', 'b.json'])
+
+    other_cohorts = make_manifest(['CAD'])
+    other_cohorts['cohort_list'] = ['EUR']
+    with pytest.raises(ValueError, match='cohort_list'):
+        merge_plink_reports.check_compatible([make_manifest(['T2D']), other_cohorts], ['a.json', 'b.json'])
+
+
+def test_check_compatible_rejects_a_phenotype_in_two_runs():
+    with pytest.raises(ValueError, match='Phenotype T2D is in both a.json and c.json'):
+        merge_plink_reports.check_compatible(
+            [make_manifest(['T2D']), make_manifest(['CAD']), make_manifest(['HF', 'T2D'])],
+            ['a.json', 'b.json', 'c.json'])
+
+
+def test_merge_csvs_copies_identical_headers_through(tmp_path):
+    (tmp_path / 'a.csv').write_text('ID,P\n1:100,1e-08\n')
+    (tmp_path / 'b.csv').write_text('ID,P\n2:200,"3e-06"\n')
+    merge_plink_reports.merge_csvs([tmp_path / 'a.csv', tmp_path / 'b.csv'], tmp_path / 'merged.csv')
+    # Rows are copied unparsed, quoting included
+    assert (tmp_path / 'merged.csv').read_text() == 'ID,P\n1:100,1e-08\n2:200,"3e-06"\n'
+
+
+def test_merge_csvs_writes_the_union_of_headers(tmp_path):
+    (tmp_path / 'a.csv').write_text('ID,P,Gene\n1:100,1e-08,GENE1\n')
+    (tmp_path / 'b.csv').write_text('ID,RSID,P\n2:200,rs200,3e-06\n')
+    merge_plink_reports.merge_csvs([tmp_path / 'a.csv', tmp_path / 'b.csv'], tmp_path / 'merged.csv')
+    assert (tmp_path / 'merged.csv').read_text().splitlines() == \
+        ['ID,P,Gene,RSID', '1:100,1e-08,GENE1,', '2:200,3e-06,,rs200']
+
+
+def test_load_manifest_resolves_the_published_layout(tmp_path):
+    run_dir = tmp_path / 'batch1'
+    manifest = {
+        'cohort_list': ['EUR'], 'bin_pheno_list': ['T2D'], 'quant_pheno_list': [],
+        'top_hits_csv': 'Summary/plink2_all_suggestive.csv', 'pheno_summaries_csv': 'Summary/pheno_summaries.csv',
+        'glm_log_metrics_csv': None,
+        'pheno_summary_plots': {'T2D': ['Plots/T2D.bar.png']},
+        'gwas_plots': {'EUR': {'T2D': {'manhattan': 'Plots/EUR.T2D.manhattan.png'}}},
+        'plot_index': [{'cohort': 'EUR', 'pheno': 'T2D', 'plot_type': 'manhattan',
+                        'path': 'Plots/EUR.T2D.manhattan.png'}],
+        'params': {},
+    }
+    run_dir.mkdir()
+    (run_dir / 'results_manifest.json').write_text(json.dumps(manifest))
+
+    loaded = merge_plink_reports.load_manifest(run_dir / 'results_manifest.json')
+    assert loaded['top_hits_csv'] == str(run_dir.resolve() / 'Summary' / 'plink2_all_suggestive.csv')
+    assert loaded['glm_log_metrics_csv'] is None
+    assert loaded['pheno_summary_plots']['T2D'] == [str(run_dir.resolve() / 'Plots' / 'T2D.bar.png')]
+    assert loaded['gwas_plots']['EUR']['T2D']['manhattan'] == \
+        loaded['plot_index'][0]['path'] == str(run_dir.resolve() / 'Plots' / 'EUR.T2D.manhattan.png')
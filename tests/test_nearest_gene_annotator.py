@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import nearest_gene_annotator
+
+
+def baseline_assign_gene_annotations(biofilter_df, close_dist=5E4):
+    # The pandas assignment the Biofilter wrapper used before the vectorized version, kept as the reference
+    biofilter_df = biofilter_df[~biofilter_df.index.duplicated(keep='first')].copy()
+    biofilter_df[['u-close', 'd-close']] = biofilter_df[['distance', 'distance.1']] < float(close_dist)
+    biofilter_df['gene-combo'] = biofilter_df[['upstream', 'downstream']] \
+        .apply(lambda x: '/'.join(str(v) for v in x), axis=1)
+    biofilter_df['missing'] = pd.isnull(biofilter_df['gene'])
+    biofilter_df['use-combo'] = (biofilter_df['u-close'] == biofilter_df['d-close']) & biofilter_df['missing']
+    biofilter_df['use-u'] = ~biofilter_df['use-combo'] & biofilter_df['missing'] & biofilter_df['u-close']
+    biofilter_df['use-d'] = ~biofilter_df['use-combo'] & biofilter_df['missing'] & biofilter_df['d-close']
+    biofilter_df['Gene'] = biofilter_df['gene']
+    for bool_col, gene_col in {'use-u': 'upstream', 'use-d': 'downstream', 'use-combo': 'gene-combo'}.items():
+        idx = biofilter_df.index[biofilter_df[bool_col]]
+        biofilter_df.loc[idx, 'Gene'] = biofilter_df.loc[idx, gene_col]
+    return biofilter_df
+
+
+@pytest.fixture
+def biofilter_df():
+    return pd.DataFrame([
+        ['inside', 'GENE1', 'UP', 10, 'DOWN', 10],
+        ['inside', 'OTHER', 'UP', 10, 'DOWN', 10],  # duplicate position: first row wins
+        ['near_up', None, 'UP', 100, 'DOWN', 90000],
+        ['near_down', None, 'UP', 90000, 'DOWN', 100],
+        ['both_near', None, 'UP', 100, 'DOWN', 200],
+        ['both_far', None, 'UP', 90000, 'DOWN', 80000],
+        ['no_upstream', None, None, None, 'DOWN', 100],
+        ['no_downstream', None, 'UP', 90000, None, None],
+        ['nothing', None, None, None, None, None],
+    ], columns=['position_label', 'gene', 'upstream', 'distance', 'downstream', 'distance.1']) \
+        .set_index('position_label').replace({None: np.nan})  # As read back from Biofilter's text output
+
+
+def test_assign_gene_annotations_rules(biofilter_df):
+    genes = nearest_gene_annotator.assign_gene_annotations(biofilter_df)['Gene']
+    assert genes.to_dict() == {
+        'inside': 'GENE1', 'near_up': 'UP', 'near_down': 'DOWN', 'both_near': 'UP/DOWN', 'both_far': 'UP/DOWN',
+        'no_upstream': 'DOWN', 'no_downstream': 'UP/nan', 'nothing': 'nan/nan'}
+
+
+@pytest.mark.parametrize('close_dist', [5E4, 150])
+def test_assign_gene_annotations_matches_the_baseline(biofilter_df, close_dist):
+    expected = baseline_assign_gene_annotations(biofilter_df, close_dist)['Gene']
+    actual = nearest_gene_annotator.assign_gene_annotations(biofilter_df, close_dist)['Gene']
+    pd.testing.assert_series_equal(actual, expected, check_dtype=False)
+
+
+def test_annotate_finds_overlapping_and_nearest_genes():
+    genes = pd.DataFrame({'chrom': ['chr1', '1', '1', '2', '23'], 'start': [100, 150, 1000, 50, 10],
+                          'end': [500, 200, 2000, 60, 20], 'name': ['LONG', 'SHORT', 'FAR', 'CHR2', 'XGENE']})
+    index = nearest_gene_annotator.build_index(genes)
+    positions = pd.DataFrame({'chr': ['1', '1', '1', '2', 'X', '5'],
+                              'position_label': ['rs1', '1:300:A:G', '1:3000:A:G', '2:10:C:T', 'X:15:G:A', '5:1:A:C'],
+                              'pos': [180, 300, 3000, 10, 15, 1]})
+    annotations = nearest_gene_annotator.annotate(positions, index).set_index('position_label')
+
+    # Inside two genes, the one reaching furthest is reported
+    assert annotations.loc['rs1', ['snp', 'gene']].tolist() == ['rs1', 'LONG']
+    # Past the end of the short gene, still inside the long one that started earlier
+    assert annotations.loc['1:300:A:G', ['gene', 'upstream', 'distance', 'downstream', 'distance.1']].tolist() == \
+        ['LONG', 'SHORT', 100, 'FAR', 700]
+    # Between genes, and past the last gene of the chromosome
+    assert annotations.loc['1:3000:A:G', ['upstream', 'distance']].tolist() == ['FAR', 1000]
+    assert annotations.loc['1:3000:A:G', ['gene', 'downstream', 'distance.1']].isna().all()
+    assert annotations.loc['2:10:C:T', ['downstream', 'distance.1']].tolist() == ['CHR2', 40]
+    assert annotations.loc['2:10:C:T', ['gene', 'upstream', 'distance']].isna().all()
+    # plink2's numeric X matches the gene source's chr23 / X naming
+    assert annotations.loc['X:15:G:A', 'gene'] == 'XGENE'
+    assert annotations.loc['5:1:A:C', ['gene', 'upstream', 'downstream']].isna().all()
+
+
+def test_load_index_reuses_the_cached_index(tmp_path):
+    bed = tmp_path / 'genes.bed'
+    bed.write_text('chr1\t99\t500\tLONG\n')
+    calls = []
+
+    def read_genes(path):
+        calls.append(path)
+        return nearest_gene_annotator.read_bed(path)
+
+    first = nearest_gene_annotator.load_index(bed, tmp_path / 'index', read_genes)
+    second = nearest_gene_annotator.load_index(bed, tmp_path / 'index', read_genes)
+    assert len(calls) == 1
+    assert first['starts'].tolist() == second['starts'].tolist() == [100]
+    assert second['names'].tolist() == ['LONG']
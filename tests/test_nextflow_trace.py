@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+
+import nextflow_trace
+
+TRACE_COLUMNS = ['task_id', 'name', 'status', 'exit', 'attempt', 'realtime', '%cpu', 'cpus', 'memory', 'peak_rss']
+
+
+def write_trace(path, rows):
+    pd.DataFrame(rows, columns=TRACE_COLUMNS).to_csv(path, sep='\t', index=False)
+    return path
+
+
+def test_parse_duration_seconds_handles_human_and_raw_values():
+    values = pd.Series(['1h 2m 3s', '350ms', '2.5s', '1d', '90000', '-'])
+    seconds = nextflow_trace.parse_duration_seconds(values)
+    assert seconds[:5].tolist() == pytest.approx([3723, 0.35, 2.5, 86400, 90])
+    assert pd.isna(seconds[5])
+
+
+def test_parse_memory_bytes_handles_units_and_raw_counts():
+    values = pd.Series(['1.5 GB', '512 MB', '0', '2048', '3 kb'])
+    assert nextflow_trace.parse_memory_bytes(values).tolist() == \
+        [1.5 * 1024 ** 3, 512 * 1024 ** 2, 0, 2048, 3 * 1024]
+
+
+@pytest.fixture
+def trace(tmp_path):
+    write_trace(tmp_path / 'trace.txt', [
+        [1, 'PLINK2_GWAS:set_up_cohort (EUR)', 'COMPLETED', 0, 1, '1m', '100.0%', 1, '4 GB', '1 GB'],
+        [2, 'PLINK2_GWAS:call_plink2_linear (EUR BMI chr1)', 'FAILED', 137, 1, '10m', '800.0%', 16, '24 GB', '24 GB'],
+        [3, 'PLINK2_GWAS:call_plink2_linear (EUR BMI chr1)', 'COMPLETED', 0, 2, '20m', '1600.0%', 16, '48 GB', '30 GB'],
+        [4, 'PLINK2_GWAS:call_plink2_linear (EUR BMI chr2)', 'COMPLETED', 0, 1, '5m', '1600.0%', 16, '24 GB', '12 GB'],
+        [5, 'PLINK2_GWAS:call_plink2_linear (EUR HDL chr1)', 'CACHED', 0, 1, '7m', '-', 16, '24 GB', '-'],
+        [6, 'PLINK2_GWAS:merge_and_filter_plink2_output (EUR BMI)', 'COMPLETED', 0, 1, '2m', '-', 1, '63 GB', '2 GB'],
+        [7, 'PLINK2_GWAS:make_pheno_summaries (1)', 'COMPLETED', 0, 1, '30s', '100.0%', 1, '8 GB', '1 GB'],
+    ])
+    return nextflow_trace.read_trace(tmp_path / 'trace.txt', cohort_list=['EUR'], pheno_list=['BMI', 'HDL'])
+
+
+def test_read_trace_takes_process_cohort_and_pheno_from_the_task_name(trace):
+    assert trace['process'].tolist()[:2] == ['set_up_cohort', 'call_plink2_linear']
+    assert trace['cohort'].tolist()[:6] == ['EUR'] * 6
+    assert pd.isna(trace.loc[0, 'pheno']) and trace.loc[1, 'pheno'] == 'BMI'
+    # A numeric default tag is neither a cohort nor a phenotype
+    assert pd.isna(trace.loc[6, 'cohort']) and pd.isna(trace.loc[6, 'pheno'])
+    # Without %cpu the allocated CPUs stand in for the measured ones
+    assert trace.loc[5, 'cpu_hours'] == pytest.approx(2 / 60)
+    assert trace.loc[2, 'cpu_hours'] == pytest.approx(20 / 60 * 16)
+
+
+def test_process_summary_excludes_cached_tasks(trace):
+    summary = nextflow_trace.process_summary(trace).set_index('process')
+    linear = summary.loc['call_plink2_linear']
+    assert (linear['TASKS'], linear['FAILED'], linear['CACHED']) == (3, 1, 1)
+    assert linear['MAX_TASK_MIN'] == 20
+    assert linear['PEAK_RSS_GB'] == 30
+    # Peak RSS x run time over requested memory x run time
+    assert linear['MEM_EFFICIENCY'] == pytest.approx((24 * 10 + 30 * 20 + 12 * 5) / (24 * 10 + 48 * 20 + 24 * 5))
+
+
+def test_oom_retries_and_run_totals(trace):
+    oom = nextflow_trace.oom_retries(trace)
+    assert oom.to_dict('records') == [
+        {'process': 'call_plink2_linear', 'OOM_ATTEMPTS': 1, 'TASKS_AFFECTED': 1, 'MAX_REQUESTED_GB': 24.0}]
+    totals = nextflow_trace.run_totals(trace)
+    assert (totals['Task attempts'], totals['Cached tasks'], totals['Failed attempts'],
+            totals['OOM-related retries']) == (7, 1, 1, 1)
+
+
+def test_critical_path_takes_the_slowest_chromosome_and_the_cohort_tasks(trace):
+    paths = nextflow_trace.critical_paths(trace).set_index(['cohort', 'pheno'])
+    # set_up_cohort (1m) + slowest completed chromosome (20m) + merge (2m)
+    assert paths.loc[('EUR', 'BMI'), 'CRITICAL_PATH_MIN'] == pytest.approx(23)
+    assert paths.loc[('EUR', 'BMI'), 'BOTTLENECK'] == 'call_plink2_linear'
+    # The cached task still lies on its phenotype's path
+    assert paths.loc[('EUR', 'HDL'), 'CRITICAL_PATH_MIN'] == pytest.approx(8)
@@ -0,0 +1,86 @@
+import pandas as pd
+
+import parse_plink2_logs
+
+LOGISTIC_LOG = """PLINK v2.00a5.10LM 64-bit Intel (17 Apr 2024)
+Options in effect:
+  --glm hide-covar firth-fallback
+  --keep EUR.sample_list.txt
+Start time: Tue Mar 12 10:03:44 2024
+257672 MiB RAM detected; reserving 20000 MiB for main workspace.
+Using up to 16 threads (change this with --threads).
+1000 samples (520 females, 480 males; 1000 founders) loaded from chr1.psam.
+10000 variants loaded from chr1.pvar.
+1 binary phenotype loaded (300 cases, 650 controls).
+--keep: 980 samples remaining.
+980 samples (500 females, 480 males; 980 founders) remaining after main
+filters.
+300 cases and 650 controls remaining after main filters.
+--geno: 12 variants removed due to missing genotype data.
+--hwe: 3 variants removed due to Hardy-Weinberg exact test (founders only).
+250 variants removed due to allele frequency threshold(s)
+(--maf/--max-maf/--mac/--max-mac).
+9735 variants remaining after main filters.
+Warning: 2 --glm regressions failed to converge.
+End time: Tue Mar 12 10:05:14 2024
+"""
+
+LINEAR_LOG = """PLINK v2.00a5.10LM 64-bit Intel (17 Apr 2024)
+Start time: Tue Mar 12 11:00:00 2024
+Using 8 compute threads.
+1000 samples (520 females, 480 males; 1000 founders) loaded from chr2.psam.
+1 quantitative phenotype loaded (970 values).
+--keep: 980 samples remaining.
+5000 variants loaded from chr2.pvar.
+--extract: 400 variants remaining.
+1 variant remaining after main filters.
+End time: Tue Mar 12 11:00:00 2024
+"""
+
+
+def test_parse_log_reads_counts_across_wrapped_lines(tmp_path):
+    log_file = tmp_path / 'EUR.T2D.1.logistic.plink2.log'
+    log_file.write_text(LOGISTIC_LOG)
+    row = parse_plink2_logs.parse_plink2_log(log_file)
+
+    assert row['PLINK2_VERSION'] == 'v2.00a5.10LM'
+    assert (row['THREADS'], row['RAM_DETECTED_MIB'], row['WORKSPACE_MIB']) == (16, 257672, 20000)
+    assert (row['SAMPLES_LOADED'], row['SAMPLES_AFTER_KEEP'], row['SAMPLES_AFTER_FILTERS']) == (1000, 980, 980)
+    assert (row['CASES'], row['CONTROLS']) == (300, 650)
+    assert (row['PHENO_NONMISSING'], row['PHENO_MISSING']) == (950, 30)
+    assert (row['VARIANTS_LOADED'], row['VARIANTS_AFTER_EXTRACT']) == (10000, None)
+    assert (row['GENO_REMOVED'], row['HWE_REMOVED'], row['MAF_REMOVED'], row['VARIANTS_TESTED']) == (12, 3, 250, 9735)
+    assert row['WARNINGS'] == 1
+    assert row['END_TIME'] - row['START_TIME'] == pd.Timedelta(seconds=90)
+
+
+def test_parse_log_handles_quantitative_phenotypes_and_singular_counts(tmp_path):
+    log_file = tmp_path / 'EUR.BMI.2.linear.plink2.log'
+    log_file.write_text(LINEAR_LOG)
+    row = parse_plink2_logs.parse_plink2_log(log_file)
+
+    assert row['THREADS'] == 8
+    assert (row['PHENO_NONMISSING'], row['PHENO_MISSING']) == (970, 10)
+    assert (row['VARIANTS_AFTER_EXTRACT'], row['VARIANTS_TESTED']) == (400, 1)
+    assert row['CASES'] is None and row['GENO_REMOVED'] is None
+
+
+def test_split_log_name_prefers_the_longest_matching_cohort():
+    assert parse_plink2_logs.split_log_name('logs/EUR.v2.BMI.adj.X.linear.plink2.log', ['EUR', 'EUR.v2']) == \
+        ('EUR.v2', 'BMI.adj', 'X', 'linear')
+    assert parse_plink2_logs.split_log_name('AFR.T2D.1.firth.plink2.log', []) == ('AFR', 'T2D', '1', 'firth')
+
+
+def test_main_skips_empty_firth_logs_and_computes_rates(tmp_path, run_script):
+    (tmp_path / 'EUR.T2D.1.first_pass.plink2.log').write_text(LOGISTIC_LOG)
+    (tmp_path / 'EUR.T2D.1.firth.plink2.log').touch()
+    (tmp_path / 'EUR.BMI.2.linear.plink2.log').write_text(LINEAR_LOG)
+
+    run_script('parse_plink2_logs.py', '--cohorts', 'EUR', '--output', 'metrics.csv', '--logs',
+               'EUR.T2D.1.first_pass.plink2.log', 'EUR.T2D.1.firth.plink2.log', 'EUR.BMI.2.linear.plink2.log')
+
+    metrics = pd.read_csv(tmp_path / 'metrics.csv')
+    assert metrics[['PHENO', 'STEP']].values.tolist() == [['BMI', 'linear'], ['T2D', 'first_pass']]
+    assert metrics['ELAPSED_S'].tolist() == [0, 90]
+    # Sub-second runs count as one second
+    assert metrics['VARIANTS_PER_S'].tolist() == [1.0, 108.2]
@@ -0,0 +1,46 @@
+import json
+
+import pipeline_metrics
+
+
+def read_records(metrics_dir):
+    return [json.loads(line) for f in sorted(metrics_dir.iterdir()) for line in f.read_text().splitlines()]
+
+
+def test_nothing_is_written_without_a_metrics_dir(tmp_path, monkeypatch):
+    monkeypatch.delenv(pipeline_metrics.METRICS_DIR_ENV, raising=False)
+    monkeypatch.chdir(tmp_path)
+    metrics = pipeline_metrics.PipelineMetrics('script.py')
+    metrics.start('read')
+    metrics.stop(rows=3)
+    metrics.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_phases_and_total_are_recorded(tmp_path, monkeypatch):
+    monkeypatch.setenv(pipeline_metrics.METRICS_DIR_ENV, str(tmp_path / 'metrics'))
+    metrics = pipeline_metrics.PipelineMetrics('scripts/standardize_phenos.py', cohort='EUR', pheno=None)
+    metrics.start('read', bytes_read=100)
+    metrics.stop(rows=3)
+    # Starting a phase ends the one still open
+    metrics.start('transform')
+    with metrics.phase('write') as m:
+        m['bytes_written'] = 50
+    metrics.close()
+
+    records = read_records(tmp_path / 'metrics')
+    assert [r['phase'] for r in records] == ['read', 'transform', 'write', 'total']
+    assert all(r['script'] == 'standardize_phenos' and r['cohort'] == 'EUR' and 'pheno' not in r for r in records)
+    assert (records[0]['rows'], records[0]['bytes_read']) == (3, 100)
+    assert (records[-1]['bytes_read'], records[-1]['bytes_written'], records[-1]['status']) == (100, 50, 'ok')
+    assert all(r['peak_rss_mb'] > 0 and r['children_peak_rss_mb'] >= 0 for r in records)
+
+
+def test_a_phase_left_open_is_recorded_as_an_error(tmp_path, monkeypatch):
+    monkeypatch.setenv(pipeline_metrics.METRICS_DIR_ENV, str(tmp_path / 'metrics'))
+    metrics = pipeline_metrics.PipelineMetrics('script.py')
+    metrics.start('read')
+    metrics.close()
+
+    records = read_records(tmp_path / 'metrics')
+    assert [(r['phase'], r['status']) for r in records] == [('read', 'error'), ('total', 'error')]